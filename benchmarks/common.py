@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Functions shared by the benchmarks: timing, building configurations, saving the results in json files,
+and comparing them with a stored baseline to find performance regressions
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import numpy as np
+import igraph as ig
+from datetime import datetime
+
+from configuration.logging import log
+from configuration.parser import get_arguments
+
+
+###########################################################
+#                                                         #
+#                   Running benchmarks                    #
+#                                                         #
+###########################################################
+
+def time_call(func, repeat=5, number=1):
+    """
+    Measures the execution time of a function, repeating the measurement to reduce the noise.
+    :param func: a function without arguments to measure
+    :param repeat: the number of measurements
+    :param number: the number of calls in every measurement
+    :return: a list with the time of a single call (in seconds) in every measurement
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start_time) / number)
+    return times
+
+
+def benchmark_entry(name, times, work=1, unit='calls', **params):
+    """
+    Creates the record of a single benchmark.
+    :param name: the name of the benchmark, unique in the suite
+    :param times: a list with measured times (in seconds)
+    :param work: the amount of work done in one measurement, e.g. the number of simulation steps
+    :param unit: the unit of work, the throughput is given in units per second
+    :param params: parameters of the benchmark to save with the results
+    :return: a dict with the results of the benchmark
+    """
+    median = float(np.median(times))
+    return {'name': name, 'params': params, 'unit': unit, 'work': work, 'times': [float(t) for t in times],
+            'median_time': median, 'min_time': float(np.min(times)), 'throughput': work / median}
+
+
+def make_config(*args):
+    """
+    Creates the configuration of the simulation as if the arguments were given in the command line,
+    e.g. make_config('-n', '1000', '-q', '10'). Logs of the configuration are suppressed.
+    :param args: command line arguments (strings)
+    :return: Config class from configuration module
+    """
+    level = log.getLogger().level
+    log.getLogger().setLevel(log.ERROR)
+    try:
+        return get_arguments(list(args))
+    finally:
+        log.getLogger().setLevel(level)
+
+
+###########################################################
+#                                                         #
+#               Saving and comparing results              #
+#                                                         #
+###########################################################
+
+def environment_info():
+    """
+    :return: a dict describing the machine and the versions of the code and packages used in the benchmark
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'date': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'python': sys.version.split()[0], 'numpy': np.__version__, 'igraph': ig.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+
+def save_benchmarks(suite, benchmarks, fname):
+    """
+    Saves the results of benchmarks in a json file.
+    :param suite: the name of the benchmark suite
+    :param benchmarks: a list of dicts created by benchmark_entry()
+    :param fname: the name of the file
+    :return: None
+    """
+    if os.path.dirname(fname):
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname, 'w') as out_file:
+        json.dump({'suite': suite, 'environment': environment_info(), 'benchmarks': benchmarks}, out_file, indent=3)
+    log.info(f'Results of {len(benchmarks)} benchmarks saved in {fname}')
+
+
+def read_benchmarks(fname):
+    """
+    :param fname: the name of a file saved by save_benchmarks()
+    :return: a list of dicts created by benchmark_entry()
+    """
+    with open(fname, 'r') as in_file:
+        return json.load(in_file)['benchmarks']
+
+
+def compare_benchmarks(benchmarks, baseline, threshold=0.1):
+    """
+    Compares the throughput of benchmarks with the baseline. Benchmarks missing in the baseline are skipped.
+    :param benchmarks: a list of dicts created by benchmark_entry()
+    :param baseline: a list of dicts created by benchmark_entry(), e.g. read from a file with read_benchmarks()
+    :param threshold: the relative drop of throughput considered as a regression
+    :return: a list of dicts {'name', 'throughput', 'baseline', 'change', 'regression'}, where change
+    is the relative change of throughput
+    """
+    baseline = {entry['name']: entry for entry in baseline}
+    comparison = []
+    for entry in benchmarks:
+        if entry['name'] not in baseline:
+            continue
+        reference = baseline[entry['name']]['throughput']
+        change = entry['throughput'] / reference - 1.0
+        comparison.append({'name': entry['name'], 'throughput': entry['throughput'], 'baseline': reference,
+                           'change': change, 'regression': change < -threshold})
+    return comparison
+
+
+def report_comparison(comparison, threshold):
+    """
+    Logs the comparison with the baseline.
+    :param comparison: a list of dicts returned by compare_benchmarks()
+    :param threshold: the relative drop of throughput considered as a regression
+    :return: the number of regressions
+    """
+    regressions = 0
+    for entry in comparison:
+        message = (f"{entry['name']}: {entry['throughput']:.4g} vs {entry['baseline']:.4g} in the baseline "
+                   f"({100.0 * entry['change']:+.1f}%)")
+        if entry['regression']:
+            regressions += 1
+            log.warning('REGRESSION ' + message)
+        else:
+            log.info(message)
+    log.info(f'{regressions} of {len(comparison)} benchmarks are slower than the baseline by more than '
+             f'{round(100.0 * threshold, 1)}%')
+    return regressions
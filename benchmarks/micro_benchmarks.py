@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks of the hot paths of the simulation: steps of the opinion dynamics, seat assignment rules,
+electoral systems, and network generation. Results (times and throughput) are saved in a json file,
+which can be used as a baseline for later runs to find performance regressions.
+Usage:
+$ python3 benchmarks/micro_benchmarks.py [--quick] [--filter seat_rule] [--output results/benchmarks_micro.json]
+$ python3 benchmarks/micro_benchmarks.py --compare results/benchmarks_baseline.json --threshold 0.1
+In the compare mode the script exits with code 1 if any benchmark is slower than the baseline by more than
+the threshold.
+"""
+import os
+import sys
+import random
+import tempfile
+import inspect
+import argparse
+import numpy as np
+from collections import Counter
+from decimal import Decimal
+
+# path hack for imports to work when running this script from any location,
+# without the hack one has to manually edit PYTHONPATH every time
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from configuration.logging import log
+from benchmarks.common import time_call, benchmark_entry, make_config, save_benchmarks, read_benchmarks
+from benchmarks.common import compare_benchmarks, report_comparison
+from electoral_sys.seat_assignment import seat_assignment_rules
+from electoral_sys.electoral_system import single_district_voting, multi_district_voting, merged_districts_voting
+from electoral_sys.electoral_system import tally_votes, single_district_tally_voting, multi_district_tally_voting
+from electoral_sys.electoral_system import merged_districts_tally_voting, compile_merging
+from instrumentation import page_faults
+from net_generation.base import init_graph, add_zealots
+from net_generation.storage import generate_mapped_graph, init_mapped_graph
+from simulation.base import run_simulation
+from simulation.mapped import run_mapped_simulation
+from simulation.free import run_free_simulation
+
+
+# sizes of the benchmarks, the quick version is meant for a fast check during development
+sizes = {'full': {'sim_n': 10000, 'sim_steps': 50000, 'seat_calls': 500, 'voting_n': 20000,
+                  'graph_n': (1000, 10000, 50000), 'graph_q': (1, 10, 100), 'graph_parties': (2, 5),
+                  'mapped_n': (10000, 100000, 1000000), 'mapped_steps': 200000},
+         'quick': {'sim_n': 1000, 'sim_steps': 5000, 'seat_calls': 100, 'voting_n': 2000,
+                   'graph_n': (1000, 10000), 'graph_q': (1, 10), 'graph_parties': (2,),
+                   'mapped_n': (10000, 100000), 'mapped_steps': 20000}}
+
+
+def graph_for(config):
+    """
+    :param config: Config class from configuration module
+    :return: the network generated as in main.run_experiment()
+    """
+    return init_graph(config.n, config.district_sizes, config.avg_deg, block_coords=config.district_coords,
+                      ratio=config.ratio, planar_const=config.planar_c, euclidean=config.euclidean,
+                      state_generator=config.initialize_states, random_dist=config.random_dist,
+                      initial_state=config.not_zealot_state, all_states=config.all_states)
+
+
+###########################################################
+#                                                         #
+#                       Benchmarks                        #
+#                                                         #
+###########################################################
+
+def simulation_benchmarks(size, repeat):
+    """
+    Steps of the opinion dynamics per second for every propagation mechanism, and with half of the nodes
+    being zealots for the sequential and free update modes.
+    """
+    benchmarks = []
+    for propagation in ('standard', 'majority', 'minority'):
+        config = make_config('-n', str(size['sim_n']), '-q', '10', '-np', '3', '-p', propagation)
+        g = graph_for(config)
+        times = time_call(lambda: run_simulation(config, g, config.epsilon, size['sim_steps'], n=config.n),
+                          repeat=repeat)
+        benchmarks.append(benchmark_entry(f'run_simulation_{propagation}', times, work=size['sim_steps'],
+                                          unit='steps', n=config.n, q=config.q, parties=config.num_parties,
+                                          epsilon=config.epsilon))
+
+    config = make_config('-n', str(size['sim_n']), '-q', '10', '-zn', str(size['sim_n'] // 2))
+    g = add_zealots(graph_for(config), config.n_zealots, config.zealot_state)
+    for simulate in (run_simulation, run_free_simulation):
+        times = time_call(lambda: simulate(config, g, config.epsilon, size['sim_steps'], n=config.n), repeat=repeat)
+        benchmarks.append(benchmark_entry(f'{simulate.__name__}_zealots', times, work=size['sim_steps'],
+                                          unit='steps', n=config.n, q=config.q, zealots=config.n_zealots,
+                                          epsilon=config.epsilon))
+    return benchmarks
+
+
+def seat_rule_benchmarks(size, repeat):
+    """
+    Seat assignments per second for every rule in seat_assignment_rules.
+    """
+    votes = Counter({party: int(v) for party, v in zip('abcdefgh', np.random.randint(1000, 100000, size=8))})
+    total_votes = sum(votes.values())
+    vote_fractions = {party: Decimal(v) / Decimal(total_votes) for party, v in votes.items()}
+    total_seats = 20
+
+    benchmarks = []
+    for name, rule in seat_assignment_rules.items():
+        times = time_call(lambda: rule(total_seats, vote_fractions=vote_fractions, votes=votes,
+                                       total_votes=total_votes), repeat=repeat, number=size['seat_calls'])
+        benchmarks.append(benchmark_entry(f'seat_rule_{name}', times, unit='assignments', parties=len(votes),
+                                          seats=total_seats))
+    return benchmarks
+
+
+def voting_benchmarks(size, repeat):
+    """
+    Elections per second for the single district, multiple districts, and merged districts systems,
+    counting votes of the voters (as in the original implementation) and from the tally of votes.
+    """
+    q = 10
+    config = make_config('-n', str(size['voting_n']), '-q', str(q), '-np', '5', '-qr', 'jefferson')
+    g = graph_for(config)
+    seats = [10] * q
+    dist_merging = [i // 2 for i in range(q)]
+    plan = compile_merging(dist_merging, seats)
+    kwargs = dict(states=config.all_states, total_seats=sum(seats), assignment_func=config.seat_alloc_function,
+                  threshold=0.05)
+
+    systems = {
+        'single_district_voting': lambda: single_district_voting(g.vs, **kwargs),
+        'multi_district_voting': lambda: multi_district_voting(g.vs, seats_per_district=seats, **kwargs),
+        'merged_districts_voting': lambda: merged_districts_voting(g.vs, seats_per_district=seats,
+                                                                   dist_merging=dist_merging, **kwargs),
+        'tally_votes': lambda: tally_votes(g.vs, config.all_states, q),
+    }
+    tally = tally_votes(g.vs, config.all_states, q)
+    systems.update({
+        'single_district_tally_voting': lambda: single_district_tally_voting(tally, **kwargs),
+        'multi_district_tally_voting': lambda: multi_district_tally_voting(tally, seats_per_district=seats, **kwargs),
+        'merged_districts_tally_voting': lambda: merged_districts_tally_voting(tally, merging_plan=plan, **kwargs),
+    })
+
+    return [benchmark_entry(name, time_call(system, repeat=repeat), unit='elections', n=config.n, q=q,
+                            parties=config.num_parties)
+            for name, system in systems.items()]
+
+
+def graph_benchmarks(size, repeat):
+    """
+    Nodes generated per second by init_graph() for different network sizes, numbers of districts and parties.
+    """
+    benchmarks = []
+    for n in size['graph_n']:
+        for q in size['graph_q']:
+            for parties in size['graph_parties']:
+                config = make_config('-n', str(n), '-q', str(q), '-np', str(parties))
+                times = time_call(lambda: graph_for(config), repeat=repeat)
+                benchmarks.append(benchmark_entry(f'init_graph_n_{n}_q_{q}_parties_{parties}', times, work=n,
+                                                  unit='nodes', n=n, q=q, parties=parties, avg_deg=config.avg_deg))
+    return benchmarks
+
+
+def mapped_benchmarks(size, repeat):
+    """
+    Nodes generated per second into memory-mapped files, and steps of the dynamics per second reading
+    the neighbours from the files, for several network sizes. Page faults per step are saved with the results:
+    minor faults are pages found in the page cache, major faults are pages read from the disk.
+    """
+    benchmarks = []
+    for n in size['mapped_n']:
+        config = make_config('-n', str(n), '-q', '10', '--storage', 'mmap')
+        with tempfile.TemporaryDirectory() as path:
+            times = time_call(lambda: generate_mapped_graph(path, n, config.district_sizes, config.avg_deg,
+                                                            ratio=config.ratio), repeat=repeat)
+        benchmarks.append(benchmark_entry(f'generate_mapped_graph_n_{n}', times, work=n, unit='nodes', n=n,
+                                          q=config.q, avg_deg=config.avg_deg))
+
+        g = init_mapped_graph(n, config.district_sizes, config.avg_deg, ratio=config.ratio,
+                              all_states=config.all_states)
+        try:
+            steps = size['mapped_steps']
+            minor, major = page_faults()
+            times = time_call(lambda: run_mapped_simulation(config, g, config.epsilon, steps, n=n), repeat=repeat)
+            minor, major = np.subtract(page_faults(), (minor, major)) / (steps * repeat)
+            benchmarks.append(benchmark_entry(f'run_mapped_simulation_n_{n}', times, work=steps, unit='steps', n=n,
+                                              q=config.q, epsilon=config.epsilon, minor_faults_per_step=minor,
+                                              major_faults_per_step=major))
+        finally:
+            g.close()
+    return benchmarks
+
+
+benchmark_groups = {'simulation': simulation_benchmarks, 'seat_rule': seat_rule_benchmarks,
+                    'voting': voting_benchmarks, 'init_graph': graph_benchmarks, 'mapped': mapped_benchmarks}
+
+
+def run_benchmarks(quick=False, repeat=5, name_filter=None, seed=0):
+    """
+    Runs all micro-benchmarks.
+    :param quick: whether to run the smaller version of the benchmarks
+    :param repeat: the number of measurements of every benchmark
+    :param name_filter: run only groups of benchmarks with names containing this string
+    :param seed: the seed of random number generators, to measure the same work every time
+    :return: a list of dicts created by benchmarks.common.benchmark_entry()
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    size = sizes['quick' if quick else 'full']
+    benchmarks = []
+    for group, run_group in benchmark_groups.items():
+        if name_filter and name_filter not in group:
+            continue
+        log.info(f'Running {group} benchmarks')
+        for entry in run_group(size, repeat):
+            log.info(f"{entry['name']}: {entry['throughput']:.4g} {entry['unit']}/s")
+            benchmarks.append(entry)
+    return benchmarks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the simulation.')
+    parser.add_argument('--quick', action='store_const', default=False, const=True, dest='quick',
+                        help='run smaller benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, dest='repeat', help='the number of measurements')
+    parser.add_argument('--filter', type=str, default=None, dest='name_filter',
+                        help=f'run only groups with names containing this string, groups: {list(benchmark_groups)}')
+    parser.add_argument('--output', type=str, default='results/benchmarks_micro.json', dest='output',
+                        help='the json file for the results')
+    parser.add_argument('--compare', type=str, default=None, dest='baseline',
+                        help='a json file with the baseline results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, dest='threshold',
+                        help='the relative drop of throughput considered as a regression (default 0.1)')
+    args = parser.parse_args()
+    # the baseline and output paths are relative to the directory where the script was run
+    output, baseline = os.path.abspath(args.output), args.baseline and os.path.abspath(args.baseline)
+    os.chdir(parentdir)
+
+    results = run_benchmarks(quick=args.quick, repeat=args.repeat, name_filter=args.name_filter)
+    save_benchmarks('micro', results, output)
+    if baseline is not None:
+        if report_comparison(compare_benchmarks(results, read_benchmarks(baseline), args.threshold), args.threshold):
+            sys.exit(1)
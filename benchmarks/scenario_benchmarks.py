@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmarks running shortened versions of the shipped configuration files (and synthetic
+configurations scaled in n and q), with the wall time split into the phases of the simulation:
+network generation, thermalization, sampling (the opinion dynamics between elections), elections, and I/O.
+The results are saved in a json file in the same format as micro-benchmarks, so they can be compared
+with a baseline and collected across releases to make scaling curves.
+Usage:
+$ python3 benchmarks/scenario_benchmarks.py [--scenarios pl_sejm il_knesset] [--samples 3] [--therm 2] [--mc 1]
+$ python3 benchmarks/scenario_benchmarks.py --synthetic --n 10000 100000 --q 10 100 --no-shipped
+"""
+import os
+import sys
+import json
+import random
+import inspect
+import argparse
+import tempfile
+import numpy as np
+
+# path hack for imports to work when running this script from any location,
+# without the hack one has to manually edit PYTHONPATH every time
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from configuration.logging import log
+from benchmarks.common import benchmark_entry, make_config, save_benchmarks, read_benchmarks
+from benchmarks.common import compare_benchmarks, report_comparison
+from main import run_experiment
+
+# the configuration files benchmarked by default
+shipped_scenarios = ('pl_sejm', 'pl_senate', 'il_knesset', 'il_knesset_6dist', 'ind_house_otp')
+config_dir = os.path.join(parentdir, 'configuration', 'config_files')
+
+# phases of main.run_experiment() in the groups reported by the benchmarks, the remaining phases are I/O
+phases = ('network', 'thermalization', 'sampling', 'elections', 'io')
+phase_groups = {'init_graph': 'network', 'add_zealots': 'network', 'init_composition': 'network',
+                'csr_adjacency': 'network', 'thermalization': 'thermalization', 'relaxation': 'thermalization',
+                'run_simulation': 'sampling', 'dual_sampling': 'sampling', 'reset': 'sampling',
+                'tally_votes': 'elections'}
+
+
+def phase_group(name):
+    """
+    :param name: the name of a phase timed by main.run_experiment()
+    :return: the group of the phase reported by the benchmarks (one of phases)
+    """
+    return phase_groups.get(name, 'elections' if name.startswith('voting') else 'io')
+
+
+###########################################################
+#                                                         #
+#                      Scenarios                          #
+#                                                         #
+###########################################################
+
+def shortened_settings(settings, samples, therm_sweeps, mc_steps):
+    """
+    Shortens a simulation, keeping the network and the electoral systems unchanged.
+    :param settings: a dict with the content of a configuration file
+    :param samples: the number of samples (elections)
+    :param therm_sweeps: the thermalization time in sweeps, i.e. multiples of n steps
+    :param mc_steps: the number of sweeps between elections
+    :return: a new dict with the settings
+    """
+    return dict(settings, sample_size=samples, therm_time=int(therm_sweeps * settings['n']), mc_steps=mc_steps)
+
+
+def shipped_settings(name):
+    """
+    :param name: the name of a file in configuration/config_files without the extension
+    :return: a dict with the content of the file
+    """
+    with open(os.path.join(config_dir, name + '.json'), 'r') as in_file:
+        settings = json.load(in_file)
+    settings.pop('_comment_', None)
+    return settings
+
+
+def synthetic_settings(n, q, num_parties=5, seats=10):
+    """
+    A configuration with a planted block structure and equal districts, for scaling curves.
+    :param n: the number of nodes
+    :param q: the number of districts
+    :param num_parties: the number of parties
+    :param seats: the number of seats per district
+    :return: a dict with the settings
+    """
+    return {'n': n - n % q, 'q': q, 'num_parties': num_parties, 'seats': [seats], 'seat_rule': 'jefferson',
+            'threshold': 0.05, 'avg_deg': 12, 'ratio': 0.02, 'epsilon': 0.01}
+
+
+def config_from_settings(settings):
+    """
+    Creates the configuration of the simulation as if the settings were provided in a configuration file.
+    :param settings: a dict with the settings
+    :return: Config class from configuration module
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as config_file:
+        json.dump(settings, config_file)
+    try:
+        return make_config('--config_file', config_file.name)
+    finally:
+        os.remove(config_file.name)
+
+
+###########################################################
+#                                                         #
+#                  Running the scenarios                  #
+#                                                         #
+###########################################################
+
+def run_scenario(config, output_dir):
+    """
+    Runs the simulation with main.run_experiment() and groups the timing of its phases.
+    :param config: Config class from configuration module
+    :param output_dir: the directory for the results files
+    :return: a dict {phase: time in seconds}
+    """
+    instrumentation = run_experiment(n=config.n, epsilon=config.epsilon, sample_size=config.sample_size,
+                                     therm_time=config.therm_time, n_zealots=config.n_zealots, config=config,
+                                     silent=True, make_plots=False, output_dir=output_dir)
+    times = {phase: 0.0 for phase in phases}
+    for name, t in instrumentation.times.items():
+        times[phase_group(name)] += t
+    return times
+
+
+def scenario_entry(name, settings, config, output_dir):
+    """
+    Runs a scenario and creates its benchmark record.
+    :param name: the name of the scenario
+    :param settings: a dict with the settings of the scenario
+    :param config: Config class created from the settings
+    :param output_dir: the directory for the results files
+    :return: a dict created by benchmark_entry() with the additional 'phases' entry {phase: time in seconds}
+    """
+    times = run_scenario(config, output_dir)
+    total = sum(times.values())
+    steps = config.therm_time + config.sample_size * config.n * config.mc_steps
+    entry = benchmark_entry(name, [total], work=steps, unit='steps', n=config.n, q=config.q,
+                            parties=config.num_parties, samples=config.sample_size, therm_time=config.therm_time,
+                            mc_steps=config.mc_steps, systems=len(config.voting_systems),
+                            planar=settings.get('district_coords') is not None)
+    entry['phases'] = times
+    log.info(f'{name}: {round(total, 2)} s in total, ' +
+             ', '.join(f'{phase} {round(100.0 * t / total, 1)}%' for phase, t in times.items()))
+    return entry
+
+
+def run_benchmarks(scenarios=shipped_scenarios, synthetic_n=(), synthetic_q=(), samples=3, therm_sweeps=2,
+                   mc_steps=1, seed=0):
+    """
+    Runs the shortened shipped scenarios and the synthetic ones (every combination of n and q).
+    :param scenarios: names of the configuration files to run
+    :param synthetic_n: network sizes of the synthetic scenarios
+    :param synthetic_q: numbers of districts of the synthetic scenarios
+    :param samples: the number of samples (elections) in every scenario
+    :param therm_sweeps: the thermalization time in sweeps, i.e. multiples of n steps
+    :param mc_steps: the number of sweeps between elections
+    :param seed: the seed of the random number generator
+    :return: a list of dicts created by scenario_entry()
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+    to_run = [(name, shipped_settings(name)) for name in scenarios]
+    to_run += [(f'synthetic_n_{n}_q_{q}', synthetic_settings(n, q)) for n in synthetic_n for q in synthetic_q]
+    benchmarks = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, settings in to_run:
+            settings = shortened_settings(settings, samples, therm_sweeps, mc_steps)
+            log.info(f"Running scenario {name} (n={settings['n']}, q={settings['q']})")
+            config = config_from_settings(settings)
+            benchmarks.append(scenario_entry(name, settings, config, output_dir + '/'))
+    return benchmarks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end scenario benchmarks of the simulation.')
+    parser.add_argument('--scenarios', nargs='*', default=list(shipped_scenarios), dest='scenarios',
+                        help='names of configuration files from configuration/config_files to run')
+    parser.add_argument('--no-shipped', action='store_const', const=True, default=False, dest='no_shipped',
+                        help='skip the shipped configuration files')
+    parser.add_argument('--synthetic', action='store_const', const=True, default=False, dest='synthetic',
+                        help='run synthetic scenarios for every combination of --n and --q')
+    parser.add_argument('--n', nargs='+', type=int, default=[10000, 50000], dest='synthetic_n',
+                        help='network sizes of synthetic scenarios')
+    parser.add_argument('--q', nargs='+', type=int, default=[10, 100], dest='synthetic_q',
+                        help='numbers of districts of synthetic scenarios')
+    parser.add_argument('--samples', type=int, default=3, dest='samples', help='the number of elections')
+    parser.add_argument('--therm', type=float, default=2, dest='therm_sweeps',
+                        help='thermalization time in sweeps (multiples of n steps)')
+    parser.add_argument('--mc', type=int, default=1, dest='mc_steps', help='the number of sweeps between elections')
+    parser.add_argument('--output', type=str, default='results/benchmarks_scenarios.json', dest='output',
+                        help='the json file for the results')
+    parser.add_argument('--compare', type=str, default=None, dest='baseline',
+                        help='a json file with the baseline results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, dest='threshold',
+                        help='the relative drop of throughput considered as a regression (default 0.1)')
+    args = parser.parse_args()
+    output, baseline = os.path.abspath(args.output), args.baseline and os.path.abspath(args.baseline)
+    os.chdir(parentdir)
+
+    results = run_benchmarks(scenarios=[] if args.no_shipped else args.scenarios,
+                             synthetic_n=args.synthetic_n if args.synthetic else (),
+                             synthetic_q=args.synthetic_q if args.synthetic else (),
+                             samples=args.samples, therm_sweeps=args.therm_sweeps, mc_steps=args.mc_steps)
+    save_benchmarks('scenarios', results, output)
+    if baseline is not None:
+        if report_comparison(compare_benchmarks(results, read_benchmarks(baseline), args.threshold), args.threshold):
+            sys.exit(1)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from benchmarks.common import time_call, benchmark_entry, compare_benchmarks, make_config
+
+
+class TestBenchmarkTools(unittest.TestCase):
+
+    def test_time_call(self):
+        calls = []
+        times = time_call(lambda: calls.append(1), repeat=3, number=4)
+        self.assertEqual(len(times), 3)
+        self.assertEqual(len(calls), 12)
+
+    def test_benchmark_entry(self):
+        res = benchmark_entry('sim', [2.0, 1.0, 4.0], work=100, unit='steps', n=10)
+        self.assertEqual(res['median_time'], 2.0)
+        self.assertEqual(res['min_time'], 1.0)
+        self.assertEqual(res['throughput'], 50.0)
+        self.assertDictEqual(res['params'], {'n': 10})
+
+    def test_compare_benchmarks(self):
+        baseline = [benchmark_entry('a', [1.0]), benchmark_entry('b', [1.0]), benchmark_entry('c', [1.0])]
+        current = [benchmark_entry('a', [1.05]), benchmark_entry('b', [2.0]), benchmark_entry('new', [1.0])]
+        res = compare_benchmarks(current, baseline, threshold=0.1)
+        self.assertListEqual([entry['name'] for entry in res], ['a', 'b'])
+        self.assertFalse(res[0]['regression'])
+        self.assertTrue(res[1]['regression'])
+        self.assertAlmostEqual(res[1]['change'], -0.5)
+
+    def test_make_config(self):
+        config = make_config('-n', '100', '-q', '4', '-np', '3')
+        self.assertEqual(config.n, 100)
+        self.assertEqual(config.q, 4)
+        self.assertListEqual(config.all_states, ['a', 'b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import unittest
+
+from benchmarks.scenario_benchmarks import phase_group, phases
+
+
+class TestPhaseGroups(unittest.TestCase):
+
+    def test_phase_group(self):
+        self.assertEqual(phase_group('dual_sampling'), 'sampling')
+        self.assertEqual(phase_group('init_composition'), 'network')
+        self.assertEqual(phase_group('csr_adjacency'), 'network')
+        self.assertEqual(phase_group('relaxation'), 'thermalization')
+        self.assertEqual(phase_group('voting: population'), 'elections')
+        self.assertEqual(phase_group('save_data'), 'io')
+
+    def test_phases_of_main_grouped(self):
+        # every phase timed by main.run_experiment() except saving the results has its group
+        main_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                 'main.py')
+        with open(main_file) as source:
+            names = set(re.findall(r"timed\('([^']+)'", source.read()))
+        self.assertIn('run_simulation', names)
+        for name in names - {'save_data', 'voting: '}:
+            self.assertIn(phase_group(name), phases)
+            self.assertNotEqual(phase_group(name), 'io', name)
@@ -6,11 +6,17 @@ configuration of the simulation
 import sys
 import json
 import copy
+import numpy as np
 
 import electoral_sys.electoral_system as es
-from electoral_sys.seat_assignment import seat_assignment_rules
+from electoral_sys.seat_assignment import seat_assignment_rules, SeatAssignmentCache
 import net_generation.base as ng
 import simulation.base as sim
+from simulation.colouring import run_colouring_sweeps
+from simulation.domains import run_domains
+from simulation.mapped import run_mapped_simulation
+from simulation.hybrid import run_hybrid
+from simulation.free import run_free_simulation
 from configuration.logging import log
 
 
@@ -23,11 +29,15 @@ class Config:
     :initialize_states: a function that generates a vector of initial states
     :propagate: a function that propagates states from neighbours to a node
     :mutate: a function that changes the state of a node at random
+    :simulate: a function running the steps of the simulation, run_simulation, run_hybrid, run_colouring_sweeps,
+    run_free_simulation, run_domains or run_mapped_simulation
     :zealot_state: the state of zealot nodes
     :not_zealot_state: the state taken as the opposition of the zealot state
     :all_states: all possible states of the nodes
     :zealots_config: configuration for the zealot initialization
     :suffix: suggested file name suffix for output files
+    :seat_cache: the cache of seat assignments shared by all electoral systems (None if disabled)
+    :tally_dtype: the numpy type of vote counts in the saved tallies
 
     The rest of attributes are simply arguments defined in parser.py and described there
     """
@@ -45,6 +55,7 @@ class Config:
     seats = None
     seat_rule = None
     threshold = None
+    seat_cache_size = None
 
     sample_size = None
     therm_time = None
@@ -52,6 +63,13 @@ class Config:
     reset = None
     random_dist = None
     consensus = None
+    save_tallies = None
+    result_format = None
+    result_batch = None
+    profile_phase = None
+    progress_interval = None
+    memory_budget = None
+    trace_memory = None
 
     n_zealots = None
     where_zealots = None
@@ -60,6 +78,14 @@ class Config:
 
     epsilon = None
     propagation = None
+    sampler = None
+    relaxation = None
+    engine = None
+    processes = None
+    sync_interval = None
+    storage = None
+    storage_dir = None
+    update_mode = None
     num_parties = None
 
     config_file = None
@@ -70,6 +96,7 @@ class Config:
     initialize_states = staticmethod(ng.default_initial_state)
     propagate = staticmethod(sim.default_propagation)
     mutate = staticmethod(sim.default_mutation)
+    simulate = staticmethod(sim.run_simulation)
 
     # main electoral systems which are computed in every simulation,
     # you can compute more by adding them in a configuration file under 'alternative_systems' parameter
@@ -78,14 +105,18 @@ class Config:
         # and assigns all seats based on the results in the whole country;
         # it can be, however, a first-past-the-post system with one district,
         # or majoritarian voting, if a proper seat allocation rule is provided
-        'countrywide_system': es.single_district_voting,
+        'countrywide_system': es.single_district_tally_voting,
 
         # a system with electoral districts as specified by 'district_sizes', either PR or first-past-the-post
         # what depends on the seat assignment method and number of seats per district,
         # it has the main parameters the same as the country-wide system (threshold, seat rule etc.)
-        'main_district_system': es.multi_district_voting,
+        'main_district_system': es.multi_district_tally_voting,
     }
 
+    seat_cache = None
+    # the type of vote counts in the saved tallies, 32-bit integers in the compact mode (see --memory_budget)
+    tally_dtype = np.dtype(np.int64)
+
     zealot_state = None
     not_zealot_state = None
     all_states = None  # the order matters in the mutation function! zealot first
@@ -94,12 +125,12 @@ class Config:
     def wrap_configuration(voting_function, **kwargs):
         """
         A helper method to automatically provide configuration arguments to voting functions.
-        :param voting_function: one of the voting functions from the electoral_system module
+        :param voting_function: one of the tally-based voting functions from the electoral_system module
         :param kwargs: keyword arguments to be passed to the voting_function
-        :return: a wrapped voting_function that now only needs voters (igraph.VertexSeq) as an argument
+        :return: a wrapped voting_function that now only needs the tally of votes (see es.tally_votes()) as an argument
         """
-        def inner(voters):
-            return voting_function(voters, **kwargs)
+        def inner(tally):
+            return voting_function(tally, **kwargs)
         return inner
 
     @staticmethod
@@ -137,27 +168,29 @@ class Config:
         total_seats = sum(seats_per_district)
         return seats_per_district, total_seats
 
-    @staticmethod
-    def validate_seat_rule(seat_rule, param_path):
+    def validate_seat_rule(self, seat_rule, param_path):
         """
         A function to validate the seat_rule value provided in the configuration
         and find the corresponding seat assignment method.
         :param seat_rule: (string) the seat_rule parameter, it should be one of seat_assignment_rules.keys()
         :param param_path: (string) from which part of the configuration is the parameter (for error message)
-        :return: seat allocation method (function)
+        :return: seat allocation method (function), wrapped by the seat assignment cache if it is enabled
         """
         try:
             seat_alloc_function = seat_assignment_rules[seat_rule]
         except KeyError:
             raise ValueError(f"The seat rule '{seat_rule}' provided in {param_path} does not exist, "
                              f"possible seat rules are: {[r for r in seat_assignment_rules.keys()]}")
+        if self.seat_cache is not None:
+            seat_alloc_function = self.seat_cache.wrap(seat_rule)
         return seat_alloc_function
 
-    def __init__(self, cmd_args, arg_dict):
+    def __init__(self, cmd_args, arg_dict, argv=None):
         """
         Initialization of the configuration class with basic argument validation
         :param cmd_args: Namespace with command line arguments
         :param arg_dict: a private dict of the argparse parser to use only for parameters redundancy validation
+        :param argv: the list of command line arguments that were parsed, sys.argv[1:] by default
         """
         # Read in the configuration file
         if cmd_args.config_file is not None:
@@ -169,7 +202,7 @@ class Config:
             log.info(f'Taking configuration from {cmd_args.config_file.name} file')
 
             # Parameters redundancy validation
-            for argument in sys.argv[1:]:
+            for argument in (sys.argv[1:] if argv is None else argv):
                 if argument[0] != '-':  # each command line arg starts with either '-' or '--', otherwise it's a value
                     continue
                 try:
@@ -237,6 +270,70 @@ class Config:
                 return sim.majority_propagation(n, g, True)
             self.propagate = f
 
+        # Update scheme of the network
+        if self.update_mode != 'sequential':
+            if self.engine == 'metapopulation' or self.sampler == 'dual':
+                raise ValueError(f"The {self.update_mode} update mode needs the dynamics on the network, "
+                                 f"engine={self.engine} and sampler={self.sampler} were provided.")
+            self.simulate = {'hybrid': run_hybrid, 'colouring': run_colouring_sweeps,
+                             'free': run_free_simulation}[self.update_mode]
+
+        # The metapopulation approximation follows only the composition of districts
+        if self.engine == 'metapopulation':
+            if self.propagation != 'standard' or self.sampler == 'dual' or self.random_dist:
+                raise ValueError(f"The metapopulation engine works only with the standard propagation, the mcmc "
+                                 f"sampler and districts equal to communities, propagation={self.propagation}, "
+                                 f"sampler={self.sampler} and random_dist={self.random_dist} were provided.")
+            if self.relaxation != 'off':
+                log.warning('The relaxation time is estimated from the network, with the metapopulation engine '
+                            'it will be ignored')
+                self.relaxation = 'off'
+
+        # The domains engine runs the standard dynamics on groups of districts in parallel processes
+        if self.engine == 'domains':
+            if sys.version_info < (3, 8):
+                raise ValueError(f"The domains engine needs Python 3.8 or newer (multiprocessing.shared_memory), "
+                                 f"Python {sys.version.split()[0]} is used.")
+            if self.propagation != 'standard' or self.sampler == 'dual' or self.update_mode != 'sequential':
+                raise ValueError(f"The domains engine works only with the standard propagation, the mcmc sampler "
+                                 f"and the sequential update mode, propagation={self.propagation}, "
+                                 f"sampler={self.sampler} and update_mode={self.update_mode} were provided.")
+            if self.processes is not None and self.processes < 1:
+                raise ValueError(f'The number of processes must be positive, {self.processes} was provided.')
+            if self.sync_interval <= 0:
+                raise ValueError(f'The sync interval must be positive, {self.sync_interval} was provided.')
+            self.simulate = run_domains
+
+        # Networks in memory-mapped files are run without igraph
+        if self.storage == 'mmap':
+            if self.propagation != 'standard' or self.sampler == 'dual' or self.update_mode != 'sequential' \
+                    or self.engine == 'metapopulation' or self.random_dist:
+                raise ValueError(f"The mmap storage works only with the standard propagation, the mcmc sampler, "
+                                 f"the sequential update mode, the network or domains engine and districts equal "
+                                 f"to communities, propagation={self.propagation}, sampler={self.sampler}, "
+                                 f"update_mode={self.update_mode}, engine={self.engine} and "
+                                 f"random_dist={self.random_dist} were provided.")
+            if self.relaxation != 'off':
+                log.warning('The relaxation time is estimated from an igraph network, with the mmap storage '
+                            'it will be ignored')
+                self.relaxation = 'off'
+            if self.engine == 'network':
+                self.simulate = run_mapped_simulation
+
+        # The dual sampler draws samples from the stationary distribution of the standard propagation
+        if self.sampler == 'dual':
+            if self.propagation != 'standard':
+                raise ValueError(f"The dual sampler works only with the standard propagation, "
+                                 f"propagation={self.propagation} was provided.")
+            if self.epsilon <= 0:
+                raise ValueError(f'The dual sampler needs a positive noise rate, epsilon={self.epsilon} was provided.')
+            if self.relaxation != 'off':
+                log.warning('The dual sampler needs no thermalization, the relaxation estimate will be ignored')
+                self.relaxation = 'off'
+        elif self.relaxation != 'off' and self.propagation != 'standard':
+            log.warning(f'The relaxation time is estimated for the standard propagation, '
+                        f'for the {self.propagation} propagation it is only a rough guide')
+
         # Determine the number of states
         if self.num_parties < 2:
             raise ValueError('The simulation needs at least two states')
@@ -274,10 +371,14 @@ class Config:
         if self.threshold != 0:
             self.suffix += f"_tr_{self.threshold}"
 
-        # Seat allocation rules
+        # Seat allocation rules, all electoral systems share one cache of seat assignments
+        if self.seat_cache_size:
+            self.seat_cache = SeatAssignmentCache(self.seat_cache_size)
         self.seats_per_district, self.total_seats = self.validate_seats(self.seats, self.q, 'the main configuration')
         self.seat_alloc_function = self.validate_seat_rule(self.seat_rule, 'the main configuration')
 
+        # the class attribute holds the default systems, every instance wraps and extends its own copy of them
+        self.voting_systems = dict(self.voting_systems)
         # add the general configuration to the main pre-defined electoral systems
         for system in self.voting_systems.keys():
             self.voting_systems[system] = self.wrap_configuration(self.voting_systems[system], states=self.all_states,
@@ -316,7 +417,7 @@ class Config:
                         alt['seats'], self.q, f"alternative_systems/{alt['name']}")
 
                     self.voting_systems[alt['name']] = self.wrap_configuration(
-                        es.multi_district_voting, states=self.all_states, total_seats=alt['total_seats'],
+                        es.multi_district_tally_voting, states=self.all_states, total_seats=alt['total_seats'],
                         seats_per_district=alt['seats_per_district'], threshold=alt['threshold'],
                         assignment_func=alt['seat_alloc_function'])
 
@@ -343,7 +444,7 @@ class Config:
                             alt['seats'] = None
 
                         self.voting_systems[alt['name']] = self.wrap_configuration(
-                            es.single_district_voting, states=self.all_states, total_seats=alt['total_seats'],
+                            es.single_district_tally_voting, states=self.all_states, total_seats=alt['total_seats'],
                             threshold=alt['threshold'], assignment_func=alt['seat_alloc_function'])
 
                     # if alt['q']>1 then 'dist_merging' must provide a new id for each of the main districts
@@ -358,10 +459,11 @@ class Config:
                         alt['seats_per_district'], alt['total_seats'] = self.validate_seats(
                             alt['seats'], self.q, f"alternative_systems/{alt['name']}")
 
+                        # the merging is compiled once here instead of being recomputed in every election
                         self.voting_systems[alt['name']] = self.wrap_configuration(
-                            es.merged_districts_voting, states=self.all_states, total_seats=alt['total_seats'],
-                            assignment_func=alt['seat_alloc_function'], seats_per_district=alt['seats_per_district'],
-                            threshold=alt['threshold'], dist_merging=alt['dist_merging'])
+                            es.merged_districts_tally_voting, states=self.all_states, total_seats=alt['total_seats'],
+                            assignment_func=alt['seat_alloc_function'], threshold=alt['threshold'],
+                            merging_plan=es.compile_merging(alt['dist_merging'], alt['seats_per_district']))
                 else:
                     raise NotImplementedError(f"Type '{alt['type']}' is not implemented, but was provided in the "
                                               f"configuration file for the alternative system '{alt['name']}'.")
@@ -370,6 +472,17 @@ class Config:
         if self.config_file is not None:
             self.suffix = (f"_{self.config_file.split('/')[-1].replace('.json', '')}_p_{self.propagation}"
                            f"_media_{self.mass_media}_zn_{self.n_zealots}_mc_{self.mc_steps}")
+        if self.sampler == 'dual':
+            self.suffix += '_dual'
+        if self.engine == 'metapopulation':
+            self.suffix += '_meta'
+        if self.engine == 'domains':
+            self.suffix += '_domains'
+        if self.update_mode == 'colouring':
+            self.suffix += '_colouring'
+        if self.relaxation == 'apply':
+            # therm_time and mc_steps in the suffix are replaced by the estimated ones
+            self.suffix += '_relaxed'
 
         # at the end remove dots from the suffix so latex doesn't have issues with the filenames
         self.suffix = self.suffix.replace('.', '')
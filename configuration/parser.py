@@ -74,6 +74,11 @@ parser.add_argument('-qr', '--seat_rule', action='store', choices=seat_assignmen
 parser.add_argument('-tr', '--threshold', action='store', default=0.0, type=float, dest='threshold',
                     help='The electoral threshold (minimal share of votes to be considered)')
 
+parser.add_argument('--seat_cache', type=int, action='store', default=0, dest='seat_cache_size',
+                    help='The size of the LRU cache of seat assignments, keyed on the votes in a district, '
+                         'the number of seats, and the seat rule. Useful for small districts with few parties, '
+                         'where the same results repeat often. Zero (default) disables the cache.')
+
 parser.add_argument('--alternative_systems', action='store', default=None, dest='alternative_systems',
                     type=raise_error("'alternative_systems' argument can not be provided in the command line. If used, "
                                      "it must be specified in the configuration file."),
@@ -97,6 +102,37 @@ parser.add_argument('--reset', action='store_const', default=False, const=True,
 parser.add_argument('--random_districts', action='store_const', default=False, const=True, dest='random_dist',
                     help='whether districts should be random and not correspond to the topological communities')
 
+parser.add_argument('--save_tallies', action='store_const', default=False, const=True, dest='save_tallies',
+                    help='whether to save the votes of every sample per district and party, so that other '
+                         'electoral systems can be evaluated later without running the simulation again, '
+                         'see scripts/evaluate_tallies.py')
+
+parser.add_argument('--result_format', action='store', default='stream', choices=('stream', 'jsonl', 'npz', 'json'),
+                    dest='result_format',
+                    help='the format of the results file: stream (default) is a binary record stream and jsonl '
+                         'is JSON Lines, both written in batches while the simulation is running, npz is a columnar '
+                         'binary format and json is the legacy format, both written at the end; '
+                         'scripts/convert_results.py converts between them')
+
+parser.add_argument('--result_batch', type=int, action='store', default=100, dest='result_batch',
+                    help='the number of samples written at once with the stream and jsonl result formats')
+
+parser.add_argument('--profile', type=str, action='store', default=None, dest='profile_phase',
+                    help='the name of a phase of the simulation to profile with cProfile, e.g. run_simulation, '
+                         'thermalization, or voting (all electoral systems); the profile is saved next to the results '
+                         'and the timing report, phases are listed in the timing report')
+parser.add_argument('--progress', type=float, action='store', default=30.0, dest='progress_interval',
+                    help='the minimal number of seconds between reports of the progress (stage, samples done, '
+                         'steps per second, ETA and memory), also written to results/progress<suffix>.json '
+                         'to follow simulations running in parallel with scripts/progress.py; 0 disables reports')
+parser.add_argument('--memory_budget', type=float, action='store', default=None, dest='memory_budget',
+                    help='the memory (in MB) available for the simulation; the memory needed is estimated before '
+                         'the simulation starts, if it exceeds the budget the results are streamed to the file and '
+                         'tallies are kept compact, and if it is still too much the simulation is not started')
+parser.add_argument('--trace_memory', action='store_const', default=False, const=True, dest='trace_memory',
+                    help='whether to measure the peak memory allocated in every phase of the simulation with '
+                         'tracemalloc (slows down the simulation), the resident memory is always reported')
+
 parser.add_argument('--consensus', action='store_const', default=False, const=True, dest='consensus',
                     help='whether to initialize the network in a consensus state (other than the zealot state)')
 
@@ -124,6 +160,45 @@ parser.add_argument('-p', '--propagation', action='store', default='standard',
                     choices=('standard', 'majority', 'minority'), dest='propagation',
                     help='propagation method to determine a new state based on the states of the neighbours')
 
+parser.add_argument('--sampler', action='store', default='mcmc', choices=('mcmc', 'dual'), dest='sampler',
+                    help='how the samples are drawn: mcmc (default) runs the dynamics for mc_steps between samples, '
+                         'dual draws exact independent samples from the stationary distribution with coalescing '
+                         'random walks, without thermalization (only the standard propagation with epsilon > 0)')
+
+parser.add_argument('--update_mode', action='store', default='sequential',
+                    choices=('sequential', 'hybrid', 'colouring', 'free'), dest='update_mode',
+                    help='the update scheme of the network: sequential (default) updates one random node at a time, '
+                         'hybrid is the same dynamics with mutations drawn and applied in bulk, faster for high noise '
+                         '(see simulation/hybrid.py), colouring updates at once all nodes of a colour class '
+                         'of a greedy colouring (nodes sharing no links), a distinct but much faster scheme, '
+                         'see simulation/colouring.py, free is the same dynamics as sequential running only '
+                         'the updates of nodes which are not zealots, faster with many zealots '
+                         '(see simulation/free.py)')
+parser.add_argument('--engine', action='store', default='network', choices=('network', 'metapopulation', 'domains'),
+                    dest='engine',
+                    help='what is simulated: network (default) runs the dynamics on the whole network, metapopulation '
+                         'follows only the number of nodes in every state in every district, a fast approximation '
+                         'for dense districts (only the standard propagation, see simulation/metapopulation.py), '
+                         'domains runs the network divided into groups of districts in parallel processes '
+                         '(only the standard propagation, see simulation/domains.py)')
+parser.add_argument('--processes', type=int, action='store', default=None, dest='processes',
+                    help='the number of worker processes of the domains engine, all cores by default')
+parser.add_argument('--sync_interval', type=float, action='store', default=0.1, dest='sync_interval',
+                    help='how often the domains engine exchanges the states of nodes on the boundaries of domains, '
+                         'in Monte Carlo steps (n steps), shorter intervals are closer to the exact dynamics')
+parser.add_argument('--storage', action='store', default='memory', choices=('memory', 'mmap'), dest='storage',
+                    help='where the network is kept: memory (default) in an igraph graph, mmap in memory-mapped '
+                         'files generated district by district, for networks larger than the memory (only '
+                         'the standard propagation and the network or domains engines, see net_generation/storage.py)')
+parser.add_argument('--storage_dir', action='store', default=None, dest='storage_dir',
+                    help='the directory for the files of the mmap storage, a temporary directory removed at the end '
+                         'by default')
+parser.add_argument('--relaxation', action='store', default='off', choices=('off', 'propose', 'apply'),
+                    dest='relaxation',
+                    help='whether to estimate the relaxation time from the spectrum of the generated network, '
+                         'epsilon and zealots (see simulation/relaxation.py): propose logs the proposed therm_time '
+                         'and mc_steps, apply uses them instead of the given ones')
+
 # WARNING! When there is more than 2 states/parties the default value of mass media (0.5) is no longer neutral!
 parser.add_argument('-np', '--num_parties', type=int, action='store', default=2, dest='num_parties',
                     help='The number of parties to consider, i.e. the number of possible states of nodes')
@@ -137,11 +212,12 @@ parser.add_argument('--config_file', action='store', default=None, dest='config_
                          'as the name in the namespace ("dest" argument).')
 
 
-def get_arguments():
+def get_arguments(args=None):
     """
     Reads the arguments from the standard in and raises an error if some
     data is missing.
+    :param args: a list of arguments to parse instead of the command line ones (e.g. in benchmarks)
     :result: a Config class object with values for the arguments and other configuration
     """
     # necessary to pass this protected dict in order to trouble-check the redundant parameters
-    return Config(parser.parse_args(), parser._option_string_actions)
+    return Config(parser.parse_args(args), parser._option_string_actions, argv=args)
@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
+import sys
 import unittest
 import json
+from decimal import Decimal
 from argparse import Namespace
 
 from configuration.config import Config, num_to_chars, generate_state_labels
 from configuration.parser import parser
 from electoral_sys.seat_assignment import seat_assignment_rules
-from simulation.base import majority_propagation
+from simulation.base import majority_propagation, run_simulation
+from simulation.colouring import run_colouring_sweeps
+from simulation.domains import run_domains
+from simulation.mapped import run_mapped_simulation
+from simulation.hybrid import run_hybrid
+from simulation.free import run_free_simulation
 from net_generation.base import consensus_initial_state
 
 
@@ -27,12 +34,28 @@ class DummyParser(Namespace):
         self.n_zealots = 1
         self.num_parties = 2
         self.planar_c = None
+        self.profile_phase = None
+        self.progress_interval = 30.0
+        self.memory_budget = None
+        self.trace_memory = False
         self.propagation = 'standard'
+        self.sampler = 'mcmc'
+        self.relaxation = 'off'
+        self.engine = 'network'
+        self.processes = None
+        self.sync_interval = 0.1
+        self.storage = 'memory'
+        self.storage_dir = None
+        self.update_mode = 'sequential'
         self.q = 25
         self.random_dist = False
         self.ratio = 0.02
         self.reset = False
+        self.result_batch = 100
+        self.result_format = 'stream'
         self.sample_size = 500
+        self.save_tallies = False
+        self.seat_cache_size = 0
         self.seat_rule = 'simple'
         self.seats = [1]
         self.therm_time = 300000
@@ -122,6 +145,7 @@ class TestConfiguration(unittest.TestCase):
         self.assertTrue(callable(Config.initialize_states))
         self.assertTrue(callable(Config.propagate))
         self.assertTrue(callable(Config.mutate))
+        self.assertTrue(callable(Config.simulate))
 
     def test_config_basic_attributes_values(self):
         self.maxDiff = None
@@ -320,6 +344,80 @@ class TestConfiguration(unittest.TestCase):
         input_parser = DummyParser(mass_media=1.1)
         self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
 
+    def test_config_attributes_values_dual_sampler(self):
+        config = Config(DummyParser(sampler='dual'), ArgumentDict())
+        self.assertTrue(config.suffix.endswith('_dual'))
+
+    def test_config_attributes_values_dual_sampler_majority(self):
+        input_parser = DummyParser(sampler='dual', propagation='majority')
+        self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
+    def test_config_attributes_values_dual_sampler_no_noise(self):
+        input_parser = DummyParser(sampler='dual', epsilon=0.0)
+        self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
+    def test_config_attributes_values_relaxation(self):
+        self.assertTrue(Config(DummyParser(relaxation='apply'), ArgumentDict()).suffix.endswith('_relaxed'))
+        self.assertNotIn('_relaxed', Config(DummyParser(relaxation='propose'), ArgumentDict()).suffix)
+
+    def test_config_attributes_values_metapopulation(self):
+        config = Config(DummyParser(engine='metapopulation', relaxation='apply'), ArgumentDict())
+        self.assertTrue(config.suffix.endswith('_meta'))
+        self.assertEqual(config.relaxation, 'off')
+        for kwargs in ({'propagation': 'minority'}, {'sampler': 'dual'}, {'random_dist': True}):
+            input_parser = DummyParser(engine='metapopulation', **kwargs)
+            self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
+    def test_config_attributes_values_colouring(self):
+        config = Config(DummyParser(update_mode='colouring'), ArgumentDict())
+        self.assertTrue(config.suffix.endswith('_colouring'))
+        self.assertEqual(config.simulate, run_colouring_sweeps)
+        self.assertEqual(Config(DummyParser(), ArgumentDict()).simulate, run_simulation)
+        for kwargs in ({'engine': 'metapopulation'}, {'sampler': 'dual'}):
+            input_parser = DummyParser(update_mode='colouring', **kwargs)
+            self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
+    def test_config_attributes_values_hybrid(self):
+        config = Config(DummyParser(update_mode='hybrid'), ArgumentDict())
+        self.assertEqual(config.simulate, run_hybrid)
+        self.assertNotIn('_colouring', config.suffix)
+        input_parser = DummyParser(update_mode='hybrid', sampler='dual')
+        self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
+    def test_config_attributes_values_free(self):
+        config = Config(DummyParser(update_mode='free'), ArgumentDict())
+        self.assertEqual(config.simulate, run_free_simulation)
+        self.assertEqual(config.suffix, Config(DummyParser(), ArgumentDict()).suffix)
+        for kwargs in ({'engine': 'metapopulation'}, {'engine': 'domains'}, {'storage': 'mmap'}):
+            input_parser = DummyParser(update_mode='free', **kwargs)
+            self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'the domains engine needs Python 3.8')
+    def test_config_attributes_values_domains(self):
+        config = Config(DummyParser(engine='domains', processes=2), ArgumentDict())
+        self.assertTrue(config.suffix.endswith('_domains'))
+        self.assertEqual(config.simulate, run_domains)
+        for kwargs in ({'propagation': 'majority'}, {'sampler': 'dual'}, {'update_mode': 'hybrid'}, {'processes': 0},
+                       {'sync_interval': 0.0}):
+            input_parser = DummyParser(engine='domains', **kwargs)
+            self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
+    @unittest.skipIf(sys.version_info >= (3, 8), 'the domains engine works with Python 3.8')
+    def test_config_attributes_values_domains_old_python(self):
+        self.assertRaises(ValueError, Config, DummyParser(engine='domains'), ArgumentDict())
+
+    def test_config_attributes_values_mmap_storage(self):
+        config = Config(DummyParser(storage='mmap', relaxation='apply'), ArgumentDict())
+        self.assertEqual(config.simulate, run_mapped_simulation)
+        self.assertEqual(config.relaxation, 'off')
+        if sys.version_info >= (3, 8):
+            self.assertEqual(Config(DummyParser(storage='mmap', engine='domains'), ArgumentDict()).simulate,
+                             run_domains)
+        for kwargs in ({'propagation': 'majority'}, {'sampler': 'dual'}, {'update_mode': 'colouring'},
+                       {'engine': 'metapopulation'}, {'random_dist': True}):
+            input_parser = DummyParser(storage='mmap', **kwargs)
+            self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
+
     def test_config_attributes_values_seats_empty(self):
         input_parser = DummyParser(seats=[])
         self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
@@ -328,6 +426,32 @@ class TestConfiguration(unittest.TestCase):
         input_parser = DummyParser(seat_rule='wrong seat rule 123')
         self.assertRaises(ValueError, Config, input_parser, ArgumentDict())
 
+    def test_config_attributes_values_seat_cache(self):
+        input_parser = DummyParser(seat_cache_size=100)
+        input_parser.alternative_systems = [{'name': 'one', 'type': 'basic', 'seat_rule': 'hare'}]
+        config = Config(input_parser, ArgumentDict())
+        self.assertEqual(config.seat_cache.maxsize, 100)
+        self.assertNotEqual(config.seat_alloc_function, seat_assignment_rules['simple'])
+        self.assertNotEqual(config.alternative_systems[0]['seat_alloc_function'], seat_assignment_rules['hare'])
+        self.assertDictEqual(config.seat_alloc_function(3, votes={'a': 1, 'b': 2}, vote_fractions={
+            'a': Decimal(1) / 3, 'b': Decimal(2) / 3}), {'a': 1, 'b': 2})
+        self.assertEqual(config.seat_cache.misses, 1)
+
+    def test_config_attributes_values_no_seat_cache(self):
+        config = Config(DummyParser(), ArgumentDict())
+        self.assertIsNone(config.seat_cache)
+        self.assertEqual(config.seat_alloc_function, seat_assignment_rules['simple'])
+
+    def test_config_voting_systems_not_shared(self):
+        input_parser = DummyParser()
+        input_parser.alternative_systems = [{'name': 'one', 'type': 'basic', 'seat_rule': 'hare'}]
+        first = Config(input_parser, ArgumentDict())
+        second = Config(DummyParser(), ArgumentDict())
+        self.assertIn('one', first.voting_systems)
+        self.assertListEqual(list(second.voting_systems.keys()), ['countrywide_system', 'main_district_system'])
+        self.assertNotEqual(first.voting_systems['main_district_system'],
+                            second.voting_systems['main_district_system'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorised versions of the electoral systems, which evaluate at once many elections stored as a tensor
+of tallies with a shape (samples, q, parties), e.g. recorded with the --save_tallies option of main.py.
+Seat assignment is done in exact integer arithmetic where possible, and draws are resolved by a random
+tie-break with the same probabilities as in the seat_assignment module.
+"""
+import numpy as np
+from fractions import Fraction
+
+from electoral_sys.electoral_system import compile_merging
+
+
+###########################################################
+#                                                         #
+#                   Helpful functions                     #
+#                                                         #
+###########################################################
+
+def top_k_mask(scores, k):
+    """
+    Selects the k highest scores along the last axis, draws between equal scores are resolved at random,
+    i.e. any subset of the tied entries at the cut-off is selected with equal probability.
+    :param scores: numpy array with a shape (..., m)
+    :param k: numpy array of ints with the shape of scores without the last axis, the number of entries to select
+    :return: boolean numpy array with the shape of scores, True for selected entries
+    """
+    tie_break = np.random.random(scores.shape)
+    # lexsort sorts by the last key first, so the scores decide and the random numbers resolve the draws
+    order = np.lexsort((tie_break, -scores), axis=-1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(scores.shape[-1]), axis=-1)
+    return ranks < np.asarray(k)[..., None]
+
+
+def check_votes(totals):
+    """
+    Raises an error if there is a district without votes, where seats can not be assigned.
+    :param totals: numpy array with the total number of votes per district
+    :return: None
+    """
+    if np.any(totals == 0):
+        raise ValueError('There is an electoral district without any votes, seats can not be assigned.')
+
+
+###########################################################
+#                                                         #
+#              Vectorised seat assignment                 #
+#                                                         #
+###########################################################
+
+def batch_fptp(votes, seats):
+    """
+    Vectorised first_past_the_post().
+    :param votes: numpy array with a shape (samples, districts, parties), the number of votes
+    :param seats: numpy array with a shape (districts,), the number of seats per district
+    :return: numpy array with a shape (samples, districts, parties), the number of seats
+    """
+    winners = top_k_mask(votes, np.ones(votes.shape[:-1], dtype=int))
+    return winners * seats[None, :, None]
+
+
+def batch_highest_averages(votes, seats, divisors):
+    """
+    Vectorised highest_averages_formula(). Every party has a list of quotients (its votes divided by consecutive
+    divisors) and the seats go to the highest quotients in the district. Quotients of one party are decreasing,
+    so it's enough to consider as many of them as the number of seats.
+    :param votes: numpy array with a shape (samples, districts, parties), the number of votes
+    :param seats: numpy array with a shape (districts,), the number of seats per district
+    :param divisors: numpy array with consecutive divisors, at least as long as the highest number of seats
+    :return: numpy array with a shape (samples, districts, parties), the number of seats
+    """
+    max_seats = int(seats.max())
+    quotients = votes[..., None] / divisors[None, None, None, :max_seats]
+    flat = quotients.reshape(votes.shape[:-1] + (-1,))
+    selected = top_k_mask(flat, np.broadcast_to(seats, votes.shape[:-1]))
+    return selected.reshape(quotients.shape).sum(axis=-1)
+
+
+def batch_largest_remainder(votes, seats, numerators, denominators):
+    """
+    Vectorised largest_remainder_formula(). The quota is provided as a fraction, so that the number of seats
+    of each party (votes / quota) and the remainders are computed in exact integer arithmetic.
+    :param votes: numpy array with a shape (samples, districts, parties), the number of votes
+    :param seats: numpy array with a shape (districts,), the number of seats per district
+    :param numerators: numpy array broadcastable to (samples, districts, 1), multiplies the votes
+    :param denominators: numpy array broadcastable to (samples, districts, 1), divides the votes
+    :return: numpy array with a shape (samples, districts, parties), the number of seats, which might sum up
+    to more than the number of seats in a district for some quotas
+    """
+    scaled = votes * numerators
+    assignment = scaled // denominators
+    remainders = scaled % denominators
+    remaining = np.clip(seats[None, :] - assignment.sum(axis=-1), 0, None)
+    return assignment + top_k_mask(remainders, remaining)
+
+
+def batch_quota(votes, seats, seat_rule):
+    """
+    Vectorised largest remainder methods, including the fallbacks of exact_droop_quota() and imperiali_quota()
+    when too many seats are assigned.
+    :param votes: numpy array with a shape (samples, districts, parties), the number of votes
+    :param seats: numpy array with a shape (districts,), the number of seats per district
+    :param seat_rule: one of 'simple', 'hare', 'droop', 'exact_droop', 'imperiali_quota'
+    :return: numpy array with a shape (samples, districts, parties), the number of seats
+    """
+    totals = votes.sum(axis=-1, keepdims=True)
+    s = seats[None, :, None]
+    if seat_rule in ('hare', 'simple'):
+        # in exact arithmetic the simple rule is the same as the Hare quota
+        return batch_largest_remainder(votes, seats, s, totals)
+    if seat_rule == 'droop':
+        return batch_largest_remainder(votes, seats, 1, 1 + totals // (s + 1))
+
+    fallback_rule = {'exact_droop': 'droop', 'imperiali_quota': 'exact_droop'}[seat_rule]
+    quota_shift = {'exact_droop': 1, 'imperiali_quota': 2}[seat_rule]
+    assignment = batch_largest_remainder(votes, seats, s + quota_shift, totals)
+    too_many = assignment.sum(axis=-1) > seats[None, :]
+    if np.any(too_many):
+        assignment = np.where(too_many[..., None], batch_quota(votes, seats, fallback_rule), assignment)
+    return assignment
+
+
+def batch_seat_assignment(votes, seats, seat_rule):
+    """
+    Assigns seats in every district of every sample at once.
+    :param votes: numpy array with a shape (samples, districts, parties), the number of votes
+    :param seats: a list with the number of seats per district
+    :param seat_rule: (string) one of batch_seat_assignment_rules
+    :return: numpy array with a shape (samples, districts, parties), the number of seats
+    """
+    seats = np.asarray(seats, dtype=np.int64)
+    votes = np.asarray(votes, dtype=np.int64)
+    check_votes(votes.sum(axis=-1))
+
+    if seat_rule == 'fptp':
+        return batch_fptp(votes, seats)
+    if seat_rule in batch_divisors:
+        return batch_highest_averages(votes, seats, batch_divisors[seat_rule](int(seats.max())))
+    return batch_quota(votes, seats, seat_rule)
+
+
+# divisors of the highest-averages methods as functions of the number of quotients needed
+batch_divisors = {
+    'jefferson': lambda k: np.arange(k) + 1.0,
+    'webster': lambda k: 2.0 * np.arange(k) + 1.0,
+    'modified_webster': lambda k: np.concatenate(([1.4], 2.0 * np.arange(1, k) + 1.0)),
+    'imperiali_average': lambda k: np.arange(k) + 2.0,
+}
+
+# seat assignment methods that can be evaluated in batches, the same as keys of seat_assignment_rules
+batch_seat_assignment_rules = ('simple', 'jefferson', 'webster', 'modified_webster', 'imperiali_average', 'hare',
+                               'droop', 'exact_droop', 'imperiali_quota', 'fptp')
+
+
+###########################################################
+#                                                         #
+#              Vectorised electoral systems               #
+#                                                         #
+###########################################################
+
+def batch_threshold(tallies, threshold):
+    """
+    Vectorised apply_tally_threshold(), masks the votes of parties below the threshold in every sample.
+    If no party reaches the threshold in a sample, the threshold is ignored in that sample.
+    :param tallies: numpy array with a shape (samples, q, parties), the number of votes per district and party
+    :param threshold: the electoral entry threshold (float)
+    :return: numpy array with a shape (samples, q, parties), the tallies with votes below the threshold masked
+    """
+    if threshold == 0.0:
+        return tallies
+    # the comparison is done in integers, as with Decimal(str(threshold)) in the electoral_system module
+    fraction = Fraction(str(threshold))
+    votes = tallies.sum(axis=1)
+    excluded = votes * fraction.denominator < fraction.numerator * votes.sum(axis=-1, keepdims=True)
+    masked = np.where(excluded[:, None, :], 0, tallies)
+    nobody_above = masked.sum(axis=(1, 2)) == 0
+    return np.where(nobody_above[:, None, None], tallies, masked)
+
+
+def batch_voting(tallies, seat_rule, seats_per_district=None, total_seats=None, threshold=0.0, merging_plan=None,
+                 countrywide=False):
+    """
+    Evaluates one electoral system for all samples.
+    :param tallies: numpy array with a shape (samples, q, parties), the number of votes per district and party
+    :param seat_rule: (string) the seat assignment method, one of batch_seat_assignment_rules
+    :param seats_per_district: a list with the number of seats per district (main districts if merging_plan is used)
+    :param total_seats: the total number of seats
+    :param threshold: the electoral entry threshold (float)
+    :param merging_plan: the merging of districts precompiled with compile_merging()
+    :param countrywide: whether all districts form a single district with total_seats seats
+    :return: numpy arrays with a shape (samples, parties): the number of seats and the fraction of seats per party
+    """
+    tallies = batch_threshold(np.asarray(tallies, dtype=np.int64), threshold)
+    if countrywide:
+        districts = tallies.sum(axis=1, keepdims=True)
+        seats = [total_seats]
+    elif merging_plan is not None:
+        order, starts, seats = merging_plan
+        districts = np.add.reduceat(tallies[:, order], starts, axis=1)
+    else:
+        districts = tallies
+        seats = seats_per_district
+
+    seat_assignment = batch_seat_assignment(districts, seats, seat_rule).sum(axis=1)
+    return seat_assignment, seat_assignment / total_seats
+
+
+def batch_vote_fractions(tallies):
+    """
+    Computes the fraction of votes obtained by each party in the whole country.
+    :param tallies: numpy array with a shape (samples, q, parties), the number of votes per district and party
+    :return: numpy array with a shape (samples, parties)
+    """
+    votes = np.asarray(tallies).sum(axis=1)
+    return votes / votes.sum(axis=-1, keepdims=True)
+
+
+def batch_voting_systems(config):
+    """
+    Creates vectorised versions of all electoral systems defined in the configuration,
+    i.e. the main systems and all alternative systems, as in Config.voting_systems.
+    :param config: Config class from configuration module
+    :return: dict {name of the system: function taking tallies and returning the result of batch_voting()}
+    """
+    def wrap(**kwargs):
+        def inner(tallies):
+            return batch_voting(tallies, **kwargs)
+        return inner
+
+    main_kwargs = dict(seat_rule=config.seat_rule, seats_per_district=config.seats_per_district,
+                       total_seats=config.total_seats, threshold=config.threshold)
+    systems = {'countrywide_system': wrap(countrywide=True, **main_kwargs),
+               'main_district_system': wrap(**main_kwargs)}
+
+    for alt in config.alternative_systems or []:
+        if alt['type'] == 'basic':
+            systems[alt['name']] = wrap(seat_rule=alt['seat_rule'], seats_per_district=alt['seats_per_district'],
+                                        total_seats=alt['total_seats'], threshold=alt['threshold'])
+        elif alt['q'] == 1:
+            systems[alt['name']] = wrap(seat_rule=alt['seat_rule'], total_seats=alt['total_seats'],
+                                        threshold=alt['threshold'], countrywide=True)
+        else:
+            systems[alt['name']] = wrap(seat_rule=alt['seat_rule'], total_seats=alt['total_seats'],
+                                        threshold=alt['threshold'],
+                                        merging_plan=compile_merging(alt['dist_merging'], alt['seats_per_district']))
+    return systems
+
+
+def evaluate_tallies(tallies, config, states=None, chunk_size=1000):
+    """
+    Evaluates all electoral systems from the configuration for all stored samples and returns results
+    in the same format as main.run_experiment(), so they can be saved and plotted in the same way.
+    :param tallies: numpy array with a shape (samples, q, parties), the number of votes per district and party
+    :param config: Config class from configuration module
+    :param states: labels of the parties (columns of the tallies), config.all_states by default
+    :param chunk_size: the number of samples evaluated at once, to bound the memory usage
+    :return: dict {name of the system: list of dicts {party: seat fraction}, 'vote_fractions': list of dicts}
+    """
+    if states is None:
+        states = config.all_states
+    systems = batch_voting_systems(config)
+    results = {system: [] for system in systems.keys()}
+    results['vote_fractions'] = []
+
+    for start in range(0, len(tallies), chunk_size):
+        chunk = np.asarray(tallies[start:start + chunk_size])
+        for system, voting_function in systems.items():
+            _, seat_fractions = voting_function(chunk)
+            results[system].extend(dict(zip(states, row.tolist())) for row in seat_fractions)
+        results['vote_fractions'].extend(dict(zip(states, row.tolist())) for row in batch_vote_fractions(chunk))
+
+    return results
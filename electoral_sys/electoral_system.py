@@ -2,6 +2,7 @@
 """
 Functions used to model different election systems and apply them to the distributions of voters
 """
+import numpy as np
 from decimal import Decimal
 from collections import Counter
 
@@ -179,6 +180,214 @@ def merged_districts_voting(voters, states=None, total_seats=None, assignment_fu
             'votes': votes}
 
 
+###########################################################
+#                                                         #
+#           Tally-based vote-counting functions           #
+#                                                         #
+###########################################################
+
+def tally_votes(voters, states, q=None):
+    """
+    Counts the votes casted for each party in each district in a single pass over the voters.
+    The tally can then be shared by all electoral systems evaluated on the same election.
+    :param voters: collection of voters with 'state' and 'district' parameters, igraph.VertexSeq object
+    :param states: all possible states of voters (votes), the order of columns in the tally
+    :param q: the number of districts, if None it is taken as the highest district id plus one
+    :return: numpy array with a shape (q, len(states)), the number of votes in each district (row) for each party
+    """
+    state_index = {state: i for i, state in enumerate(states)}
+    parties = np.fromiter((state_index[state] for state in voters['state']), dtype=int, count=len(voters))
+    districts = np.array(voters['district'], dtype=int)
+    if q is None:
+        q = int(districts.max()) + 1
+    tally = np.bincount(districts * len(states) + parties, minlength=q * len(states))
+    return tally.reshape(q, len(states))
+
+
+def party_votes(votes_per_party, states):
+    """
+    Translates a row of the tally into the votes and fractions of votes per party, as used by the seat assignment.
+    :param votes_per_party: numpy array with the number of votes for each party, in the order of states
+    :param states: all possible states of voters (votes)
+    :return: votes per party (Counter), fractions of votes per party (dict)
+    """
+    votes = Counter({party: int(v) for party, v in zip(states, votes_per_party)})
+    total_votes = Decimal(sum(votes.values()))
+    vote_fractions = {party: Decimal(v) / total_votes for party, v in votes.items()}
+    return votes, vote_fractions
+
+
+def apply_tally_threshold(system_func):
+    """
+    Works like apply_threshold(), but for electoral systems operating on a tally of votes (see tally_votes()).
+    Instead of selecting the voters of parties above the threshold, the columns of the parties below
+    the threshold are masked in the tally, which gives the same results without counting the votes again.
+    :param system_func: a function representing electoral system operating on a tally
+    :return: decorated function
+    """
+    def inner(tally, *args, states=None, threshold=0.0, **kwargs):
+        """
+        Function applying the electoral threshold (minimal share of total votes to be considered at all)
+        and masking the votes of those parties that are below the threshold.
+        :param tally: numpy array with a shape (q, len(states)), the number of votes per district and party
+        :param states: all possible states of voters (votes), the order of columns in the tally
+        :param threshold: the electoral entry threshold (float)
+        :return: the original electoral system function
+        """
+        if threshold != 0.0:
+            votes, vote_fractions = party_votes(tally.sum(axis=0), states)
+
+            # get the parties below threshold, which should be fewer than above
+            excluded = np.array([vote_fractions[party] < Decimal(str(threshold)) for party in states])
+
+            if excluded.any():
+                masked_tally = np.where(excluded, 0, tally)
+
+                # check if any party has made it above the threshold to avoid issues
+                if masked_tally.sum() > 0:
+                    tally = masked_tally
+                else:
+                    # this shouldn't happen in reasonable scenarios
+                    log.error('No party has reached the entry threshold, so the threshold is being ignored')
+
+            res = system_func(tally, *args, states=states, **kwargs)
+
+            # we want the absolute fraction of votes casted for each party to compute proportionality indexes etc.
+            return dict(res, vote_fractions=vote_fractions, votes=votes)
+        else:
+            return system_func(tally, *args, states=states, **kwargs)
+
+    return inner
+
+
+@apply_tally_threshold
+def single_district_tally_voting(tally, states=None, total_seats=None, assignment_func=None, **kw):
+    """
+    Works like single_district_voting(), but takes the votes from a tally, all districts are treated as one.
+    :param tally: numpy array with a shape (q, len(states)), the number of votes per district and party
+    :param states: all possible states of voters (votes), the order of columns in the tally
+    :param total_seats: the total number of seats available in the district
+    :param assignment_func: the function to use for assigning seats for parties
+    :return: the number and the fraction of votes obtained, and the number and the fraction of seats obtained, per party
+    """
+    votes, vote_fractions = party_votes(tally.sum(axis=0), states)
+    total_votes = sum(votes.values())
+
+    # compute the seats obtained within the considered district
+    seat_assignment = Counter(assignment_func(total_seats, vote_fractions=vote_fractions,
+                                              votes=votes, total_votes=total_votes))
+    seat_fractions = {party: Decimal(seats) / Decimal(total_seats) for party, seats in seat_assignment.items()}
+
+    return {'seat_fractions': seat_fractions, 'seats': seat_assignment, 'vote_fractions': vote_fractions,
+            'votes': votes}
+
+
+def aggregate_districts(district_results, states, total_seats):
+    """
+    Aggregates the results of elections in many districts into the global result.
+    :param district_results: an iterable with results of single_district_tally_voting() for every district
+    :param states: all possible states of voters (votes)
+    :param total_seats: the total number of seats available in all districts
+    :return: the number and the fraction of votes obtained, and the number and the fraction of seats obtained, per party
+    """
+    seat_assignment = Counter()
+    votes = Counter()
+    for district_res in district_results:
+        seat_assignment += district_res['seats']
+        votes += district_res['votes']
+
+    # summation of counters above deletes the counts with value 0 from the result
+    for party in states:
+        if party not in seat_assignment:
+            seat_assignment[party] = 0
+        if party not in votes:
+            votes[party] = 0
+
+    vote_fractions = {party: Decimal(v) / Decimal(sum(votes.values())) for party, v in votes.items()}
+    seat_fractions = {party: Decimal(s) / Decimal(total_seats) for party, s in seat_assignment.items()}
+
+    # the final result is the aggregated result based on seats won in all districts
+    return {'seat_fractions': seat_fractions, 'seats': seat_assignment, 'vote_fractions': vote_fractions,
+            'votes': votes}
+
+
+@apply_tally_threshold
+def multi_district_tally_voting(tally, states=None, total_seats=None, assignment_func=None, seats_per_district=None,
+                                **kw):
+    """
+    Works like multi_district_voting(), but takes the votes from a tally, where each row is a separate district.
+    :param tally: numpy array with a shape (q, len(states)), the number of votes per district and party
+    :param states: all possible states of voters (votes), the order of columns in the tally
+    :param total_seats: the total number of seats available in the district
+    :param assignment_func: the function to use for assigning seats for parties
+    :param seats_per_district: a list with the number of seats per district,
+    index of the list entry corresponds to the number of the district
+    :return: the number and the fraction of votes obtained, and the number and the fraction of seats obtained, per party
+    """
+    district_results = (single_district_tally_voting(tally[district:district + 1], states=states,
+                                                     total_seats=seats_per_district[district],
+                                                     assignment_func=assignment_func)
+                        for district in range(len(seats_per_district)))
+    return aggregate_districts(district_results, states, total_seats)
+
+
+def compile_merging(dist_merging, seats_per_district):
+    """
+    Precompiles the merging of the main districts into new ones, so it doesn't have to be recomputed for every election.
+    The main districts are ordered so that those forming the same new district are next to each other, then the tally
+    of new districts is a single np.add.reduceat() over the rows of the main districts (see merge_tally()).
+    As every plan is expressed in terms of the main districts, nested hierarchies (e.g. constituencies merged into
+    divisions and the same constituencies merged into states) are just separate plans over the same tally.
+    :param dist_merging: a list of values, each unique value is a new district
+    and the main districts having the same value will be merged
+    :param seats_per_district: a list with the number of seats per main district
+    :return: (order of the main districts, indexes in the order where each new district starts,
+    list with the number of seats per new district)
+    """
+    new_ids = np.asarray(dist_merging)
+    order = np.argsort(new_ids, kind='stable')
+    sorted_ids = new_ids[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1])))
+    merged_seats = np.add.reduceat(np.asarray(seats_per_district)[order], starts).tolist()
+    return order, starts, merged_seats
+
+
+def merge_tally(tally, merging_plan):
+    """
+    Sums the votes of the main districts into the votes of new districts.
+    :param tally: numpy array with a shape (q, len(states)), the number of votes per district and party
+    :param merging_plan: a merging plan obtained from compile_merging()
+    :return: numpy array with a shape (new q, len(states)), the number of votes per new district and party
+    """
+    order, starts, _ = merging_plan
+    return np.add.reduceat(tally[order], starts, axis=0)
+
+
+@apply_tally_threshold
+def merged_districts_tally_voting(tally, states=None, total_seats=None, assignment_func=None, seats_per_district=None,
+                                  dist_merging=None, merging_plan=None, **kw):
+    """
+    Works like merged_districts_voting(), but takes the votes from a tally, where each row is one of the main
+    districts. Rows of the main districts having the same value in dist_merging are summed into a new district.
+    :param tally: numpy array with a shape (q, len(states)), the number of votes per district and party
+    :param states: all possible states of voters (votes), the order of columns in the tally
+    :param total_seats: the total number of seats available in the district
+    :param assignment_func: the function to use for assigning seats for parties
+    :param seats_per_district: a list with the number of seats per district,
+    index of the list entry corresponds to the number of the district
+    :param dist_merging: a list of values, each unique value is a new district
+    and the main districts having the same value will be merged
+    :param merging_plan: the merging precompiled with compile_merging(), if provided seats_per_district
+    and dist_merging are not used
+    :return: the number and the fraction of votes obtained, and the number and the fraction of seats obtained, per party
+    """
+    if merging_plan is None:
+        merging_plan = compile_merging(dist_merging, seats_per_district)
+
+    return multi_district_tally_voting(merge_tally(tally, merging_plan), states=states, total_seats=total_seats,
+                                       assignment_func=assignment_func, seats_per_district=merging_plan[2])
+
+
 @apply_threshold
 def mixed_voting(voters, states=None, total_seats=None, assignment_func=None, seats_per_district=None, **kw):
     """
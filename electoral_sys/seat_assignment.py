@@ -3,9 +3,11 @@
 This file contains functions assigning seats in a single district
 based on election result in that district.
 """
+import numbers
 import numpy as np
 from math import floor
 from decimal import Decimal
+from collections import OrderedDict
 
 from configuration.logging import log
 
@@ -17,13 +19,31 @@ from configuration.logging import log
 ###########################################################
 
 
-def simple_rule(total_seats, vote_fractions=None, **kwargs):
+def draw_ties(assignment, tied_parties, draws, seats_per_draw):
+    """
+    Default tie-break used by all seat assignment methods. Chooses uniformly at random 'draws' distinct parties
+    among the tied ones and gives each of them 'seats_per_draw' more seats. This is equivalent to breaking
+    the draw one seat at a time, as the parties that won a seat in a draw are never tied again in the same draw.
+    :param assignment: seat assignment resolved without any draw, a dict of a form {party_code: number_of_seats}
+    :param tied_parties: parties tied for the remaining seats (list)
+    :param draws: the number of parties to be drawn from tied_parties (int)
+    :param seats_per_draw: the number of seats given to each drawn party (int)
+    :return: seat assignment, a dict of a form {party_code: number_of_seats}
+    """
+    if draws > 0:
+        for party in np.random.choice(tied_parties, draws, replace=False):
+            assignment[party] += seats_per_draw
+    return assignment
+
+
+def simple_rule(total_seats, vote_fractions=None, tie_break=draw_ties, **kwargs):
     """
     This function starts with a floored assignment and keeps assigning seats to the
     party which has a fraction of seats with the greatest difference to their
     obtained fraction of votes, as in the Hamilton method.
     :param total_seats: total number of seats available in the district
     :param vote_fractions: fractions of votes gained in the district
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     assignment = {party: floor(fraction * total_seats) for party, fraction in vote_fractions.items()}
@@ -31,23 +51,24 @@ def simple_rule(total_seats, vote_fractions=None, **kwargs):
     diff = {party: assignment[party] - (total_seats * fraction) for party, fraction in vote_fractions.items()}
 
     while count < total_seats:
-        # find the party with the biggest difference between seats assigned and the fraction of seats voted for
-        worst_key = min(diff.keys(), key=lambda k: diff[k])
-        _min = diff[worst_key]
-
-        # if there is a draw, select a random single party (otherwise would be order-depending)
+        # find the parties with the biggest difference between seats assigned and the fraction of seats voted for
+        _min = min(diff.values())
         worst_keys = [key for key, difference in diff.items() if difference == _min]
-        worst_key = np.random.choice(worst_keys, 1)[0]
 
-        # increase the number of seats for that party by 1 and see if all sits are assigned now
-        assignment[worst_key] += 1
-        count += 1
-        diff[worst_key] = assignment[worst_key] - (total_seats * vote_fractions[worst_key])
+        # if there is a draw for the last seats, select random parties (otherwise would be order-depending)
+        if len(worst_keys) > total_seats - count:
+            return tie_break(assignment, worst_keys, total_seats - count, 1)
 
-    return assignment
+        # increase the number of seats for those parties by 1 and see if all sits are assigned now
+        for worst_key in worst_keys:
+            assignment[worst_key] += 1
+            diff[worst_key] = assignment[worst_key] - (total_seats * vote_fractions[worst_key])
+        count += len(worst_keys)
+
+    return tie_break(assignment, [], 0, 1)
 
 
-def first_past_the_post(total_seats, vote_fractions=None, **kwargs):
+def first_past_the_post(total_seats, vote_fractions=None, tie_break=draw_ties, **kwargs):
     """
     This function assigns all seats to the party with the highest fraction of votes,
     as in the First Past The Post elections. Usually the total number of seats is 1
@@ -56,13 +77,16 @@ def first_past_the_post(total_seats, vote_fractions=None, **kwargs):
     from among the best scores.
     :param total_seats: total number of seats available in the district
     :param vote_fractions: fractions of votes gained in the district
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     assignment = {party: 0 for party, fraction in vote_fractions.items()}
-    winners = [party for party, fraction in vote_fractions.items() if fraction == max(vote_fractions.values())]
-    winner = np.random.choice(winners, 1)[0]
-    assignment[winner] = total_seats
-    return assignment
+    best_score = max(vote_fractions.values())
+    winners = [party for party, fraction in vote_fractions.items() if fraction == best_score]
+    if len(winners) == 1:
+        assignment[winners[0]] = total_seats
+        return tie_break(assignment, [], 0, total_seats)
+    return tie_break(assignment, winners, 1, total_seats)
 
 
 ###########################################################
@@ -72,7 +96,7 @@ def first_past_the_post(total_seats, vote_fractions=None, **kwargs):
 ###########################################################
 
 
-def highest_averages_formula(quotients, divisor_func, total_seats, votes):
+def highest_averages_formula(quotients, divisor_func, total_seats, votes, tie_break=draw_ties):
     """
     General formula for the highest-averages seat assigning methods, aka divisor method.
     After providing the initial quotients and the divisor function it can compute the seat assigment
@@ -82,72 +106,80 @@ def highest_averages_formula(quotients, divisor_func, total_seats, votes):
     :param divisor_func: divisor function taking as an argument the number of seats assigned so far (function)
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     assignment = {party: 0 for party in votes.keys()}
+    count = 0
 
-    while sum(assignment.values()) < total_seats:
-        # find the party with the biggest quotient
-        round_winner = max(quotients.keys(), key=lambda k: quotients[k])
-        _max = quotients[round_winner]
-
-        # if there is a draw, select a random single party (otherwise would be order-depending)
+    while count < total_seats:
+        # find the parties with the biggest quotient
+        _max = max(quotients.values())
         round_winners = [key for key, quotient in quotients.items() if quotient == _max]
-        round_winner = np.random.choice(round_winners, 1)[0]
 
-        # increase the number of seats for that party by 1 and update the quotients
-        assignment[round_winner] += 1
-        quotients[round_winner] = Decimal(votes[round_winner]) / divisor_func(assignment[round_winner])
+        # if there is a draw for the last seats, select random parties (otherwise would be order-depending)
+        if len(round_winners) > total_seats - count:
+            return tie_break(assignment, round_winners, total_seats - count, 1)
 
-    return assignment
+        # increase the number of seats for those parties by 1 and update the quotients
+        for round_winner in round_winners:
+            assignment[round_winner] += 1
+            quotients[round_winner] = Decimal(votes[round_winner]) / divisor_func(assignment[round_winner])
+        count += len(round_winners)
 
+    return tie_break(assignment, [], 0, 1)
 
-def jefferson_method(total_seats, votes=None, **kwargs):
+
+def jefferson_method(total_seats, votes=None, tie_break=draw_ties, **kwargs):
     """
     This function uses the Jefferson method for seat assignment,
     also known as the D’Hondt method or Hagenbach-Bischoff method.
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     initial_quotients = {party: Decimal(v) for party, v in votes.items()}
-    return highest_averages_formula(initial_quotients, lambda x: x + 1, total_seats, votes)
+    return highest_averages_formula(initial_quotients, lambda x: x + 1, total_seats, votes, tie_break)
 
 
-def webster_method(total_seats, votes=None, **kwargs):
+def webster_method(total_seats, votes=None, tie_break=draw_ties, **kwargs):
     """
     This function uses the Webster method for seat assignment,
     also known as the Sainte-Laguë method, sometimes Schepers method.
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     initial_quotients = {party: Decimal(v) for party, v in votes.items()}
-    return highest_averages_formula(initial_quotients, lambda x: 2 * x + 1, total_seats, votes)
+    return highest_averages_formula(initial_quotients, lambda x: 2 * x + 1, total_seats, votes, tie_break)
 
 
-def modified_webster_method(total_seats, votes=None, **kwargs):
+def modified_webster_method(total_seats, votes=None, tie_break=draw_ties, **kwargs):
     """
     This function uses the modified Webster method for seat assignment,
     which starts with a divisor 1.4 instead of 1.
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     initial_quotients = {party: Decimal(v) / Decimal('1.4') for party, v in votes.items()}
-    return highest_averages_formula(initial_quotients, lambda x: 2 * x + 1, total_seats, votes)
+    return highest_averages_formula(initial_quotients, lambda x: 2 * x + 1, total_seats, votes, tie_break)
 
 
-def imperiali_method(total_seats, votes=None, **kwargs):
+def imperiali_method(total_seats, votes=None, tie_break=draw_ties, **kwargs):
     """
     This function uses the Imperiali highest-averages method for seat assignment
     (it's not the Imperiali quota which is a largest reminder method)
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     initial_quotients = {party: Decimal(v) / 2 for party, v in votes.items()}
-    return highest_averages_formula(initial_quotients, lambda x: x + 2, total_seats, votes)
+    return highest_averages_formula(initial_quotients, lambda x: x + 2, total_seats, votes, tie_break)
 
 
 ###########################################################
@@ -157,7 +189,7 @@ def imperiali_method(total_seats, votes=None, **kwargs):
 ###########################################################
 
 
-def largest_remainder_formula(quota, total_seats, votes):
+def largest_remainder_formula(quota, total_seats, votes, tie_break=draw_ties):
     """
     General formula for the largest reminder seat assigning methods.
     After providing the proper quota it can compute the seat assigment
@@ -165,84 +197,91 @@ def largest_remainder_formula(quota, total_seats, votes):
     :param quota: the quota value corresponding to a given formula (Decimal)
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     quotas = {party: v / quota for party, v in votes.items()}
     assignment = {party: floor(q) for party, q in quotas.items()}
     remainders = {party: q % 1 for party, q in quotas.items()}
+    count = sum(assignment.values())
 
-    while sum(assignment.values()) < total_seats:
+    while count < total_seats:
         largest_reminder = max(remainders.values())
-
-        # if there is a draw, select a random single party (otherwise would be order-depending)
         lr_parties = [party for party, reminder in remainders.items() if reminder == largest_reminder]
-        lr_party = np.random.choice(lr_parties, 1)[0]
 
-        # add one of the remaining seats to this party and look for the next biggest reminder
-        assignment[lr_party] += 1
-        remainders.pop(lr_party)
+        # if there is a draw for the last seats, select random parties (otherwise would be order-depending)
+        if len(lr_parties) > total_seats - count:
+            return tie_break(assignment, lr_parties, total_seats - count, 1)
 
-    return assignment
+        # add one of the remaining seats to these parties and look for the next biggest reminder
+        for lr_party in lr_parties:
+            assignment[lr_party] += 1
+            remainders.pop(lr_party)
+        count += len(lr_parties)
+
+    return tie_break(assignment, [], 0, 1)
 
 
-def hare_quota(total_seats, votes=None, total_votes=None, **kwargs):
+def hare_quota(total_seats, votes=None, total_votes=None, tie_break=draw_ties, **kwargs):
     """
     The Hare quota seat assigment method.
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
     :param total_votes: total number of votes casted (int)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     quota = Decimal(total_votes) / total_seats
-    return largest_remainder_formula(quota, total_seats, votes)
+    return largest_remainder_formula(quota, total_seats, votes, tie_break)
 
 
-def droop_quota(total_seats, votes=None, total_votes=None, **kwargs):
+def droop_quota(total_seats, votes=None, total_votes=None, tie_break=draw_ties, **kwargs):
     """
     The (original) Droop quota seat assigment method, also called rounded Droop quota.
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
     :param total_votes: total number of votes casted (int)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     quota = Decimal(1 + floor(Decimal(total_votes) / (total_seats + 1)))
-    return largest_remainder_formula(quota, total_seats, votes)
+    return largest_remainder_formula(quota, total_seats, votes, tie_break)
 
 
-def exact_droop_quota(total_seats, votes=None, total_votes=None, **kwargs):
+def exact_droop_quota(total_seats, votes=None, total_votes=None, tie_break=draw_ties, **kwargs):
     """
     The exact Droop quota seat assigment method, also known as Hagenbach-Bischoff quota.
     In the rare case of assigning more seats than available it will use the (original) Droop quota.
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
     :param total_votes: total number of votes casted (int)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     quota = Decimal(total_votes) / (total_seats + 1)
-    assignment = largest_remainder_formula(quota, total_seats, votes)
-    if sum(assignment.values()) > total_seats:
+    # only the floored quotas can exceed the number of seats, the remaining seats are never over-assigned
+    if sum(floor(v / quota) for v in votes.values()) > total_seats:
         log.warning('The exact Droop quota assigned more seats than available! Increasing the quota to avoid it.')
-        return droop_quota(total_seats, votes=votes, total_votes=total_votes)
-    else:
-        return assignment
+        return droop_quota(total_seats, votes=votes, total_votes=total_votes, tie_break=tie_break)
+    return largest_remainder_formula(quota, total_seats, votes, tie_break)
 
 
-def imperiali_quota(total_seats, votes=None, total_votes=None, **kwargs):
+def imperiali_quota(total_seats, votes=None, total_votes=None, tie_break=draw_ties, **kwargs):
     """
     The Imperiali quota seat assigment method.
     In the case of assigning more seats than available it will use the exact Droop quota instead.
     :param total_seats: total number of seats available in the district (int)
     :param votes: number of votes gained in the district by each party (dict)
     :param total_votes: total number of votes casted (int)
+    :param tie_break: function resolving the draw for the remaining seats, see draw_ties()
     :return: seat assignment, a dict of a form {party_code: number_of_seats}
     """
     quota = Decimal(total_votes) / (total_seats + 2)
-    assignment = largest_remainder_formula(quota, total_seats, votes)
-    if sum(assignment.values()) > total_seats:
+    # only the floored quotas can exceed the number of seats, the remaining seats are never over-assigned
+    if sum(floor(v / quota) for v in votes.values()) > total_seats:
         log.warning('The Imperiali quota assigned more seats than available! Using the Droop quota.')
-        return exact_droop_quota(total_seats, votes=votes, total_votes=total_votes)
-    else:
-        return assignment
+        return exact_droop_quota(total_seats, votes=votes, total_votes=total_votes, tie_break=tie_break)
+    return largest_remainder_formula(quota, total_seats, votes, tie_break)
 
 
 # collection of seat-assigning functions that can be used in configuration (--seat_rule argument)
@@ -258,3 +297,85 @@ seat_assignment_rules = {
     'imperiali_quota': imperiali_quota,
     'fptp': first_past_the_post,
 }
+
+
+###########################################################
+#                                                         #
+#              Caching of seat assignments                #
+#                                                         #
+###########################################################
+
+
+def keep_ties(assignment, tied_parties, draws, seats_per_draw):
+    """
+    A tie-break that does not break the draw, but returns it unresolved, so it can be stored and resolved later
+    with draw_ties(). Passed as the 'tie_break' argument it turns any seat assignment method into
+    a deterministic function of the election result.
+    :return: a tuple with the arguments of draw_ties()
+    """
+    return assignment, list(tied_parties), draws, seats_per_draw
+
+
+class SeatAssignmentCache:
+    """
+    A bounded LRU cache placed in front of the seat assignment methods from seat_assignment_rules.
+    In small districts with few parties the same election result repeats across samples, so the seat assignment
+    is computed once for each (seat_rule, total_seats, votes) key. The cache stores the assignment with unresolved
+    draws (see keep_ties()), so a cached result without a draw is returned directly and for a result with a draw
+    only the random tie-break is performed, with the same probabilities as without the cache.
+
+    :maxsize: the maximal number of stored election results
+    :hits: the number of seat assignments taken from the cache
+    :misses: the number of seat assignments computed and stored in the cache
+    """
+
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError(f'The size of the seat assignment cache must be positive, {maxsize} was provided.')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def wrap(self, seat_rule):
+        """
+        Creates a cached version of a seat assignment method.
+        :param seat_rule: (string) the name of the method, one of seat_assignment_rules.keys()
+        :return: a function with the same signature as the seat assignment methods
+        """
+        assignment_func = seat_assignment_rules[seat_rule]
+
+        def inner(total_seats, votes=None, **kwargs):
+            # the key requires integer votes, all other arguments (vote fractions etc.) are derived from them
+            if votes is None or not all(isinstance(v, numbers.Integral) for v in votes.values()):
+                return assignment_func(total_seats, votes=votes, **kwargs)
+
+            key = (seat_rule, total_seats, tuple(sorted(votes.items())))
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = assignment_func(total_seats, votes=votes, tie_break=keep_ties, **kwargs)
+                self._entries[key] = entry
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+
+            assignment, tied_parties, draws, seats_per_draw = entry
+            return draw_ties(dict(assignment), tied_parties, draws, seats_per_draw)
+
+        return inner
+
+    def report(self):
+        """
+        Logs the number of cache hits and misses.
+        :return: None
+        """
+        calls = self.hits + self.misses
+        hit_rate = round(100.0 * self.hits / calls, 1) if calls else 0.0
+        log.info(f'Seat assignment cache: {self.hits} hits, {self.misses} misses ({hit_rate}% hit rate), '
+                 f'{len(self)} of {self.maxsize} entries used')
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+from types import SimpleNamespace
+
+from electoral_sys.batch_evaluation import top_k_mask, batch_seat_assignment, batch_threshold, batch_voting
+from electoral_sys.batch_evaluation import batch_vote_fractions, evaluate_tallies, batch_seat_assignment_rules
+from electoral_sys.electoral_system import single_district_tally_voting, multi_district_tally_voting
+from electoral_sys.electoral_system import merged_districts_tally_voting, compile_merging
+from electoral_sys.seat_assignment import seat_assignment_rules
+
+
+def prime_tallies(samples, q, parties, seed=0):
+    """
+    Random tallies with distinct prime numbers of votes, which makes draws in seat assignment very unlikely.
+    """
+    sieve = np.ones(20000, dtype=bool)
+    sieve[:2] = False
+    for i in range(2, 142):
+        sieve[i * i::i] = False
+    primes = np.flatnonzero(sieve)[200:]
+    rng = np.random.RandomState(seed)
+    return rng.choice(primes, size=samples * q * parties, replace=False).reshape(samples, q, parties)
+
+
+class TestBatchEvaluation(unittest.TestCase):
+
+    def test_top_k_mask(self):
+        scores = np.array([[5, 1, 3, 4], [0, 2, 2, 1]])
+        mask = top_k_mask(scores, np.array([2, 3]))
+        np.testing.assert_array_equal(mask, [[True, False, False, True], [False, True, True, True]])
+
+    def test_top_k_mask_draw(self):
+        winners = np.zeros(3)
+        for _ in range(300):
+            winners += top_k_mask(np.array([2, 2, 2]), np.array(1))
+        self.assertEqual(winners.sum(), 300)
+        self.assertTrue(np.all(winners > 50))
+
+    def test_batch_seat_assignment_same_as_rules(self):
+        states = ['a', 'b', 'c', 'd', 'e']
+        tallies = prime_tallies(20, 3, 5)
+        seats = [7, 1, 12]
+        for seat_rule in batch_seat_assignment_rules:
+            batch = batch_seat_assignment(tallies, seats, seat_rule)
+            for i in range(tallies.shape[0]):
+                for d in range(tallies.shape[1]):
+                    res = single_district_tally_voting(tallies[i, d:d + 1], states=states, total_seats=seats[d],
+                                                       assignment_func=seat_assignment_rules[seat_rule])
+                    self.assertListEqual(batch[i, d].tolist(), [res['seats'][p] for p in states],
+                                         msg=f'seat rule {seat_rule}, sample {i}, district {d}')
+
+    def test_batch_seat_assignment_too_many_seats(self):
+        # the same as test_imperiali_quota_too_many_seats in seat_assignment_tests
+        res = batch_seat_assignment(np.array([[[96436994576, 0, 0]]]), [3], 'imperiali_quota')
+        np.testing.assert_array_equal(res, [[[3, 0, 0]]])
+
+    def test_batch_seat_assignment_draw(self):
+        # as in test_jefferson_two, the last seat is assigned at random due to the draw
+        votes = np.array([[[100000, 99000, 30000, 30000]]] * 200)
+        res = batch_seat_assignment(votes, [7], 'jefferson')
+        np.testing.assert_array_equal(res[:, 0, :2], [[3, 3]] * 200)
+        np.testing.assert_array_equal(res[:, 0, 2] + res[:, 0, 3], [1] * 200)
+        self.assertGreater(res[:, 0, 2].sum(), 50)
+        self.assertGreater(res[:, 0, 3].sum(), 50)
+
+    def test_batch_seat_assignment_no_votes(self):
+        self.assertRaises(ValueError, batch_seat_assignment, np.zeros((1, 2, 3), dtype=int), [1, 1], 'hare')
+
+    def test_batch_threshold(self):
+        tallies = np.array([[[60, 5], [30, 5]], [[1, 1], [1, 1]]])
+        res = batch_threshold(tallies, 0.15)
+        np.testing.assert_array_equal(res, [[[60, 0], [30, 0]], [[1, 1], [1, 1]]])
+
+    def test_batch_threshold_nobody_above(self):
+        tallies = np.array([[[1, 1, 1], [1, 1, 1]]])
+        np.testing.assert_array_equal(batch_threshold(tallies, 0.5), tallies)
+
+    def test_batch_voting_same_as_tally_voting(self):
+        states = ['a', 'b', 'c', 'd']
+        tallies = prime_tallies(10, 4, 4, seed=1)
+        seats = [3, 5, 2, 7]
+        plan = compile_merging([0, 1, 0, 1], seats)
+        for threshold in (0.0, 0.26):
+            kwargs = dict(states=states, total_seats=sum(seats), assignment_func=seat_assignment_rules['hare'],
+                          threshold=threshold)
+            countrywide, _ = batch_voting(tallies, 'hare', total_seats=17, threshold=threshold, countrywide=True)
+            multi, _ = batch_voting(tallies, 'hare', seats_per_district=seats, total_seats=17, threshold=threshold)
+            merged, _ = batch_voting(tallies, 'hare', total_seats=17, threshold=threshold, merging_plan=plan)
+            for i in range(len(tallies)):
+                res = single_district_tally_voting(tallies[i], **kwargs)
+                self.assertListEqual(countrywide[i].tolist(), [res['seats'][p] for p in states])
+                res = multi_district_tally_voting(tallies[i], seats_per_district=seats, **kwargs)
+                self.assertListEqual(multi[i].tolist(), [res['seats'][p] for p in states])
+                res = merged_districts_tally_voting(tallies[i], merging_plan=plan, **kwargs)
+                self.assertListEqual(merged[i].tolist(), [res['seats'][p] for p in states])
+
+    def test_batch_vote_fractions(self):
+        tallies = np.array([[[1, 2], [3, 4]], [[0, 5], [5, 0]]])
+        np.testing.assert_array_almost_equal(batch_vote_fractions(tallies), [[0.4, 0.6], [0.5, 0.5]])
+
+    def test_evaluate_tallies(self):
+        config = SimpleNamespace(all_states=['a', 'b'], seat_rule='jefferson', seats_per_district=[2, 1],
+                                 total_seats=3, threshold=0.0, alternative_systems=[
+                                     {'name': 'fptp', 'type': 'basic', 'seat_rule': 'fptp', 'threshold': 0.0,
+                                      'seats_per_district': [1, 1], 'total_seats': 2},
+                                     {'name': 'merged', 'type': 'merge', 'seat_rule': 'hare', 'threshold': 0.0,
+                                      'q': 1, 'total_seats': 4}])
+        tallies = np.array([[[7, 3], [1, 9]]] * 3)
+        results = evaluate_tallies(tallies, config, chunk_size=2)
+        self.assertListEqual(list(results.keys()),
+                             ['countrywide_system', 'main_district_system', 'fptp', 'merged', 'vote_fractions'])
+        self.assertListEqual(results['countrywide_system'], [{'a': 1 / 3, 'b': 2 / 3}] * 3)
+        self.assertListEqual(results['main_district_system'], [{'a': 2 / 3, 'b': 1 / 3}] * 3)
+        self.assertListEqual(results['fptp'], [{'a': 0.5, 'b': 0.5}] * 3)
+        self.assertListEqual(results['merged'], [{'a': 0.5, 'b': 0.5}] * 3)
+        self.assertListEqual(results['vote_fractions'], [{'a': 0.4, 'b': 0.6}] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
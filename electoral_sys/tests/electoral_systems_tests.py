@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 import unittest
+import numpy as np
 import igraph as ig
 from decimal import Decimal
 
 from electoral_sys.electoral_system import apply_threshold, single_district_voting
 from electoral_sys.electoral_system import multi_district_voting, merged_districts_voting
+from electoral_sys.electoral_system import tally_votes, single_district_tally_voting, multi_district_tally_voting
+from electoral_sys.electoral_system import merged_districts_tally_voting, compile_merging, merge_tally
 from electoral_sys.seat_assignment import hare_quota, jefferson_method, first_past_the_post
 
 
@@ -288,6 +291,103 @@ class TestElectoralSystems(unittest.TestCase):
         self.assertDictEqual(res['votes'], v.votes)
         self.assertDictEqual(res['vote_fractions'], v.vote_fractions)
 
+    #############################################################################################################
+
+    def test_tally_votes_one(self):
+        v = VotersOne()
+        tally = tally_votes(v.voters, v.states, 4)
+        np.testing.assert_array_equal(tally, [[100001, 0, 0, 0, 0], [0, 80000, 0, 0, 0],
+                                              [0, 0, 30000, 0, 0], [0, 0, 0, 20000, 0]])
+
+    def test_tally_votes_two(self):
+        v = VotersTwo()
+        tally = tally_votes(v.voters, v.states)
+        np.testing.assert_array_equal(tally, [[30000, 0, 50000, 20000, 0, 0], [20002, 0, 19999, 19999, 20000, 0],
+                                              [0, 0, 0, 0, 49990, 10]])
+
+    def test_tally_votes_empty_district(self):
+        v = VotersTwo()
+        tally = tally_votes(v.voters, v.states, 5)
+        self.assertEqual(tally.shape, (5, 6))
+        self.assertEqual(tally[3:].sum(), 0)
+
+    def assertSameResults(self, res, expected):
+        for key in ('seats', 'seat_fractions', 'votes', 'vote_fractions'):
+            self.assertDictEqual(dict(res[key]), dict(expected[key]))
+
+    def test_tally_voting_same_as_voters(self):
+        # higher thresholds would leave some districts of VotersOne without votes
+        for v, thresholds in ((VotersOne(), (0.0, 0.01)), (VotersTwo(), (0.0, 0.01, 0.1, 0.3))):
+            q = len(set(v.voters['district']))
+            tally = tally_votes(v.voters, v.states, q)
+            for threshold in thresholds:
+                kwargs = dict(states=v.states, assignment_func=hare_quota, threshold=threshold)
+                self.assertSameResults(single_district_tally_voting(tally, total_seats=23, **kwargs),
+                                       single_district_voting(v.voters, total_seats=23, **kwargs))
+
+                # seat numbers without a draw in the second district of VotersTwo
+                s_per_dist = [20, 16, 3, 4][:q]
+                kwargs['seats_per_district'] = s_per_dist
+                self.assertSameResults(
+                    multi_district_tally_voting(tally, total_seats=sum(s_per_dist), **kwargs),
+                    multi_district_voting(v.voters, total_seats=sum(s_per_dist), **kwargs))
+
+                dist_merging = [1, 0, 1, 0][:q]
+                self.assertSameResults(
+                    merged_districts_tally_voting(tally, total_seats=sum(s_per_dist), dist_merging=dist_merging,
+                                                  **kwargs),
+                    merged_districts_voting(v.voters, total_seats=sum(s_per_dist), dist_merging=dist_merging,
+                                            **kwargs))
+
+    def test_tally_threshold_very_big(self):
+        # only parties 'c' and 'e' will be above the threshold
+        v = VotersTwo()
+        s_per_dist = [20, 16, 3]
+        res = multi_district_tally_voting(tally_votes(v.voters, v.states), states=v.states,
+                                          total_seats=sum(s_per_dist), assignment_func=hare_quota,
+                                          seats_per_district=s_per_dist, threshold=0.3)
+        seats = {'a': 0, 'b': 0, 'c': 28, 'd': 0, 'e': 11, 'f': 0}
+        self.assertDictEqual(res['seats'], seats)
+        self.assertDictEqual(res['seat_fractions'], {p: Decimal(v) / sum(s_per_dist) for p, v in seats.items()})
+        self.assertDictEqual(res['votes'], v.votes)
+        self.assertDictEqual(res['vote_fractions'], v.vote_fractions)
+
+    def test_tally_threshold_nobody_above(self):
+        # no party reaches the threshold, so it is ignored
+        v = VotersOne()
+        res = single_district_tally_voting(tally_votes(v.voters, v.states), states=v.states, total_seats=8,
+                                           assignment_func=hare_quota, threshold=0.9)
+        self.assertDictEqual(res['seats'], {'a': 3, 'b': 3, 'c': 1, 'd': 1, 'e': 0})
+
+    def test_compile_merging(self):
+        order, starts, merged_seats = compile_merging([3, 1, 3, 2, 1, 3], [1, 2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(order, [1, 4, 3, 0, 2, 5])
+        np.testing.assert_array_equal(starts, [0, 2, 3])
+        self.assertListEqual(merged_seats, [7, 4, 10])
+
+    def test_merge_tally(self):
+        tally = np.arange(12).reshape(6, 2)
+        merged = merge_tally(tally, compile_merging([3, 1, 3, 2, 1, 3], [1] * 6))
+        np.testing.assert_array_equal(merged, [[2 + 8, 3 + 9], [6, 7], [0 + 4 + 10, 1 + 5 + 11]])
+
+    def test_merge_tally_nested(self):
+        # merging the main districts directly gives the same as merging an already merged tally
+        tally = np.random.randint(0, 100, size=(6, 3))
+        fine = compile_merging([0, 0, 1, 1, 2, 2], [1] * 6)
+        coarse = compile_merging([0, 1, 1], [1] * 3)
+        np.testing.assert_array_equal(merge_tally(tally, compile_merging([0, 0, 1, 1, 1, 1], [1] * 6)),
+                                      merge_tally(merge_tally(tally, fine), coarse))
+
+    def test_merged_tally_voting_plan(self):
+        v = VotersTwo()
+        s_per_dist = [20, 16, 10]
+        res = merged_districts_tally_voting(tally_votes(v.voters, v.states), states=v.states,
+                                            total_seats=sum(s_per_dist), assignment_func=hare_quota,
+                                            merging_plan=compile_merging([0, 1, 0], s_per_dist))
+        seats = {'a': 10, 'b': 0, 'c': 14, 'd': 8, 'e': 14, 'f': 0}
+        self.assertDictEqual(res['seats'], seats)
+        self.assertDictEqual(res['votes'], v.votes)
+
 
 if __name__ == '__main__':
     unittest.main()
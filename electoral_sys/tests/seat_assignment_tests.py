@@ -5,6 +5,7 @@ from decimal import Decimal
 from electoral_sys.seat_assignment import simple_rule, first_past_the_post, jefferson_method
 from electoral_sys.seat_assignment import webster_method, modified_webster_method, imperiali_method
 from electoral_sys.seat_assignment import hare_quota, droop_quota, exact_droop_quota, imperiali_quota
+from electoral_sys.seat_assignment import keep_ties, SeatAssignmentCache
 
 
 class ElectionResultsOne:
@@ -336,6 +337,82 @@ class TestSeatAssignment(unittest.TestCase):
         allocation = imperiali_quota(election.all_seats, votes=election.votes, total_votes=election.all_votes)
         self.assertDictEqual(allocation, {'a': 0, 'b': 0, 'c': 1, 'd': 0, 'e': 0})
 
+    #############################################################################################################
+
+    def test_keep_ties_no_draw(self):
+        election = ElectionResultsOne()
+        res = jefferson_method(election.all_seats, votes=election.votes, tie_break=keep_ties)
+        self.assertEqual(res, ({'a': 4, 'b': 3, 'c': 1, 'd': 0}, [], 0, 1))
+
+    def test_keep_ties_draw(self):
+        election = ElectionResultsTwo()
+        res = jefferson_method(election.all_seats, votes=election.votes, tie_break=keep_ties)
+        self.assertEqual(res, ({'a': 3, 'b': 3, 'c': 0, 'd': 0}, ['c', 'd'], 1, 1))
+
+    def test_keep_ties_draw_fptp(self):
+        res = first_past_the_post(5, vote_fractions={'a': Decimal('0.4'), 'b': Decimal('0.4'), 'c': Decimal('0.2')},
+                                  tie_break=keep_ties)
+        self.assertEqual(res, ({'a': 0, 'b': 0, 'c': 0}, ['a', 'b'], 1, 5))
+
+    def test_keep_ties_draw_largest_remainder(self):
+        res = hare_quota(5, votes={'a': 3, 'b': 3, 'c': 3}, total_votes=9, tie_break=keep_ties)
+        self.assertEqual(res, ({'a': 1, 'b': 1, 'c': 1}, ['a', 'b', 'c'], 2, 1))
+
+    def test_cache_hits_and_misses(self):
+        election = ElectionResultsOne()
+        cache = SeatAssignmentCache(10)
+        cached_jefferson = cache.wrap('jefferson')
+        for _ in range(5):
+            allocation = cached_jefferson(election.all_seats, votes=election.votes, total_votes=election.all_votes)
+            self.assertDictEqual(allocation, {'a': 4, 'b': 3, 'c': 1, 'd': 0})
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 4)
+
+    def test_cache_draw(self):
+        election = ElectionResultsTwo()
+        cache = SeatAssignmentCache(10)
+        cached_jefferson = cache.wrap('jefferson')
+        winners = set()
+        for _ in range(100):
+            allocation = cached_jefferson(election.all_seats, votes=election.votes, total_votes=election.all_votes)
+            self.assertEqual(allocation['a'], 3)
+            self.assertEqual(allocation['b'], 3)
+            # last seat is still assigned at random due to the draw
+            self.assertEqual(allocation['c'] + allocation['d'], 1)
+            winners.add('c' if allocation['c'] else 'd')
+        self.assertSetEqual(winners, {'c', 'd'})
+        self.assertEqual(cache.misses, 1)
+
+    def test_cache_key_seats_and_rule(self):
+        election = ElectionResultsOne()
+        cache = SeatAssignmentCache(10)
+        cached_jefferson = cache.wrap('jefferson')
+        cached_hare = cache.wrap('hare')
+        self.assertDictEqual(cached_jefferson(8, votes=election.votes, total_votes=election.all_votes),
+                             {'a': 4, 'b': 3, 'c': 1, 'd': 0})
+        self.assertDictEqual(cached_hare(8, votes=election.votes, total_votes=election.all_votes),
+                             {'a': 3, 'b': 3, 'c': 1, 'd': 1})
+        self.assertDictEqual(cached_hare(1, votes=election.votes, total_votes=election.all_votes),
+                             {'a': 1, 'b': 0, 'c': 0, 'd': 0})
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(cache.hits, 0)
+
+    def test_cache_lru_eviction(self):
+        cache = SeatAssignmentCache(2)
+        cached_hare = cache.wrap('hare')
+        cached_hare(1, votes={'a': 1, 'b': 2}, total_votes=3)
+        cached_hare(1, votes={'a': 2, 'b': 1}, total_votes=3)
+        cached_hare(1, votes={'a': 1, 'b': 2}, total_votes=3)  # hit, moves it to the end
+        cached_hare(1, votes={'a': 3, 'b': 1}, total_votes=4)  # evicts {'a': 2, 'b': 1}
+        self.assertEqual(len(cache), 2)
+        cached_hare(1, votes={'a': 1, 'b': 2}, total_votes=3)
+        self.assertEqual(cache.hits, 2)
+        cached_hare(1, votes={'a': 2, 'b': 1}, total_votes=3)
+        self.assertEqual(cache.misses, 4)
+
+    def test_cache_wrong_size(self):
+        self.assertRaises(ValueError, SeatAssignmentCache, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight instrumentation of the simulation: named timers of phases, counters, throughput,
+memory used by every phase, an optional cProfile capture of a single phase, live progress reports of long runs,
+the estimate of the memory needed by a simulation checked against a memory budget, and pre-flight estimates
+of the network, memory and runtime of a simulation computed from its configuration alone
+"""
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import pstats
+import cProfile
+import tracemalloc
+import numpy as np
+from contextlib import contextmanager
+
+from configuration.logging import log
+from net_generation.diagnostics import expected_diagnostics, log_expected_diagnostics
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+###########################################################
+#                                                         #
+#                     Memory usage                        #
+#                                                         #
+###########################################################
+
+def peak_memory_usage():
+    """
+    :return: the peak resident memory of the process in bytes (0 if it is not available)
+    """
+    if resource is None:
+        return 0
+    # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def page_faults():
+    """
+    :return: the numbers of minor (pages found in memory) and major (pages read from the disk) page faults
+    of the process so far (zeros if they are not available)
+    """
+    if resource is None:
+        return 0, 0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_minflt, usage.ru_majflt
+
+
+def memory_usage():
+    """
+    :return: the resident memory of the process in bytes (the peak value if the current one is not available)
+    """
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_memory_usage()
+
+
+###########################################################
+#                                                         #
+#                  Timing of the phases                   #
+#                                                         #
+###########################################################
+
+class Instrumentation:
+    """
+    Collects the time spent in named phases (summed up over all calls) and named counters, e.g.
+
+        instrumentation = Instrumentation()
+        with instrumentation.phase('run_simulation'):
+            run_simulation(...)
+        instrumentation.count('simulation_steps', steps)
+
+    If profile_phase is given, every phase with a name starting with it is profiled with cProfile.
+    The resident memory (RSS) is sampled before and after every phase, and with trace_memory the peak
+    of memory allocated by Python in every phase is measured with tracemalloc (which slows down the simulation).
+    Before Python 3.9 the peak of tracemalloc can't be reset, then the traced peak of a phase is the peak
+    of the whole run so far minus the memory at the start of the phase, which overestimates phases
+    allocating less than earlier ones.
+    """
+
+    # phases doing the steps of the dynamics and the elections, used to compute the throughput
+    step_phases = ('thermalization', 'run_simulation')
+    election_prefix = 'voting: '
+
+    def __init__(self, profile_phase=None, trace_memory=False):
+        """
+        :param profile_phase: the name (or the beginning of the name) of phases to profile, None to not profile
+        :param trace_memory: whether to measure the peak memory allocated in every phase with tracemalloc
+        """
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+        self.memory = {}
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.profile_phase = profile_phase
+        self.profiler = cProfile.Profile() if profile_phase else None
+        self.profiled_calls = 0
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        A context manager measuring the time of a phase.
+        :param name: the name of the phase
+        """
+        profile = self.profiler is not None and name.startswith(self.profile_phase)
+        if profile:
+            self.profiled_calls += 1
+            self.profiler.enable()
+        rss, peak = memory_usage(), peak_memory_usage()
+        if self.trace_memory:
+            if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+                tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if profile:
+                self.profiler.disable()
+
+            memory = self.memory.setdefault(name, {'rss': 0, 'growth': 0, 'peak_growth': 0})
+            rss_after = memory_usage()
+            memory['rss'] = max(memory['rss'], rss_after)
+            # the largest growth of RSS in one call, and how much the phase raised the peak RSS of the process
+            memory['growth'] = max(memory['growth'], rss_after - rss)
+            memory['peak_growth'] += peak_memory_usage() - peak
+            if self.trace_memory:
+                memory['traced_peak'] = max(memory.get('traced_peak', 0), tracemalloc.get_traced_memory()[1] - traced)
+
+    def count(self, name, value=1):
+        """
+        Increases a counter.
+        :param name: the name of the counter
+        :param value: the value to add
+        :return: None
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """
+        :return: a dict with the total time, the time, number of calls, percentage of the total time
+        and memory (in bytes, see phase()) of every phase, the counters, the throughput (steps per second
+        and elections per second), and the peak memory of the process
+        """
+        total = time.perf_counter() - self._start
+        phases = {name: {'time': t, 'calls': self.calls[name], 'percent': 100.0 * t / total if total else 0.0,
+                         'memory': dict(self.memory.get(name, {}))}
+                  for name, t in self.times.items()}
+
+        step_time = sum(self.times.get(name, 0.0) for name in self.step_phases)
+        steps = self.counters.get('thermalization_steps', 0) + self.counters.get('simulation_steps', 0)
+        election_time = sum(t for name, t in self.times.items() if name.startswith(self.election_prefix))
+        elections = sum(self.calls[name] for name in self.times if name.startswith(self.election_prefix))
+        return {'total_time': total, 'phases': phases, 'counters': dict(self.counters),
+                'steps_per_second': steps / step_time if step_time else None,
+                'elections_per_second': elections / election_time if election_time else None,
+                'peak_memory': peak_memory_usage()}
+
+    def log_report(self):
+        """
+        Logs the report in a readable form.
+        :return: the report, see report()
+        """
+        report = self.report()
+        log.info(f"Timing of the simulation, {round(report['total_time'], 2)} s in total:")
+        for name, phase in sorted(report['phases'].items(), key=lambda item: -item[1]['time']):
+            memory = phase['memory']
+            traced = f", traced peak {memory['traced_peak'] / 2 ** 20:.1f} MB" if 'traced_peak' in memory else ''
+            log.info(f"   {name}: {round(phase['time'], 3)} s in {phase['calls']} calls "
+                     f"({round(phase['percent'], 1)}%), RSS {memory['rss'] / 2 ** 20:.0f} MB "
+                     f"(+{max(memory['growth'], 0) / 2 ** 20:.1f} MB{traced})")
+        if report['steps_per_second'] is not None:
+            log.info(f"Simulation speed: {report['steps_per_second']:.4g} steps/s")
+        if report['elections_per_second'] is not None:
+            log.info(f"Elections speed: {report['elections_per_second']:.4g} elections/s")
+        log.info(f"Peak memory: {report['peak_memory'] / 2 ** 20:.0f} MB")
+        return report
+
+    def save(self, suffix, output_dir='results/'):
+        """
+        Saves the report as timing<suffix>.json, and the profile (if any) as profile<suffix>.prof
+        together with a readable summary in profile<suffix>.txt.
+        :param suffix: suffix of the file name
+        :param output_dir: directory where the files are saved
+        :return: the name of the report file
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        fname = output_dir + 'timing' + suffix + '.json'
+        with open(fname, 'w') as out_file:
+            json.dump(dict(self.report(), profile_phase=self.profile_phase, trace_memory=self.trace_memory),
+                      out_file, indent=3)
+
+        if self.profiled_calls:
+            self.profiler.dump_stats(output_dir + 'profile' + suffix + '.prof')
+            with open(output_dir + 'profile' + suffix + '.txt', 'w') as out_file:
+                pstats.Stats(self.profiler, stream=out_file).sort_stats('cumulative').print_stats(40)
+            log.info(f"Profile of the phase '{self.profile_phase}' saved in {output_dir}profile{suffix}.prof")
+        elif self.profiler is not None:
+            log.warning(f"There was no phase '{self.profile_phase}' to profile, phases: {list(self.times.keys())}")
+        return fname
+
+
+###########################################################
+#                                                         #
+#                    Progress reports                     #
+#                                                         #
+###########################################################
+
+def format_duration(seconds):
+    """
+    :param seconds: a duration in seconds
+    :return: a short readable string, e.g. '2 h 5 min' or '40 s'
+    """
+    if seconds is None:
+        return 'unknown'
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f'{seconds // 3600} h {seconds % 3600 // 60} min'
+    if seconds >= 60:
+        return f'{seconds // 60} min {seconds % 60} s'
+    return f'{seconds} s'
+
+
+class ProgressReporter:
+    """
+    Reports the progress of a simulation: the stage, samples done, current steps per second, the ETA
+    and the memory used. update() is called between chunks of steps (never inside the loop of steps),
+    and it only compares the time with the last report, so the reports are rate-limited and cost nothing
+    between them. Every report is logged and, if fname is given, written to a small json file,
+    so that the progress of many simulations running in parallel can be aggregated with aggregate_progress().
+    """
+
+    def __init__(self, total_steps, sample_size, interval=30.0, fname=None, name=''):
+        """
+        :param total_steps: the number of steps of the whole simulation (thermalization and sampling),
+        0 if there are no steps (e.g. with the dual sampler), then the ETA is computed from the samples
+        :param sample_size: the number of samples
+        :param interval: the minimal number of seconds between reports, None or 0 disables reporting
+        :param fname: the json file with the current progress, None to not write it
+        :param name: the name of the simulation (e.g. the suffix) used in the progress file
+        """
+        self.total_steps = total_steps
+        self.sample_size = sample_size
+        self.interval = interval
+        self.fname = fname
+        self.name = name
+        self.steps = 0
+        self.samples = 0
+        self.stage = 'starting'
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._last_time = self._start
+        self._last_steps = 0
+
+    def update(self, steps=0, samples=0, stage=None, force=False):
+        """
+        Adds the work done and reports the progress if the interval has passed.
+        :param steps: the number of steps done since the last update
+        :param samples: the number of samples done since the last update
+        :param stage: the current stage of the simulation, e.g. 'thermalization'
+        :param force: whether to report regardless of the interval
+        :return: None
+        """
+        self.steps += steps
+        self.samples += samples
+        if stage is not None:
+            self.stage = stage
+        if not self.interval:
+            return
+        now = time.perf_counter()
+        if force or now - self._last_time >= self.interval:
+            self.report(now)
+
+    def state(self, now=None):
+        """
+        :param now: the value of time.perf_counter(), the current one by default
+        :return: a dict with the current progress
+        """
+        now = time.perf_counter() if now is None else now
+        elapsed = now - self._start
+        recent_time = now - self._last_time
+        rate = (self.steps - self._last_steps) / recent_time if recent_time > 0 else None
+        # the ETA uses the average speed so far, which includes the time of elections and I/O
+        if self.total_steps:
+            eta = elapsed * (self.total_steps - self.steps) / self.steps if self.steps else None
+        else:
+            eta = elapsed * (self.sample_size - self.samples) / self.samples if self.samples else None
+        return {'name': self.name, 'host': socket.gethostname(), 'pid': os.getpid(), 'stage': self.stage,
+                'steps': self.steps, 'total_steps': self.total_steps, 'samples': self.samples,
+                'sample_size': self.sample_size, 'steps_per_second': rate, 'elapsed': elapsed,
+                'eta': 0.0 if self.stage == 'finished' else eta, 'memory': memory_usage(),
+                'started': self.started, 'updated': time.time()}
+
+    def report(self, now=None):
+        """
+        Logs the progress and writes it to the progress file.
+        :param now: the value of time.perf_counter(), the current one by default
+        :return: a dict with the current progress, see state()
+        """
+        now = time.perf_counter() if now is None else now
+        state = self.state(now)
+        self._last_time = now
+        self._last_steps = self.steps
+
+        speed = f"{state['steps_per_second']:.3g} steps/s, " if state['steps_per_second'] else ''
+        steps = f"{round(100.0 * self.steps / self.total_steps, 1)}% of steps, " if self.total_steps else ''
+        log.info(f"Progress: {self.stage}, {steps}{self.samples}/{self.sample_size} samples, {speed}"
+                 f"ETA {format_duration(state['eta'])}, "
+                 f"memory {state['memory'] / 2 ** 20:.0f} MB")
+
+        if self.fname is not None:
+            os.makedirs(os.path.dirname(self.fname) or '.', exist_ok=True)
+            # writing to a temporary file and renaming it, so a reader never gets a partially written file
+            with open(self.fname + '.tmp', 'w') as out_file:
+                json.dump(state, out_file)
+            os.replace(self.fname + '.tmp', self.fname)
+        return state
+
+    def finish(self):
+        """
+        Reports the final state of the simulation.
+        :return: None
+        """
+        self.update(stage='finished', force=True)
+
+
+def aggregate_progress(pattern='results/progress*.json', stale_after=600.0):
+    """
+    Aggregates the progress of many simulations, e.g. of a sweep running in parallel.
+    :param pattern: a glob pattern of the progress files
+    :param stale_after: the number of seconds after which an unfinished simulation without updates is stale
+    (e.g. it was killed)
+    :return: a dict with the number of runs (finished, running and stale), the steps done and in total,
+    the summed speed of running simulations, the ETA of the longest running simulation, and the summed memory
+    """
+    states = []
+    for fname in glob.glob(pattern):
+        try:
+            with open(fname, 'r') as in_file:
+                states.append(json.load(in_file))
+        except (OSError, ValueError):
+            continue
+
+    now = time.time()
+    finished = [s for s in states if s['stage'] == 'finished']
+    running = [s for s in states if s['stage'] != 'finished' and now - s['updated'] <= stale_after]
+    etas = [s['eta'] for s in running if s['eta'] is not None]
+    return {'runs': len(states), 'finished': len(finished), 'running': len(running),
+            'stale': len(states) - len(finished) - len(running),
+            'steps': sum(s['steps'] for s in states), 'total_steps': sum(s['total_steps'] for s in states),
+            'samples': sum(s['samples'] for s in states), 'sample_size': sum(s['sample_size'] for s in states),
+            'steps_per_second': sum(s['steps_per_second'] or 0.0 for s in running),
+            'eta': max(etas) if etas else None, 'memory': sum(s['memory'] for s in running)}
+
+
+def log_aggregated_progress(pattern='results/progress*.json', stale_after=600.0):
+    """
+    Logs the progress aggregated with aggregate_progress().
+    :return: the aggregated progress
+    """
+    progress = aggregate_progress(pattern, stale_after)
+    log.info(f"Sweep progress: {progress['finished']}/{progress['runs']} runs finished, {progress['running']} "
+             f"running, {progress['stale']} stale, {progress['samples']}/{progress['sample_size']} samples, "
+             f"{progress['steps_per_second']:.3g} steps/s in total, ETA of running simulations "
+             f"{format_duration(progress['eta'])}, memory {progress['memory'] / 2 ** 20:.0f} MB")
+    return progress
+
+
+###########################################################
+#                                                         #
+#                     Memory budget                       #
+#                                                         #
+###########################################################
+
+# the approximate memory in bytes, fitted to measurements of main.py: the interpreter with imported packages,
+# a node and a link of the network (with the attributes of nodes), and a single value of results
+# (a seat or vote fraction of a party in one sample) kept in memory until the end of the simulation
+interpreter_memory = 105 * 2 ** 20
+memory_per_node = 220
+memory_per_link = 40
+memory_per_result = 150
+
+# result formats keeping all samples in memory until the end of the simulation
+in_memory_formats = ('npz', 'json')
+
+
+def estimate_memory(n, avg_deg, num_parties, sample_size, q=1, systems=2, result_format='stream', save_tallies=False,
+                    tally_itemsize=8, links=None, batch_size=100):
+    """
+    Estimates the memory needed by main.run_experiment() before the simulation is started.
+    :param n: the number of nodes
+    :param avg_deg: the average degree of nodes
+    :param num_parties: the number of parties
+    :param sample_size: the number of samples
+    :param q: the number of districts
+    :param systems: the number of electoral systems
+    :param result_format: the format of the results, the in-memory formats keep all samples until the end
+    :param save_tallies: whether the tallies of votes are saved
+    :param tally_itemsize: the number of bytes of a single vote count in the tallies
+    :param links: the expected number of links, n * avg_deg / 2 by default
+    :param batch_size: the number of samples written at once by the streaming writers
+    :return: a dict with the memory (in bytes) of 'interpreter', 'network', 'results', and 'tallies'
+    (the batches of tallies waiting for writing), and the 'total'
+    """
+    values = sample_size * (systems + 1) * num_parties  # vote fractions are saved next to the seats of all systems
+    # the batch being filled and at most two batches in the queue of the writer
+    batched = min(sample_size, 3 * batch_size)
+    links = n * avg_deg / 2 if links is None else links
+    memory = {'interpreter': interpreter_memory,
+              'network': int(n * memory_per_node + links * memory_per_link),
+              'results': values * memory_per_result if result_format in in_memory_formats else 0,
+              'tallies': batched * q * num_parties * tally_itemsize if save_tallies else 0}
+    memory['total'] = sum(memory.values())
+    return memory
+
+
+def apply_memory_budget(config, n=None, sample_size=None):
+    """
+    Checks the memory needed by the simulation against config.memory_budget (in MB). If the estimate exceeds
+    the budget, the results are streamed to the file instead of being kept in memory and the tallies of votes
+    are kept as 32-bit integers; if it's still not enough, the simulation is not started.
+    :param config: Config class from configuration module, it's modified if compact modes are needed
+    :param n: the number of nodes, config.n by default
+    :param sample_size: the number of samples, config.sample_size by default
+    :return: the estimate returned by estimate_memory(), None if there is no budget
+    """
+    if config.memory_budget is None:
+        return None
+    budget = config.memory_budget * 2 ** 20
+
+    def estimate():
+        return estimate_memory(config.n if n is None else n, config.avg_deg, config.num_parties,
+                               config.sample_size if sample_size is None else sample_size, q=config.q,
+                               systems=len(config.voting_systems), result_format=config.result_format,
+                               save_tallies=config.save_tallies, tally_itemsize=config.tally_dtype.itemsize,
+                               batch_size=config.result_batch or 100)
+
+    memory = estimate()
+    if memory['total'] > budget:
+        log.warning(f"The estimated memory {memory['total'] / 2 ** 20:.0f} MB exceeds the budget "
+                    f"{config.memory_budget:.0f} MB, switching to compact modes")
+        if config.result_format in in_memory_formats:
+            log.warning(f"Results will be saved in the 'stream' format instead of '{config.result_format}'")
+            config.result_format = 'stream'
+        if config.save_tallies:
+            config.tally_dtype = np.dtype(np.int32)
+        memory = estimate()
+
+    details = ', '.join(f'{key} {value / 2 ** 20:.1f} MB' for key, value in memory.items() if key != 'total')
+    if memory['total'] > budget:
+        raise MemoryError(f"The simulation needs about {memory['total'] / 2 ** 20:.0f} MB ({details}), more than "
+                          f"the memory budget {config.memory_budget:.0f} MB")
+    log.info(f"Estimated memory {memory['total'] / 2 ** 20:.0f} MB ({details}) within the budget "
+             f"{config.memory_budget:.0f} MB")
+    return memory
+
+
+###########################################################
+#                                                         #
+#                  Pre-flight estimates                   #
+#                                                         #
+###########################################################
+
+# the approximate time in seconds, fitted to measurements of main.py: generating a node and a link of the network,
+# a step of the dynamics, counting the vote of a node, and assigning seats in a single district
+time_per_node = 1e-6
+time_per_link = 3e-7
+time_per_step = 1.25e-5
+time_per_vote = 3.5e-7
+time_per_district_election = 5e-5
+
+
+def estimate_runtime(n, links, q, sample_size, therm_time, mc_steps, systems=2):
+    """
+    Estimates the time of main.run_experiment() before the simulation is started.
+    :param n: the number of nodes
+    :param links: the expected number of links
+    :param q: the number of districts
+    :param sample_size: the number of samples
+    :param therm_time: the number of steps of thermalization
+    :param mc_steps: the number of sweeps (n steps) between elections
+    :param systems: the number of electoral systems, all but the countrywide one are assumed to use q districts
+    :return: a dict with the time (in seconds) of 'network', 'thermalization', 'sampling' and 'elections',
+    and the 'total'
+    """
+    runtime = {'network': n * time_per_node + links * time_per_link,
+               'thermalization': therm_time * time_per_step,
+               'sampling': sample_size * n * mc_steps * time_per_step,
+               'elections': sample_size * (n * time_per_vote + (1 + (systems - 1) * q) * time_per_district_election)}
+    runtime['total'] = sum(runtime.values())
+    return runtime
+
+
+def estimate_simulation(config, n=None, sample_size=None, therm_time=None):
+    """
+    Estimates the network, memory and runtime of a simulation from its configuration alone, without generating
+    the network (it takes milliseconds also for networks with millions of nodes).
+    :param config: Config class from configuration module
+    :param n: the number of nodes, config.n by default
+    :param sample_size: the number of samples, config.sample_size by default
+    :param therm_time: the number of steps of thermalization, config.therm_time by default
+    :return: a dict with 'network' - the expected diagnostics (see net_generation.diagnostics.expected_diagnostics()),
+    'memory' - see estimate_memory(), and 'runtime' - see estimate_runtime()
+    """
+    n = config.n if n is None else n
+    sample_size = config.sample_size if sample_size is None else sample_size
+    therm_time = config.therm_time if therm_time is None else therm_time
+    network = expected_diagnostics(n, config.district_sizes, config.avg_deg, block_coords=config.district_coords,
+                                   ratio=config.ratio, planar_const=config.planar_c, euclidean=config.euclidean)
+    memory = estimate_memory(n, config.avg_deg, config.num_parties, sample_size, q=config.q,
+                             systems=len(config.voting_systems), result_format=config.result_format,
+                             save_tallies=config.save_tallies, tally_itemsize=config.tally_dtype.itemsize,
+                             links=network['links'], batch_size=config.result_batch or 100)
+    runtime = estimate_runtime(n, network['links'], config.q, sample_size, therm_time, config.mc_steps,
+                               systems=len(config.voting_systems))
+    return {'network': network, 'memory': memory, 'runtime': runtime}
+
+
+def log_simulation_estimate(estimate):
+    """
+    Logs the estimates returned by estimate_simulation().
+    :param estimate: the dict returned by estimate_simulation()
+    :return: None
+    """
+    log_expected_diagnostics(estimate['network'])
+    log.info(f"Estimated memory {estimate['memory']['total'] / 2 ** 20:.0f} MB (" +
+             ', '.join(f'{key} {value / 2 ** 20:.1f} MB' for key, value in estimate['memory'].items()
+                       if key != 'total') + ')')
+    log.info(f"Estimated runtime {format_duration(estimate['runtime']['total'])} (" +
+             ', '.join(f'{key} {format_duration(value)}' for key, value in estimate['runtime'].items()
+                       if key != 'total') + ')')
@@ -2,19 +2,41 @@
 import numpy as np
 import sys
 
-from tools import convert_to_distributions, save_data, read_data, run_with_time, calculate_indexes, compute_edge_ratio
+from tools import read_distribution, save_data, run_with_time, calculate_indexes
+from tools import open_tally_writer, open_result_writer, party_order, distribution_matrix
+from instrumentation import Instrumentation, ProgressReporter, apply_memory_budget
 from plotting import plot_indexes, plot_hist, plot_traj
 from configuration.parser import get_arguments
 from configuration.logging import log
-from net_generation.base import init_graph, add_zealots
-from simulation.base import run_simulation, run_thermalization, run_thermalization_simple
+from electoral_sys.electoral_system import tally_votes
+from net_generation.diagnostics import log_graph_diagnostics
+from net_generation.base import init_graph, add_zealots, zealot_placement, reset_network
+from simulation.base import run_thermalization, run_thermalization_simple
+from simulation.dual import run_dual_sampling
+from simulation.relaxation import estimate_relaxation, log_relaxation_estimate
+from simulation.metapopulation import init_composition, run_metapopulation, run_metapopulation_thermalization
+from simulation.domains import close_domains
+from net_generation.storage import init_mapped_graph, init_mapped_states, add_mapped_zealots, mapped_zealot_placement
+from net_generation.diagnostics import csr_adjacency
 
 
 def run_experiment(n=None, epsilon=None, sample_size=None, therm_time=None, n_zealots=None, config=None, silent=False,
-                   make_plots=True):
+                   make_plots=True, instrumentation=None, output_dir='results/'):
     """
     The main function for running the whole simulation - it generates the network,
-    runs the voting process, and performs the elections. At the end results are saved in a json file.
+    runs the voting process, and performs the elections. At the end results are saved in a file,
+    and the timing of all phases of the simulation is saved next to it. With config.memory_budget
+    the memory needed is estimated first, and MemoryError is raised if it doesn't fit in the budget.
+    With config.sampler == 'dual' there is no thermalization, and every sample is drawn exactly from
+    the stationary distribution (see simulation/dual.py) instead of running mc_steps of the dynamics,
+    with config.reset the zealots are still drawn again before every sample.
+    With config.relaxation the relaxation time is estimated from the spectrum of the network (see
+    simulation/relaxation.py), and with 'apply' the estimated therm_time and mc_steps are used.
+    With config.engine == 'metapopulation' only the composition of districts is simulated instead of the network
+    (see simulation/metapopulation.py), the elections are the same. With config.engine == 'domains' the network
+    is divided between worker processes (see simulation/domains.py), which are stopped at the end.
+    With config.storage == 'mmap' the network is generated into memory-mapped files instead of igraph
+    (see net_generation/storage.py), and temporary files are removed at the end.
     :param n: the number of nodes
     :param epsilon: the noise parameter
     :param sample_size: the number of repetitions of elections
@@ -23,49 +45,203 @@ def run_experiment(n=None, epsilon=None, sample_size=None, therm_time=None, n_ze
     :param config: the configuration class
     :param silent: whether to keep it silent and not print the sample number and additional info
     :param make_plots: whether to make plots
-    :return: None
+    :param instrumentation: Instrumentation object collecting the timing, a new one is created by default
+    :param output_dir: directory where the results are saved
+    :return: the Instrumentation object with the timing of the simulation
     """
-    init_g = init_graph(n, config.district_sizes, config.avg_deg, block_coords=config.district_coords,
-                        ratio=config.ratio, planar_const=config.planar_c, euclidean=config.euclidean,
-                        state_generator=config.initialize_states, random_dist=config.random_dist,
-                        initial_state=config.not_zealot_state, all_states=config.all_states)
-    init_g = add_zealots(init_g, n_zealots, config.zealot_state, **config.zealots_config)
+    # checked before anything is allocated, it can switch to compact modes or refuse to run
+    apply_memory_budget(config, n=n, sample_size=sample_size)
+    if instrumentation is None:
+        instrumentation = Instrumentation(profile_phase=config.profile_phase, trace_memory=config.trace_memory)
+    timed = instrumentation.phase
+    # progress is reported between chunks of steps, so it doesn't slow down the dynamics
+    dual = config.sampler == 'dual'
+    meta = config.engine == 'metapopulation'
+    domains = config.engine == 'domains'
+    mapped = config.storage == 'mmap'
+    mc_steps = config.mc_steps
+    reporter = ProgressReporter(0 if dual else therm_time + sample_size * n * mc_steps, sample_size,
+                                interval=config.progress_interval, name=config.suffix,
+                                fname=output_dir + 'progress' + config.suffix + '.json')
+    reporter.update(stage='network generation')
 
-    if not silent:
-        link_fraction, link_ratio = compute_edge_ratio(init_g)
-        log.info('There is ' + str(round(100.0 * link_fraction, 1)) + '% of inter-district connections')
-        log.info('Ratio of inter- to intra-district links is equal ' + str(round(link_ratio, 3)))
+    init_g = None
+    try:
+        if meta:
+            # the composition of districts takes the place of the network
+            with timed('init_composition'):
+                init_g = init_composition(config, n, n_zealots)
+        elif mapped:
+            with timed('init_graph'):
+                init_g = init_mapped_graph(n, config.district_sizes, config.avg_deg, path=config.storage_dir,
+                                           block_coords=config.district_coords, ratio=config.ratio,
+                                           planar_const=config.planar_c, euclidean=config.euclidean,
+                                           consensus=config.consensus, initial_state=config.not_zealot_state,
+                                           all_states=config.all_states)
+            with timed('add_zealots'):
+                # computed once, and used again by every reset
+                placement = mapped_zealot_placement(init_g, **config.zealots_config)
+                init_g = add_mapped_zealots(init_g, n_zealots, config.zealot_state, config.all_states,
+                                            placement=placement)
+            log.info(f"The network with {init_g.meta['entries'] // 2} links is stored in {init_g.path}")
+        else:
+            with timed('init_graph'):
+                init_g = init_graph(n, config.district_sizes, config.avg_deg, block_coords=config.district_coords,
+                                    ratio=config.ratio, planar_const=config.planar_c, euclidean=config.euclidean,
+                                    state_generator=config.initialize_states, random_dist=config.random_dist,
+                                    initial_state=config.not_zealot_state, all_states=config.all_states)
+            with timed('add_zealots'):
+                # computed once, and used again by every reset
+                placement = zealot_placement(init_g, **config.zealots_config)
+                init_g = add_zealots(init_g, n_zealots, config.zealot_state, placement=placement)
+
+            if not silent:
+                log_graph_diagnostics(init_g, q=config.q)
 
-    log.info(f"Running thermalization for {therm_time} time steps")
-    if make_plots:
-        g, trajectory = run_thermalization(config, init_g, epsilon, therm_time, n=n)
-        plot_traj(trajectory, config.suffix)
-    else:
-        g = run_thermalization_simple(config, init_g, epsilon, therm_time, n=n)
+        if config.relaxation != 'off':
+            with timed('relaxation'):
+                estimate = estimate_relaxation(init_g, epsilon, n=n)
+            log_relaxation_estimate(estimate, therm_time, mc_steps)
+            if config.relaxation == 'apply' and estimate['therm_time'] is not None:
+                therm_time, mc_steps = estimate['therm_time'], estimate['mc_steps']
+                reporter.total_steps = therm_time + sample_size * n * mc_steps
 
-    results = {system: [] for system in config.voting_systems.keys()}
-    results['vote_fractions'] = []
+        if dual:
+            # samples don't depend on the initial state, so there is nothing to thermalize
+            log.info("Using the dual sampler, thermalization is not needed")
+            g = init_g
+            with timed('csr_adjacency'):
+                adjacency = csr_adjacency(g)
+        else:
+            log.info(f"Running thermalization for {therm_time} time steps")
+            reporter.update(stage='thermalization')
+            progress = (lambda steps: reporter.update(steps=steps)) if config.progress_interval else None
+            if meta:
+                with timed('thermalization'):
+                    g, trajectory = run_metapopulation_thermalization(config, init_g, epsilon, therm_time,
+                                                                      progress=progress)
+                if make_plots:
+                    plot_traj(trajectory, config.suffix)
+            elif make_plots and not mapped:
+                with timed('thermalization'):
+                    # every call of the domains engine exchanges all states with the workers, so the chunks are longer
+                    g, trajectory = run_thermalization(config, init_g, epsilon, therm_time, each=n if domains else 1000,
+                                                       n=n, progress=progress, simulate=config.simulate)
+                plot_traj(trajectory, config.suffix)
+            else:
+                with timed('thermalization'):
+                    g = run_thermalization_simple(config, init_g, epsilon, therm_time, n=n, progress=progress,
+                                                  each=max(n, 100000) if domains else 100000, simulate=config.simulate)
+            instrumentation.count('thermalization_steps', therm_time)
 
-    log.info(f"Thermalization has finished, starting to collect samples")
-    for i in range(sample_size):
-        if not silent:
-            log.info(f"Computing sample no. {i}")
+        # with a streaming format samples are written while the simulation is running, otherwise all at the end
+        writer = open_result_writer(config, config.suffix, output_dir=output_dir)
+        tally_writer = open_tally_writer(config, config.suffix, output_dir=output_dir)
+        results = {system: [] for system in config.voting_systems.keys()}
+        results['vote_fractions'] = []
 
-        if config.reset:
-            g.vs()["state"] = config.initialize_states(n, all_states=config.all_states, state=config.not_zealot_state)
-            # we have to reset zealots, otherwise they would have states different than 'zealot_state'
-            g.vs()["zealot"] = np.zeros(n)
-            g = add_zealots(g, n_zealots, config.zealot_state, **config.zealots_config)
+        log.info(f"{'Network is ready' if dual else 'Thermalization has finished'}, starting to collect samples")
+        reporter.update(stage='sampling')
+        try:
+            for i in range(sample_size):
+                if not silent:
+                    log.info(f"Computing sample no. {i}")
 
-        g = run_simulation(config, g, epsilon, n * config.mc_steps, n=n)
+                if dual:
+                    if config.reset:
+                        # samples don't depend on the states, but zealots have to be drawn again
+                        with timed('reset'):
+                            g = reset_network(g, n_zealots, config.zealot_state, placement,
+                                              state_generator=config.initialize_states, all_states=config.all_states,
+                                              initial_state=config.not_zealot_state)
+                    with timed('dual_sampling'):
+                        g = run_dual_sampling(config, g, epsilon, adjacency=adjacency)
+                elif config.reset and meta:
+                    with timed('reset'):
+                        g = init_composition(config, n, n_zealots)
+                elif config.reset and mapped:
+                    with timed('reset'):
+                        init_mapped_states(g, consensus=config.consensus, initial_state=config.not_zealot_state,
+                                           all_states=config.all_states)
+                        g = add_mapped_zealots(g, n_zealots, config.zealot_state, config.all_states,
+                                               placement=placement)
+                elif config.reset:
+                    with timed('reset'):
+                        g = reset_network(g, n_zealots, config.zealot_state, placement,
+                                          state_generator=config.initialize_states, all_states=config.all_states,
+                                          initial_state=config.not_zealot_state)
 
-        for system, voting_function in config.voting_systems.items():
-            outcome = voting_function(g.vs)
-            results[system].append(outcome['seat_fractions'])
+                if not dual:
+                    with timed('run_simulation'):
+                        if meta:
+                            g = run_metapopulation(config, g, epsilon, n * mc_steps)
+                        else:
+                            g = config.simulate(config, g, epsilon, n * mc_steps, n=n)
+                    instrumentation.count('simulation_steps', n * mc_steps)
 
-        results['vote_fractions'].append(outcome['vote_fractions'])
+                # votes are counted once and shared by all electoral systems
+                with timed('tally_votes'):
+                    if domains:
+                        # tallies counted by the workers
+                        tally = g['domains'].tally()
+                    elif meta or mapped:
+                        tally = g.tally()
+                    else:
+                        tally = tally_votes(g.vs, config.all_states, config.q)
+                sample = {}
+                for system, voting_function in config.voting_systems.items():
+                    with timed('voting: ' + system):
+                        outcome = voting_function(tally)
+                    sample[system] = outcome['seat_fractions']
 
-    save_data(config, results, config.suffix)
+                sample['vote_fractions'] = outcome['vote_fractions']
+                with timed('save_data'):
+                    if writer is not None:
+                        writer.append(sample)
+                    else:
+                        for system, value in sample.items():
+                            results[system].append(value)
+                    if tally_writer is not None:
+                        tally_writer.append(tally)
+                instrumentation.count('samples')
+                reporter.update(steps=0 if dual else n * mc_steps, samples=1)
+        finally:
+            # samples computed before an interruption are kept in the streamed files
+            sampling_failed = sys.exc_info()[0] is not None
+            close_error = None
+            for stream in (writer, tally_writer):
+                if stream is None:
+                    continue
+                with timed('save_data'):
+                    # every file is closed, and an error of closing a file mustn't hide the error of the sampling loop
+                    try:
+                        stream.close()
+                    except Exception as error:
+                        if sampling_failed or close_error is not None:
+                            log.error(f"Closing the file {stream.fname} failed: {error!r}")
+                        else:
+                            close_error = error
+            if close_error is not None:
+                raise close_error
+    finally:
+        # the worker processes and the files of a temporary network are released also after an error
+        if domains and init_g is not None:
+            close_domains(init_g)
+        if mapped and init_g is not None:
+            init_g.close()
+
+    with timed('save_data'):
+        if writer is None:
+            save_data(config, results, config.suffix, output_dir=output_dir)
+
+    if config.seat_cache is not None:
+        config.seat_cache.report()
+    reporter.finish()
+
+    if not silent:
+        instrumentation.log_report()
+    instrumentation.save(config.suffix, output_dir=output_dir)
+    return instrumentation
 
 
 @run_with_time
@@ -86,13 +262,18 @@ def main(silent=False, make_plots=True):
 
     # plot the results
     if make_plots:  # to avoid plotting huge number of plots when using scripts
-        res, _ = read_data(cfg.suffix)
-        voting_distribution = convert_to_distributions(res['vote_fractions'])
+        voting_distribution = read_distribution(cfg.suffix, 'vote_fractions')
+        parties = party_order(voting_distribution.keys())
+        seats = []
         for system in cfg.voting_systems.keys():
-            distribution = convert_to_distributions(res[system])
+            distribution = read_distribution(cfg.suffix, system)
             plot_hist(distribution, system, cfg.suffix, bins_num=cfg.q+2)
-            indexes = calculate_indexes(voting_distribution, distribution, cfg.sample_size)
-            plot_indexes(indexes, system, cfg.suffix)
+            seats.append(distribution_matrix(distribution, parties))
+
+        # indexes of all systems are computed at once, with a shape (systems, samples)
+        indexes = calculate_indexes(distribution_matrix(voting_distribution, parties), np.stack(seats))
+        for i, system in enumerate(cfg.voting_systems.keys()):
+            plot_indexes({index: values[i] for index, values in indexes.items()}, system, cfg.suffix)
 
 
 if __name__ == '__main__':
@@ -61,6 +61,78 @@ def planted_affinity(q, avg_deg, fractions, ratio, n):
     return p.tolist()
 
 
+# the WGS-84 ellipsoid used by geopy.distance.geodesic
+wgs84_major_axis = 6378.137  # km
+wgs84_flattening = 1 / 298.257223563
+
+
+def geodesic_distances(coordinates_1, coordinates_2, iterations=200, tolerance=1e-12):
+    """
+    Vectorised distances on the WGS-84 ellipsoid between pairs of points, computed with the Vincenty formula,
+    which agrees with geopy.distance.geodesic to a fraction of a millimetre. geopy computes one pair at a time,
+    which takes minutes for the pairs of hundreds of districts. Pairs of (nearly antipodal) points
+    for which the formula doesn't converge are computed with geopy.
+    :param coordinates_1: numpy array with a shape (m, 2), the latitude and longitude (in degrees) of points
+    :param coordinates_2: numpy array with a shape (m, 2), the latitude and longitude (in degrees) of points
+    :param iterations: the maximal number of iterations of the formula
+    :param tolerance: the convergence threshold of the longitude on the auxiliary sphere (in radians)
+    :return: numpy array with a shape (m,), the distances in km
+    """
+    a, f = wgs84_major_axis, wgs84_flattening
+    b = (1 - f) * a
+    coordinates_1, coordinates_2 = np.radians(coordinates_1), np.radians(coordinates_2)
+    u_1, u_2 = np.arctan((1 - f) * np.tan(coordinates_1[:, 0])), np.arctan((1 - f) * np.tan(coordinates_2[:, 0]))
+    sin_u_1, cos_u_1, sin_u_2, cos_u_2 = np.sin(u_1), np.cos(u_1), np.sin(u_2), np.cos(u_2)
+    longitude = coordinates_2[:, 1] - coordinates_1[:, 1]
+
+    lam = longitude
+    converged = np.zeros(len(lam), dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u_2 * sin_lam, cos_u_1 * sin_u_2 - sin_u_1 * cos_u_2 * cos_lam)
+            cos_sigma = sin_u_1 * sin_u_2 + cos_u_1 * cos_u_2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            # coincident points have sin_sigma = 0, and lines along the equator have cos2_alpha = 0
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u_1 * cos_u_2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2_sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u_1 * sin_u_2 / cos2_alpha)
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous = lam
+            lam = longitude + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2_sigma_m + c * cos_sigma * (-1 + 2 * cos_2_sigma_m ** 2)))
+            converged = np.abs(lam - previous) < tolerance
+            if converged.all():
+                break
+
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    big_b = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = big_b * sin_sigma * (cos_2_sigma_m + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2_sigma_m ** 2) -
+        big_b / 6 * cos_2_sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2_sigma_m ** 2)))
+    distances = b * big_a * (sigma - delta_sigma)
+
+    for i in np.flatnonzero(~converged | np.isnan(distances)):
+        distances[i] = geodesic(np.degrees(coordinates_1[i]), np.degrees(coordinates_2[i])).km
+    return distances
+
+
+def distance_matrix(coordinates, euclidean=False):
+    """
+    Computes the distances between all pairs of districts.
+    :param coordinates: the coordinates of the districts (numpy array with shape = (q, 2)), latitude and longitude
+    in degrees for geodesic distances
+    :param euclidean: whether to use euclidean or geodesic distance (bool)
+    :return: numpy array with shape = (q, q), geodesic distances are in km
+    """
+    if euclidean:
+        return squareform(pdist(coordinates, 'euclidean'))
+    coordinates = np.asarray(coordinates, dtype=float)
+    first, second = np.triu_indices(coordinates.shape[0], k=1)
+    return squareform(geodesic_distances(coordinates[first], coordinates[second]))
+
+
 def planar_affinity(avg_deg, fractions, coordinates, c, n, euclidean=False):
     """
     Generates a matrix of connection probabilities between different
@@ -73,22 +145,32 @@ def planar_affinity(avg_deg, fractions, coordinates, c, n, euclidean=False):
     :param euclidean: whether to use euclidean or geodesic distance (bool)
     :return: list object with shape = (q, q).
     """
-    if euclidean:
-        dist_array = pdist(coordinates, 'euclidean')
-        dist_matrix = squareform(dist_array)
-    else:
-        dist_matrix = np.zeros((coordinates.shape[0], coordinates.shape[0]))
-        for i in range(coordinates.shape[0]):
-            for j in range(coordinates.shape[0]):
-                dist_matrix[i, j] = geodesic(coordinates[i], coordinates[j]).km
-
-    affinity_matrix = 1.0 / (dist_matrix + c)**2.0
+    affinity_matrix = 1.0 / (distance_matrix(coordinates, euclidean) + c)**2.0
 
     norm_deg = n * affinity_matrix.dot(fractions).dot(fractions)
     affinity_matrix *= avg_deg / norm_deg
     return affinity_matrix.tolist()
 
 
+def affinity_matrix(n, block_sizes, avg_deg, block_coords=None, ratio=None, planar_const=None, euclidean=False):
+    """
+    Generates the matrix of connection probabilities between districts used by init_graph(), the planar one
+    if the coordinates of districts are given, the planted one otherwise.
+    :param n: network size (int)
+    :param block_sizes: sizes of topological communities (list of ints)
+    :param avg_deg: the average degree in the network (float)
+    :param block_coords: the coordinates of the districts (list of lists)
+    :param ratio: the ratio between density outside and inside of districts (float)
+    :param planar_const: constant in the function describing link probability for planar graph generator (float)
+    :param euclidean: whether to use euclidean or geodesic distance (bool)
+    :return: numpy array with shape = (q, q)
+    """
+    if block_coords is not None:
+        return np.array(planar_affinity(avg_deg, np.array(block_sizes) / n, np.array(block_coords),
+                                        planar_const, n, euclidean))
+    return np.array(planted_affinity(len(block_sizes), avg_deg, np.array(block_sizes) / n, ratio, n))
+
+
 def init_graph(n, block_sizes, avg_deg, block_coords=None, ratio=None, planar_const=None, euclidean=False,
                state_generator=default_initial_state, random_dist=False, initial_state=None, all_states=None):
     """
@@ -107,13 +189,10 @@ def init_graph(n, block_sizes, avg_deg, block_coords=None, ratio=None, planar_co
     :return: network with states, zealots, districts etc. (ig.Graph())
     """
     q = len(block_sizes)
-    if block_coords is not None:
-        affinity = planar_affinity(avg_deg, np.array(block_sizes) / n, np.array(block_coords),
-                                   planar_const, n, euclidean)
-    else:
-        affinity = planted_affinity(q, avg_deg, np.array(block_sizes) / n, ratio, n)
+    affinity = affinity_matrix(n, block_sizes, avg_deg, block_coords=block_coords, ratio=ratio,
+                               planar_const=planar_const, euclidean=euclidean)
 
-    g = ig.Graph.SBM(n, affinity, block_sizes)
+    g = ig.Graph.SBM(n, affinity.tolist(), block_sizes)
 
     g.vs()["state"] = state_generator(n, all_states=all_states, state=initial_state)
     g.vs()["zealot"] = np.zeros(n)  # you can add zealots as you wish
@@ -134,7 +213,64 @@ def init_graph(n, block_sizes, avg_deg, block_coords=None, ratio=None, planar_co
 #                                                         #
 ###########################################################
 
-def add_zealots(g, m, zealot_state, one_district=False, district=None, degree_driven=False):
+class ZealotPlacement:
+    """
+    Draws the nodes of zealots in the same way as add_zealots(), with the nodes of every district
+    and the degree weights computed once, so zealots can be placed again cheaply before every sample.
+    """
+
+    def __init__(self, n, districts=None, degrees=None, one_district=False, district=None, degree_driven=False):
+        """
+        :param n: the number of nodes
+        :param districts: numpy array with the district of every node, needed if one_district==True
+        :param degrees: numpy array with the degree of every node, needed if degree_driven==True
+        :param one_district: boolean, whether to add them to one district or randomly
+        :param district: if one_district==True, which district to choose? If 'None', district is chosen randomly
+        :param degree_driven: if True choose nodes proportionally to the degree
+        """
+        self.n = n
+        self.one_district = one_district
+        self.district = district
+        self.degree_driven = degree_driven
+        if one_district:
+            districts = np.asarray(districts, dtype=np.int64)
+            # nodes of every district in increasing order, as given by np.where()
+            order = np.argsort(districts, kind='stable')
+            bounds = np.cumsum(np.bincount(districts, minlength=int(districts.max(initial=-1)) + 1))
+            self.district_nodes = np.split(order, bounds[:-1])
+        elif degree_driven:
+            degrees = np.asarray(degrees, dtype=float)
+            self.probabilities = degrees / np.sum(degrees)
+
+    def draw(self, m):
+        """
+        :param m: number of zealots
+        :return: numpy array with the nodes of zealots
+        """
+        if self.one_district:
+            district = self.district
+            if district is None:
+                district = np.random.randint(len(self.district_nodes))
+            return np.random.choice(self.district_nodes[district], replace=False, size=m)
+        if self.degree_driven:
+            return np.random.choice(self.n, size=m, replace=False, p=self.probabilities)
+        return np.random.choice(self.n, size=m, replace=False)
+
+
+def zealot_placement(g, one_district=False, district=None, degree_driven=False):
+    """
+    :param g: ig.Graph() object
+    :param one_district: boolean, whether to add them to one district or randomly
+    :param district: if one_district==True, which district to choose? If 'None', district is chosen randomly
+    :param degree_driven: if True choose nodes proportionally to the degree
+    :return: ZealotPlacement object for the graph
+    """
+    return ZealotPlacement(g.vcount(), districts=g.vs['district'] if one_district else None,
+                           degrees=g.degree() if degree_driven else None, one_district=one_district,
+                           district=district, degree_driven=degree_driven)
+
+
+def add_zealots(g, m, zealot_state, one_district=False, district=None, degree_driven=False, placement=None):
     """
     Function creating zealots in the network.
     Overwrite as you wish.
@@ -144,26 +280,43 @@ def add_zealots(g, m, zealot_state, one_district=False, district=None, degree_dr
     :param one_district: boolean, whether to add them to one district or randomly
     :param district: if one_district==True, which district to choose? If 'None', district is chosen randomly
     :param degree_driven: if True choose nodes proportionally to the degree
+    :param placement: ZealotPlacement object of the graph, created from the other parameters if not given
     :return: ig.Graph() object
     """
-    if one_district:
-        if district is None:
-            district = np.random.randint(np.max(g.vs['district']) + 1)
-        ids = np.random.choice(np.where(np.array(g.vs['district']) == district)[0], replace=False, size=m)
-    elif degree_driven:
-        degrees = g.degree()
-        deg_prob = degrees / np.sum(degrees)
-        ids = np.random.choice(g.vcount(), size=m, replace=False, p=deg_prob)
-    else:
-        ids = np.random.choice(g.vcount(), size=m, replace=False)
+    if placement is None:
+        placement = zealot_placement(g, one_district=one_district, district=district, degree_driven=degree_driven)
+    ids = placement.draw(m)
 
     if len(ids):
-        # apparently igraph can understand only python integers as node ids,
-        # list comprehension below is not the most optimal way to obtain a list of python integers,
-        # but using numpy key-word argument 'dtype' or the method 'astype' with type 'int'
-        # still returns arrays with entries as 'numpy.int64' instead of python 'int'
-        zealots = [int(_id) for _id in ids]
+        # igraph understands only python integers as node ids, which tolist() gives
+        zealots = ids.tolist()
         g.vs[zealots]['zealot'] = 1
         g.vs[zealots]['state'] = zealot_state
 
     return g
+
+
+def reset_network(g, m, zealot_state, placement, state_generator=default_initial_state, all_states=None,
+                  initial_state=None):
+    """
+    Sets new initial states and zealots of the network before a sample, as init_graph() and add_zealots() do.
+    All attributes are written at once from python lists, which igraph copies much faster than numpy arrays.
+    :param g: ig.Graph() object
+    :param m: number of zealots
+    :param zealot_state: state to assign for zealots
+    :param placement: ZealotPlacement object of the graph
+    :param state_generator: function that generates the states
+    :param all_states: possible states of nodes
+    :param initial_state: initial state for the nodes used in the consensus initialization
+    :return: ig.Graph() object
+    """
+    n = g.vcount()
+    states = state_generator(n, all_states=all_states, state=initial_state)
+    states = states.tolist() if isinstance(states, np.ndarray) else list(states)
+    zealots = [0] * n
+    for node in placement.draw(m).tolist():
+        states[node] = zealot_state
+        zealots[node] = 1
+    g.vs['state'] = states
+    g.vs['zealot'] = zealots
+    return g
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Calibration of the planar_c parameter of the planar network to commuting data. The expected histogram
+of distances of links is computed analytically from the coordinates and sizes of districts: a link between
+districts i and j has the distance between them (0 inside a district), and the expected number of such links
+is proportional to N_i * N_j / (d_ij + c)^2, so the histogram doesn't depend on the average degree.
+planar_c is fitted by minimising the squared difference between this histogram and the commuting data
+with a gradient method.
+
+Commuting data is an array, where the first row contains commuting distances in km, and the second row
+provides a fraction of people commuting up to the distance given on the same position in the first row,
+but more than the previous distance (so the first fraction is 0). The last bin is open-ended,
+i.e. it contains all links longer than the previous distance.
+"""
+import re
+import json
+import numpy as np
+from scipy.optimize import minimize
+
+from net_generation.base import distance_matrix
+
+
+# commuting data of the countries in the configuration files
+commuting_data = {
+    'israel': np.array([[0, 5, 10, 20, 40, 80],
+                        [0.0, 0.505, 0.143, 0.165, 0.121, 0.066]]),
+    'india': np.array([[0, 1, 5, 10, 20, 30, 50, 100],
+                       [0.0, 0.2391093895, 0.3345624697, 0.2001085192, 0.09743021074, 0.05492006168, 0.03557149438,
+                        0.03829785485]]),
+    'poland': np.array([[0, 5, 10, 15, 20, 30, 40, 60, 80, 100, 630],
+                        [0.0, 0.7315281676792722, 0.04877240795194137, 0.06853774559525151, 0.044917292501255084,
+                         0.037084754908489836, 0.016260173013807635, 0.01888197596385357, 0.008741833413590428,
+                         0.0048085953642135314, 0.02046705360832488]]),
+}
+
+
+def read_commuting_data(source):
+    """
+    :param source: the name of a country in commuting_data, or a csv file with two columns: the distance in km
+    and the fraction of people commuting up to this distance (but more than the previous one), starting with 0,0
+    :return: numpy array with commuting data, see the module's description
+    """
+    if source.lower() in commuting_data:
+        return commuting_data[source.lower()]
+    data = np.loadtxt(source, delimiter=',', ndmin=2).T
+    if data.shape[0] != 2 or data.shape[1] < 2:
+        raise ValueError(f'Commuting data in {source} must have two columns (distance and fraction) '
+                         f'and at least two rows')
+    return data
+
+
+###########################################################
+#                                                         #
+#               Histogram of link distances               #
+#                                                         #
+###########################################################
+
+def district_pairs(coordinates, block_sizes, euclidean=False):
+    """
+    Computes the distance and the number of pairs of nodes for every pair of districts (including a district
+    with itself), which together with planar_c give the expected number of links between them.
+    :param coordinates: the coordinates of the districts (numpy array with shape = (q, 2))
+    :param block_sizes: sizes of districts (list of ints)
+    :param euclidean: whether to use euclidean or geodesic distance (bool)
+    :return: two numpy arrays with a shape (q * (q + 1) / 2,), the distances and the numbers of pairs of nodes
+    """
+    sizes = np.asarray(block_sizes, dtype=float)
+    first, second = np.triu_indices(len(sizes))
+    pairs = sizes[first] * sizes[second]
+    inside = first == second
+    pairs[inside] = sizes[first[inside]] * (sizes[first[inside]] - 1) / 2
+    return distance_matrix(coordinates, euclidean)[first, second], pairs
+
+
+def distance_bins(distances, edges):
+    """
+    :param distances: numpy array with distances
+    :param edges: the edges of bins (the first row of commuting data), the first bin contains also 0,
+    and the last one all distances above the previous edge
+    :return: numpy array with the bin of every distance
+    """
+    return np.searchsorted(np.asarray(edges)[1:-1], distances, side='left')
+
+
+def link_distance_histogram(c, distances, pairs, bins, num_bins, gradient=False):
+    """
+    Computes the expected fraction of links in every bin of distance.
+    :param c: constant in the function describing link probability for planar graph generator (float)
+    :param distances: numpy array with distances between pairs of districts, see district_pairs()
+    :param pairs: numpy array with the numbers of pairs of nodes, see district_pairs()
+    :param bins: numpy array with the bin of every pair of districts, see distance_bins()
+    :param num_bins: the number of bins
+    :param gradient: whether to return the derivative of the histogram with respect to c
+    :return: numpy array with a shape (num_bins,), and its derivative if gradient is True
+    """
+    links = pairs / (distances + c) ** 2
+    total = links.sum()
+    histogram = np.bincount(bins, weights=links, minlength=num_bins) / total
+    if not gradient:
+        return histogram
+    d_links = -2.0 * links / (distances + c)
+    d_histogram = np.bincount(bins, weights=d_links, minlength=num_bins) / total - histogram * d_links.sum() / total
+    return histogram, d_histogram
+
+
+###########################################################
+#                                                         #
+#                   Fitting planar_c                      #
+#                                                         #
+###########################################################
+
+# the initial values of planar_c checked before the gradient method is started, to avoid local minima
+initial_planar_c = np.logspace(-2, 3, 26)
+
+
+def fit_planar_c(coordinates, block_sizes, data, euclidean=False, c0=None):
+    """
+    Fits planar_c to commuting data, minimising the mean squared difference between the expected histogram
+    of link distances and the data. The logarithm of planar_c is optimised, so it stays positive.
+    Links inside districts have the distance 0, so with many small districts the histogram can't follow
+    the data at short distances, what is shown by a low (or even negative) pseudo R^2.
+    :param coordinates: the coordinates of the districts (numpy array with shape = (q, 2))
+    :param block_sizes: sizes of districts (list of ints)
+    :param data: commuting data, see the module's description
+    :param euclidean: whether to use euclidean or geodesic distance (bool)
+    :param c0: the initial value of planar_c, by default the best one of initial_planar_c
+    :return: a dict with 'planar_c', 'mse' - the mean squared error, 'r_squared' - pseudo R^2,
+    'histogram' - the expected histogram for the fitted planar_c, 'data' - the normalised fractions from the data,
+    and 'edges' - the edges of bins
+    """
+    edges, target = data[0], data[1, 1:] / data[1, 1:].sum()
+    num_bins = len(target)
+    distances, pairs = district_pairs(coordinates, block_sizes, euclidean)
+    bins = distance_bins(distances, edges)
+
+    def objective(log_c):
+        c = np.exp(log_c[0])
+        histogram, d_histogram = link_distance_histogram(c, distances, pairs, bins, num_bins, gradient=True)
+        difference = histogram - target
+        return np.mean(difference ** 2), np.array([np.mean(2 * difference * d_histogram) * c])
+
+    if c0 is None:
+        c0 = min(initial_planar_c, key=lambda c: objective([np.log(c)])[0])
+    res = minimize(objective, x0=np.array([np.log(c0)]), jac=True, method='L-BFGS-B',
+                   bounds=[(np.log(1e-6), np.log(1e6))])
+    planar_c = float(np.exp(res.x[0]))
+    histogram = link_distance_histogram(planar_c, distances, pairs, bins, num_bins)
+    mse = float(np.mean((histogram - target) ** 2))
+    r_squared = 1.0 - np.sum((target - histogram) ** 2) / np.sum((target - np.mean(target)) ** 2)
+    return {'planar_c': planar_c, 'mse': mse, 'r_squared': float(r_squared), 'histogram': histogram,
+            'data': target, 'edges': edges}
+
+
+def calibrate_config(config_file, data, c0=None):
+    """
+    Fits planar_c for the districts given in a configuration file.
+    :param config_file: the name of a configuration file with 'district_sizes' and 'district_coords'
+    :param data: commuting data (see the module's description) or the source accepted by read_commuting_data()
+    :param c0: the initial value of planar_c, see fit_planar_c()
+    :return: the dict returned by fit_planar_c() with the additional 'config_file'
+    """
+    with open(config_file, 'r') as in_file:
+        settings = json.load(in_file)
+    if settings.get('district_coords') is None or settings.get('district_sizes') is None:
+        raise ValueError(f"The configuration file {config_file} must contain 'district_sizes' and 'district_coords'")
+    if isinstance(data, str):
+        data = read_commuting_data(data)
+    fit = fit_planar_c(np.array(settings['district_coords']), settings['district_sizes'], data,
+                       euclidean=settings.get('euclidean', False), c0=c0)
+    fit['config_file'] = config_file
+    return fit
+
+
+def write_planar_c(config_file, planar_c, decimals=4):
+    """
+    Writes the value of planar_c into a configuration file, keeping the formatting of the file
+    if it already contains planar_c.
+    :param config_file: the name of a configuration file
+    :param planar_c: the value to write
+    :param decimals: the number of decimal places of the value
+    :return: None
+    """
+    value = round(planar_c, decimals)
+    with open(config_file, 'r') as in_file:
+        text = in_file.read()
+    pattern = r'("planar_c"\s*:\s*)[-+0-9.eE]+|("planar_c"\s*:\s*)null'
+    if re.search(pattern, text):
+        text = re.sub(pattern, lambda match: (match.group(1) or match.group(2)) + str(value), text, count=1)
+    else:
+        settings = json.loads(text)
+        settings['planar_c'] = value
+        text = json.dumps(settings, indent=2)
+    with open(config_file, 'w') as out_file:
+        out_file.write(text)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnostics of the generated networks computed from arrays of edges and district labels,
+cheap enough to run for every simulation, also for networks with millions of edges,
+and their expected values computed from the affinity matrix without generating the network
+"""
+import numpy as np
+from itertools import chain
+
+from configuration.logging import log
+from net_generation.base import affinity_matrix
+
+
+###########################################################
+#                                                         #
+#                   Arrays of the graph                   #
+#                                                         #
+###########################################################
+
+def edge_arrays(graph):
+    """
+    :param graph: ig.Graph object
+    :return: two numpy arrays with the sources and the targets of all edges
+    """
+    # fromiter avoids creating a numpy object from every tuple, which is a few times faster than np.array
+    edges = np.fromiter(chain.from_iterable(graph.get_edgelist()), dtype=np.int64, count=2 * graph.ecount())
+    edges = edges.reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def csr_adjacency(graph):
+    """
+    Creates the adjacency of the graph in the compressed sparse row (CSR) format, neighbours of node i
+    are indices[indptr[i]:indptr[i + 1]].
+    :param graph: ig.Graph object
+    :return: two numpy arrays, indptr with a shape (n + 1,) and indices with a shape (2 * number of edges,)
+    """
+    sources, targets = edge_arrays(graph)
+    both_sources = np.concatenate([sources, targets])
+    both_targets = np.concatenate([targets, sources])
+    order = np.argsort(both_sources, kind='stable')
+    indptr = np.zeros(graph.vcount() + 1, dtype=np.int64)
+    np.cumsum(np.bincount(both_sources, minlength=graph.vcount()), out=indptr[1:])
+    return indptr, both_targets[order]
+
+
+def district_labels(graph):
+    """
+    :param graph: ig.Graph object with the 'district' attribute of nodes
+    :return: numpy array with the district of every node
+    """
+    return np.array(graph.vs['district'], dtype=np.int64)
+
+
+###########################################################
+#                                                         #
+#                      Diagnostics                        #
+#                                                         #
+###########################################################
+
+def district_link_matrix(sources, targets, districts, q):
+    """
+    Counts the edges between every pair of districts.
+    :param sources: numpy array with the sources of edges
+    :param targets: numpy array with the targets of edges
+    :param districts: numpy array with the district of every node
+    :param q: the number of districts
+    :return: symmetric numpy array with a shape (q, q), the number of edges between districts i and j,
+    and the number of edges inside district i on the diagonal
+    """
+    d_source, d_target = districts[sources], districts[targets]
+    pairs = np.minimum(d_source, d_target) * q + np.maximum(d_source, d_target)
+    counts = np.bincount(pairs, minlength=q * q).reshape(q, q)
+    return counts + counts.T - np.diag(np.diag(counts))
+
+
+def district_degree_statistics(degrees, districts, q):
+    """
+    Computes statistics of the degrees of nodes in every district.
+    :param degrees: numpy array with the degree of every node
+    :param districts: numpy array with the district of every node
+    :param q: the number of districts
+    :return: a dict {name of the statistic: numpy array with a shape (q,)} with the number of nodes,
+    and the mean, standard deviation, minimum and maximum of degrees (NaN for empty districts)
+    """
+    sizes = np.bincount(districts, minlength=q)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(districts, weights=degrees, minlength=q) / sizes
+        mean_square = np.bincount(districts, weights=degrees.astype(float) ** 2, minlength=q) / sizes
+    minimum = np.full(q, np.inf)
+    maximum = np.full(q, -np.inf)
+    np.minimum.at(minimum, districts, degrees)
+    np.maximum.at(maximum, districts, degrees)
+    empty = sizes == 0
+    minimum[empty] = np.nan
+    maximum[empty] = np.nan
+    return {'nodes': sizes, 'mean': mean, 'std': np.sqrt(np.maximum(mean_square - mean ** 2, 0.0)),
+            'min': minimum, 'max': maximum}
+
+
+def graph_diagnostics(graph, q=None):
+    """
+    Computes the diagnostics of a network divided into districts in one pass over arrays of edges.
+    :param graph: ig.Graph object with the 'district' attribute of nodes
+    :param q: the number of districts, by default the highest district label plus one
+    :return: a dict with
+        'link_matrix' - the number of edges between districts, see district_link_matrix(),
+        'degrees' - statistics of degrees per district, see district_degree_statistics(),
+        'inter_links', 'intra_links' - the number of inter- and intra-district edges,
+        'inter_fraction' - the fraction of inter-district edges among all edges,
+        'inter_intra_ratio' - the ratio of inter-district edges to intra-district edges
+    """
+    sources, targets = edge_arrays(graph)
+    districts = district_labels(graph)
+    if q is None:
+        q = int(districts.max()) + 1 if len(districts) else 0
+
+    link_matrix = district_link_matrix(sources, targets, districts, q)
+    degrees = np.bincount(sources, minlength=len(districts)) + np.bincount(targets, minlength=len(districts))
+    intra_links = int(np.trace(link_matrix))
+    inter_links = len(sources) - intra_links
+    return {'link_matrix': link_matrix,
+            'degrees': district_degree_statistics(degrees, districts, q),
+            'inter_links': inter_links,
+            'intra_links': intra_links,
+            'inter_fraction': inter_links / len(sources) if len(sources) else np.nan,
+            'inter_intra_ratio': inter_links / intra_links if intra_links else np.inf}
+
+
+def log_graph_diagnostics(graph, q=None):
+    """
+    Computes the diagnostics of a network and logs the most important of them.
+    :param graph: ig.Graph object with the 'district' attribute of nodes
+    :param q: the number of districts, by default the highest district label plus one
+    :return: the dict returned by graph_diagnostics()
+    """
+    diagnostics = graph_diagnostics(graph, q=q)
+    degrees = diagnostics['degrees']
+    log.info(f"There is {round(100.0 * diagnostics['inter_fraction'], 1)}% of inter-district connections")
+    log.info(f"Ratio of inter- to intra-district links is equal {round(diagnostics['inter_intra_ratio'], 3)}")
+    log.info(f"Average degree in districts ranges from {round(np.nanmin(degrees['mean']), 2)} "
+             f"to {round(np.nanmax(degrees['mean']), 2)}, the highest degree is {np.nanmax(degrees['max']):.0f}")
+    return diagnostics
+
+
+###########################################################
+#                                                         #
+#                  Expected diagnostics                   #
+#                                                         #
+###########################################################
+
+def expected_link_matrix(affinity, block_sizes):
+    """
+    Computes the expected number of edges between every pair of districts in the Stochastic Block Model
+    (without loops and multiple edges, as generated by ig.Graph.SBM).
+    :param affinity: numpy array with a shape (q, q), the connection probabilities between districts
+    :param block_sizes: sizes of districts (list of ints)
+    :return: symmetric numpy array with a shape (q, q), in the same form as district_link_matrix()
+    """
+    sizes = np.asarray(block_sizes, dtype=float)
+    links = affinity * np.outer(sizes, sizes)
+    np.fill_diagonal(links, np.diag(affinity) * sizes * (sizes - 1) / 2)
+    return links
+
+
+def expected_degree_statistics(affinity, block_sizes):
+    """
+    Computes the expected statistics of the degrees of nodes in every district in the Stochastic Block Model,
+    where the degree of a node is a sum of binomial variables, one for every district.
+    :param affinity: numpy array with a shape (q, q), the connection probabilities between districts
+    :param block_sizes: sizes of districts (list of ints)
+    :return: a dict {name of the statistic: numpy array with a shape (q,)} with the number of nodes,
+    and the mean and standard deviation of degrees, as in district_degree_statistics()
+    """
+    sizes = np.asarray(block_sizes, dtype=float)
+    # a node doesn't connect to itself, so there is one node fewer in its own district
+    others = sizes[np.newaxis, :] - np.eye(len(sizes))
+    mean = np.sum(affinity * others, axis=1)
+    variance = np.sum(affinity * (1 - affinity) * others, axis=1)
+    return {'nodes': sizes.astype(np.int64), 'mean': mean, 'std': np.sqrt(variance)}
+
+
+def expected_diagnostics(n, block_sizes, avg_deg, block_coords=None, ratio=None, planar_const=None, euclidean=False):
+    """
+    Computes the expected diagnostics of a network generated by net_generation.base.init_graph() with the given
+    parameters, without generating it, e.g. to validate a configuration or to tune planar_c.
+    :param n: network size (int)
+    :param block_sizes: sizes of topological communities (list of ints)
+    :param avg_deg: the average degree in the network (float)
+    :param block_coords: the coordinates of the districts (list of lists)
+    :param ratio: the ratio between density outside and inside of districts (float)
+    :param planar_const: constant in the function describing link probability for planar graph generator (float)
+    :param euclidean: whether to use euclidean or geodesic distance (bool)
+    :return: a dict with the expected values of the entries of graph_diagnostics(), and
+        'links' - the expected number of edges,
+        'affinity' - the matrix of connection probabilities
+    """
+    affinity = affinity_matrix(n, block_sizes, avg_deg, block_coords=block_coords, ratio=ratio,
+                               planar_const=planar_const, euclidean=euclidean)
+    link_matrix = expected_link_matrix(affinity, block_sizes)
+    links = float(np.sum(np.triu(link_matrix)))
+    intra_links = float(np.trace(link_matrix))
+    inter_links = links - intra_links
+    return {'link_matrix': link_matrix,
+            'degrees': expected_degree_statistics(affinity, block_sizes),
+            'links': links,
+            'inter_links': inter_links,
+            'intra_links': intra_links,
+            'inter_fraction': inter_links / links if links else np.nan,
+            'inter_intra_ratio': inter_links / intra_links if intra_links else np.inf,
+            'affinity': affinity}
+
+
+def log_expected_diagnostics(diagnostics):
+    """
+    Logs the most important expected diagnostics.
+    :param diagnostics: the dict returned by expected_diagnostics()
+    :return: None
+    """
+    degrees = diagnostics['degrees']
+    log.info(f"Expected number of links is {diagnostics['links']:.0f}, "
+             f"{round(100.0 * diagnostics['inter_fraction'], 1)}% of them between districts")
+    log.info(f"Expected ratio of inter- to intra-district links is {round(diagnostics['inter_intra_ratio'], 3)}")
+    log.info(f"Expected average degree in districts ranges from {round(np.min(degrees['mean']), 2)} "
+             f"to {round(np.max(degrees['mean']), 2)}")
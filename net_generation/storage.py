@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Out-of-core storage of networks too large for igraph, in memory-mapped files.
+
+The network is generated from the same Stochastic Block Model as init_graph(), but without igraph:
+the edges between every pair of districts are drawn with a separate random generator, so they can be drawn
+again when needed instead of being kept in memory. The adjacency is written in the compressed sparse row (CSR)
+format district by district - the nodes of a district are consecutive, and its chunk of the CSR needs only
+the edges of that district - so the memory needed is set by the largest district, not by the whole network.
+The arrays indptr, indices and districts are kept in files in a directory and read through np.memmap,
+and only the states of nodes (2 bytes per node) and zealots (1 byte per node) are kept in memory.
+"""
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+from net_generation.base import affinity_matrix, ZealotPlacement
+from net_generation.diagnostics import csr_adjacency, district_labels
+
+
+###########################################################
+#                                                         #
+#                    Mapped network                       #
+#                                                         #
+###########################################################
+
+class MappedGraph:
+    """
+    A network with the CSR adjacency and districts in memory-mapped files, and the index of the state
+    of every node and zealots in memory. Like ig.Graph, it keeps graph attributes, e.g. g['domains'].
+    """
+
+    def __init__(self, path, num_states, temporary=False):
+        """
+        :param path: the directory with the files created by generate_mapped_graph()
+        :param num_states: the number of states
+        :param temporary: whether to remove the directory in close()
+        """
+        self.path = path
+        self.temporary = temporary
+        with open(os.path.join(path, 'network.json')) as f:
+            self.meta = json.load(f)
+        n, q = self.meta['n'], self.meta['q']
+        self.n, self.q, self.num_states = n, q, num_states
+        self.files = {name: os.path.join(path, name + '.bin') for name in ('indptr', 'indices', 'districts')}
+        self.indptr = np.memmap(self.files['indptr'], dtype=np.int64, mode='r', shape=(n + 1,))
+        # an empty file can't be mapped
+        self.indices = np.memmap(self.files['indices'], dtype=self.meta['index_dtype'], mode='r',
+                                 shape=(self.meta['entries'],)) if self.meta['entries'] else \
+            np.zeros(0, dtype=self.meta['index_dtype'])
+        self.districts = np.memmap(self.files['districts'], dtype=np.int32, mode='r', shape=(n,))
+        self.states = np.zeros(n, dtype=np.int16)
+        self.zealots = np.zeros(n, dtype=bool)
+        self._attributes = {}
+
+    def __getitem__(self, name):
+        return self._attributes[name]
+
+    def __setitem__(self, name, value):
+        self._attributes[name] = value
+
+    def attributes(self):
+        """
+        :return: the names of graph attributes
+        """
+        return list(self._attributes.keys())
+
+    def vcount(self):
+        return self.n
+
+    def degree(self):
+        """
+        :return: numpy array with the degree of every node
+        """
+        return np.diff(self.indptr)
+
+    def tally(self, chunk=10000000):
+        """
+        Counts the votes in every district, reading the districts in chunks.
+        :param chunk: the number of nodes counted at once
+        :return: numpy array with a shape (q, number of states), see electoral_sys.electoral_system.tally_votes()
+        """
+        tally = np.zeros(self.q * self.num_states, dtype=np.int64)
+        for start in range(0, self.n, chunk):
+            districts = np.asarray(self.districts[start:start + chunk], dtype=np.int64)
+            tally += np.bincount(districts * self.num_states + self.states[start:start + chunk],
+                                 minlength=self.q * self.num_states)
+        return tally.reshape(self.q, self.num_states)
+
+    def close(self):
+        """
+        Releases the maps, and removes the files of a temporary network.
+        :return: None
+        """
+        self.indptr = self.indices = self.districts = None
+        if self.temporary:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+###########################################################
+#                                                         #
+#                Generating the network                   #
+#                                                         #
+###########################################################
+
+def block_pair_edges(size_a, size_b, probability, seed, same=False):
+    """
+    Draws the edges between two districts of the Stochastic Block Model (without loops and multiple edges),
+    always the same for the same seed: the number of edges is binomial, and they are drawn uniformly
+    from all pairs of nodes until there are enough distinct ones.
+    :param size_a: the number of nodes of the first district
+    :param size_b: the number of nodes of the second district
+    :param probability: the probability of a link between two nodes
+    :param seed: the seed of the random generator of this pair of districts
+    :param same: whether it is a single district (size_a == size_b), then node a < node b
+    :return: two numpy arrays, the nodes of edges in the first district and in the second district
+    (numbered from 0 in every district)
+    """
+    random_state = np.random.RandomState(seed)
+    pairs = size_a * (size_a - 1) // 2 if same else size_a * size_b
+    m = random_state.binomial(pairs, probability) if pairs else 0
+    keys = np.zeros(0, dtype=np.int64)
+    while len(keys) < m:
+        a = random_state.randint(0, size_a, m - len(keys))
+        b = random_state.randint(0, size_b, m - len(keys))
+        if same:
+            a, b = np.minimum(a, b)[a != b], np.maximum(a, b)[a != b]
+        keys = np.sort(np.concatenate([keys, a * size_b + b]))
+        # np.unique() is a few times slower than removing repeated neighbours of a sorted array
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return keys // size_b, keys % size_b
+
+
+def generate_mapped_graph(path, n, block_sizes, avg_deg, block_coords=None, ratio=None, planar_const=None,
+                          euclidean=False):
+    """
+    Generates the network of init_graph() (without states and zealots) directly into files, district by district.
+    The nodes are numbered district by district, as in init_graph() without random districts.
+    :param path: the directory for the files, created if needed
+    :param n: network size (int)
+    :param block_sizes: sizes of topological communities (list of ints)
+    :param avg_deg: the average degree in the network (float)
+    :param block_coords: the coordinates of the districts (list of lists)
+    :param ratio: the ratio between density outside and inside of districts (float)
+    :param planar_const: constant in the function describing link probability for planar graph generator (float)
+    :param euclidean: whether to use euclidean or geodesic distance (bool)
+    :return: None
+    """
+    affinity = affinity_matrix(n, block_sizes, avg_deg, block_coords=block_coords, ratio=ratio,
+                               planar_const=planar_const, euclidean=euclidean)
+    sizes = np.array(block_sizes, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    q = len(sizes)
+    # the edges between districts i <= j are drawn with seeds[i, j], once for each of the districts
+    seeds = np.random.randint(2 ** 31, size=(q, q))
+    index_dtype = np.int32 if n < 2 ** 31 else np.int64
+
+    os.makedirs(path, exist_ok=True)
+    entries = 0
+    with open(os.path.join(path, 'indptr.bin'), 'wb') as indptr_file, \
+            open(os.path.join(path, 'indices.bin'), 'wb') as indices_file, \
+            open(os.path.join(path, 'districts.bin'), 'wb') as districts_file:
+        indptr_file.write(np.zeros(1, dtype=np.int64).tobytes())
+        for i in range(q):
+            nodes, neighbours = [], []
+            for j in range(q):
+                a, b = min(i, j), max(i, j)
+                first, second = block_pair_edges(sizes[a], sizes[b], affinity[a, b], seeds[a, b], same=a == b)
+                if i == j:
+                    nodes += [first, second]
+                    neighbours += [second + offsets[i], first + offsets[i]]
+                elif i == a:
+                    nodes.append(first)
+                    neighbours.append(second + offsets[b])
+                else:
+                    nodes.append(second)
+                    neighbours.append(first + offsets[a])
+            nodes, neighbours = np.concatenate(nodes), np.concatenate(neighbours)
+            order = np.argsort(nodes, kind='stable')
+            degrees = np.bincount(nodes, minlength=sizes[i])
+            indptr_file.write((entries + np.cumsum(degrees)).astype(np.int64).tobytes())
+            indices_file.write(neighbours[order].astype(index_dtype).tobytes())
+            districts_file.write(np.full(sizes[i], i, dtype=np.int32).tobytes())
+            entries += len(nodes)
+
+    with open(os.path.join(path, 'network.json'), 'w') as f:
+        json.dump({'n': int(n), 'q': int(q), 'entries': int(entries), 'index_dtype': np.dtype(index_dtype).name},
+                  f)
+
+
+def save_mapped_graph(g, path):
+    """
+    Saves an igraph network into files read by MappedGraph, e.g. to run a network generated by init_graph()
+    with the engines of mapped networks.
+    :param g: ig.Graph object with the 'district' attribute of nodes
+    :param path: the directory for the files, created if needed
+    :return: None
+    """
+    indptr, indices = csr_adjacency(g)
+    districts = district_labels(g)
+    os.makedirs(path, exist_ok=True)
+    indptr.astype(np.int64).tofile(os.path.join(path, 'indptr.bin'))
+    index_dtype = np.int32 if g.vcount() < 2 ** 31 else np.int64
+    indices.astype(index_dtype).tofile(os.path.join(path, 'indices.bin'))
+    districts.astype(np.int32).tofile(os.path.join(path, 'districts.bin'))
+    with open(os.path.join(path, 'network.json'), 'w') as f:
+        json.dump({'n': g.vcount(), 'q': int(districts.max(initial=-1)) + 1, 'entries': len(indices),
+                   'index_dtype': np.dtype(index_dtype).name}, f)
+
+
+def init_mapped_graph(n, block_sizes, avg_deg, path=None, block_coords=None, ratio=None, planar_const=None,
+                      euclidean=False, consensus=False, initial_state=None, all_states=None):
+    """
+    The counterpart of init_graph() generating the network into memory-mapped files.
+    :param n: network size (int)
+    :param block_sizes: sizes of topological communities (list of ints)
+    :param avg_deg: the average degree in the network (float)
+    :param path: the directory for the files, a temporary directory (removed by MappedGraph.close()) by default
+    :param block_coords: the coordinates of the districts (list of lists)
+    :param ratio: the ratio between density outside and inside of districts (float)
+    :param planar_const: constant in the function describing link probability for planar graph generator (float)
+    :param euclidean: whether to use euclidean or geodesic distance (bool)
+    :param consensus: whether all nodes start in the same state, otherwise states are drawn with equal probabilities
+    :param initial_state: the state of all nodes in the consensus, the last state by default
+    :param all_states: possible states of nodes
+    :return: MappedGraph object
+    """
+    temporary = path is None
+    if temporary:
+        path = tempfile.mkdtemp(prefix='network_')
+    try:
+        generate_mapped_graph(path, n, block_sizes, avg_deg, block_coords=block_coords, ratio=ratio,
+                              planar_const=planar_const, euclidean=euclidean)
+        g = MappedGraph(path, len(all_states), temporary=temporary)
+    except BaseException:
+        # partially written files of a temporary network aren't left behind
+        if temporary:
+            shutil.rmtree(path, ignore_errors=True)
+        raise
+    init_mapped_states(g, consensus=consensus, initial_state=initial_state, all_states=all_states)
+    return g
+
+
+###########################################################
+#                                                         #
+#                States and zealots                       #
+#                                                         #
+###########################################################
+
+def init_mapped_states(g, consensus=False, initial_state=None, all_states=None):
+    """
+    Sets the states of all nodes as default_initial_state() or consensus_initial_state(), and removes zealots.
+    :param g: MappedGraph object
+    :param consensus: whether all nodes start in the same state, otherwise states are drawn with equal probabilities
+    :param initial_state: the state of all nodes in the consensus, the last state by default
+    :param all_states: possible states of nodes
+    :return: MappedGraph object
+    """
+    if consensus:
+        g.states[:] = len(all_states) - 1 if initial_state is None else list(all_states).index(initial_state)
+    else:
+        g.states[:] = np.random.randint(0, len(all_states), g.n)
+    g.zealots[:] = False
+    return g
+
+
+def mapped_zealot_placement(g, one_district=False, district=None, degree_driven=False):
+    """
+    :param g: MappedGraph object
+    :param one_district: boolean, whether to add them to one district or randomly
+    :param district: if one_district==True, which district to choose? If 'None', district is chosen randomly
+    :param degree_driven: if True choose nodes proportionally to the degree
+    :return: ZealotPlacement object for the network
+    """
+    return ZealotPlacement(g.n, districts=g.districts if one_district else None,
+                           degrees=g.degree() if degree_driven else None, one_district=one_district,
+                           district=district, degree_driven=degree_driven)
+
+
+def add_mapped_zealots(g, m, zealot_state, all_states, one_district=False, district=None, degree_driven=False,
+                       placement=None):
+    """
+    The counterpart of net_generation.base.add_zealots() for MappedGraph.
+    :param g: MappedGraph object
+    :param m: number of zealots
+    :param zealot_state: state to assign for zealots
+    :param all_states: possible states of nodes
+    :param one_district: boolean, whether to add them to one district or randomly
+    :param district: if one_district==True, which district to choose? If 'None', district is chosen randomly
+    :param degree_driven: if True choose nodes proportionally to the degree
+    :param placement: ZealotPlacement object of the network, created from the other parameters if not given
+    :return: MappedGraph object
+    """
+    if placement is None:
+        placement = mapped_zealot_placement(g, one_district=one_district, district=district,
+                                            degree_driven=degree_driven)
+    if placement.one_district or placement.degree_driven:
+        ids = placement.draw(m)
+    else:
+        # np.random.choice(g.n, replace=False) would permute all nodes
+        ids = np.zeros(0, dtype=np.int64)
+        while len(ids) < m:
+            ids = np.unique(np.concatenate([ids, np.random.randint(0, g.n, m - len(ids))]))
+
+    g.zealots[ids] = True
+    g.states[ids] = list(all_states).index(zealot_state)
+    return g
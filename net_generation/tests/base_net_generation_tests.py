@@ -5,7 +5,9 @@ import igraph as ig
 from collections import Counter
 
 from net_generation.base import default_initial_state, consensus_initial_state, add_zealots
-from net_generation.base import init_graph, planted_affinity, planar_affinity
+from net_generation.base import zealot_placement, reset_network, geodesic_distances
+from net_generation.base import init_graph, planted_affinity, planar_affinity, distance_matrix, affinity_matrix
+from geopy.distance import geodesic
 
 
 class TestNetworkGeneration(unittest.TestCase):
@@ -47,6 +49,35 @@ class TestNetworkGeneration(unittest.TestCase):
                                             [0.0024, 0.00127, 0.29026]])
         np.testing.assert_array_almost_equal(affinity, almost_correct_affinity, decimal=5)
 
+    def test_geodesic_distance_matrix(self):
+        coordinates = np.array([[52.23, 21.01], [50.06, 19.94], [31.77, 35.21], [-33.87, 151.21], [0.0, 0.0]])
+        res = distance_matrix(coordinates)
+        for i in range(len(coordinates)):
+            for j in range(len(coordinates)):
+                self.assertAlmostEqual(res[i, j], geodesic(coordinates[i], coordinates[j]).km, places=6)
+
+    def test_geodesic_distances_same_as_geopy(self):
+        coordinates_1 = np.array([[52.23, 21.01], [50.06, 19.94], [10.0, 20.0], [-33.9, 151.2], [0.0, 0.0],
+                                  [52.23, 21.01], [0.0, 0.0], [0.0, 0.0], [89.9, 0.0]])
+        coordinates_2 = np.array([[54.35, 18.65], [50.07, 19.95], [10.0, 25.0], [51.5, -0.13], [0.0, 90.0],
+                                  [52.23, 21.01], [0.5, 179.7], [0.0, 180.0], [-89.9, 180.0]])
+        # the last three pairs are (nearly) antipodal, where the Vincenty formula doesn't converge
+        distances = geodesic_distances(coordinates_1, coordinates_2)
+        expected = [geodesic(first, second).km for first, second in zip(coordinates_1, coordinates_2)]
+        np.testing.assert_allclose(distances, expected, rtol=0, atol=1e-6)
+
+    def test_euclidean_distance_matrix(self):
+        res = distance_matrix(np.array([[0.0, 0.0], [3.0, 4.0]]), euclidean=True)
+        np.testing.assert_array_almost_equal(res, [[0.0, 5.0], [5.0, 0.0]])
+
+    def test_affinity_matrix(self):
+        res = affinity_matrix(100, [60, 40], 10, ratio=0.05)
+        np.testing.assert_array_almost_equal(res, planted_affinity(2, 10, np.array([0.6, 0.4]), 0.05, 100))
+        res = affinity_matrix(100, [30, 40, 30], 10, block_coords=[[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]],
+                              planar_const=0.1, euclidean=True)
+        np.testing.assert_array_almost_equal(res, planar_affinity(10, np.array([0.3, 0.4, 0.3]), [[0.0, 0.0],
+                                             [1.0, 0.0], [0.0, 1.0]], 0.1, 100, euclidean=True))
+
     def test_sbm_avg_deg(self):
         n = 1000
         avg_deg = 10.0
@@ -111,5 +142,38 @@ class TestNetworkGeneration(unittest.TestCase):
         self.assertDictEqual(Counter(g.vs['zealot']), {1: 3, 0: 27})
 
 
+    def test_zealot_placement_one_dist(self):
+        g = ig.Graph(7)
+        g.vs['district'] = [2, 0, 2, 1, 0, 2, 2]
+        placement = zealot_placement(g, one_district=True)
+        self.assertEqual(len(placement.district_nodes), 3)
+        for nodes, district in zip(placement.district_nodes, range(3)):
+            np.testing.assert_array_equal(nodes, np.where(np.array(g.vs['district']) == district)[0])
+        # the same nodes as drawn without the placement
+        np.random.seed(3)
+        ids = placement.draw(2)
+        np.random.seed(3)
+        district = np.random.randint(3)
+        np.testing.assert_array_equal(ids, np.random.choice(np.where(np.array(g.vs['district']) == district)[0],
+                                                            replace=False, size=2))
+
+    def test_zealot_placement_degree(self):
+        g = ig.Graph.Star(5)
+        placement = zealot_placement(g, degree_driven=True)
+        np.testing.assert_allclose(placement.probabilities, [0.5, 0.125, 0.125, 0.125, 0.125])
+        self.assertIn(0, placement.draw(4))
+
+    def test_reset_network(self):
+        g = ig.Graph(30)
+        g.vs['district'] = [0] * 10 + [1] * 20
+        g.vs['state'] = 'c'
+        g.vs['zealot'] = 1
+        placement = zealot_placement(g, one_district=True, district=0)
+        g = reset_network(g, 4, 'a', placement, all_states=['b', 'c'])
+        self.assertDictEqual(Counter(g.vs[0:10]['zealot']), {1: 4, 0: 6})
+        self.assertDictEqual(Counter(g.vs['zealot']), {1: 4, 0: 26})
+        self.assertListEqual([s for s, z in zip(g.vs['state'], g.vs['zealot']) if z], ['a'] * 4)
+        self.assertSetEqual(set(s for s, z in zip(g.vs['state'], g.vs['zealot']) if not z), {'b', 'c'})
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+
+from net_generation.calibration import district_pairs, distance_bins, link_distance_histogram, fit_planar_c
+from net_generation.calibration import read_commuting_data, write_planar_c, commuting_data
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.coordinates = np.array([[0.0, 0.0], [3.0, 4.0], [0.0, 12.0], [30.0, 40.0]])
+        self.sizes = [100, 200, 50, 300]
+        self.edges = np.array([0, 1, 10, 20, 100])
+
+    def test_district_pairs(self):
+        distances, pairs = district_pairs(self.coordinates[:2], [3, 4], euclidean=True)
+        np.testing.assert_array_almost_equal(distances, [0.0, 5.0, 0.0])
+        np.testing.assert_array_almost_equal(pairs, [3.0, 12.0, 6.0])
+
+    def test_distance_bins(self):
+        res = distance_bins(np.array([0.0, 1.0, 1.5, 10.0, 19.0, 20.5, 500.0]), self.edges)
+        np.testing.assert_array_equal(res, [0, 0, 1, 1, 2, 3, 3])
+
+    def test_link_distance_histogram(self):
+        distances, pairs = district_pairs(self.coordinates, self.sizes, euclidean=True)
+        bins = distance_bins(distances, self.edges)
+        histogram, gradient = link_distance_histogram(2.0, distances, pairs, bins, 4, gradient=True)
+        self.assertAlmostEqual(histogram.sum(), 1.0)
+        step = 1e-6
+        numerical = (link_distance_histogram(2.0 + step, distances, pairs, bins, 4) -
+                     link_distance_histogram(2.0 - step, distances, pairs, bins, 4)) / (2 * step)
+        np.testing.assert_array_almost_equal(gradient, numerical)
+
+    def test_fit_planar_c_recovers_the_model(self):
+        distances, pairs = district_pairs(self.coordinates, self.sizes, euclidean=True)
+        histogram = link_distance_histogram(7.5, distances, pairs, distance_bins(distances, self.edges), 4)
+        data = np.array([self.edges, np.concatenate([[0.0], histogram])])
+        res = fit_planar_c(self.coordinates, self.sizes, data, euclidean=True)
+        self.assertAlmostEqual(res['planar_c'], 7.5, places=3)
+        self.assertAlmostEqual(res['r_squared'], 1.0)
+
+    def test_read_commuting_data(self):
+        self.assertIs(read_commuting_data('Israel'), commuting_data['israel'])
+        with tempfile.TemporaryDirectory() as directory:
+            fname = os.path.join(directory, 'data.csv')
+            with open(fname, 'w') as out_file:
+                out_file.write('0,0\n5,0.7\n10,0.3\n')
+            np.testing.assert_array_almost_equal(read_commuting_data(fname), [[0, 5, 10], [0.0, 0.7, 0.3]])
+
+    def test_write_planar_c(self):
+        with tempfile.TemporaryDirectory() as directory:
+            fname = os.path.join(directory, 'config.json')
+            with open(fname, 'w') as out_file:
+                out_file.write('{\n  "q": 2,\n  "planar_c": 1.5,\n  "n": 10\n}')
+            write_planar_c(fname, 3.14159)
+            with open(fname, 'r') as in_file:
+                self.assertEqual(in_file.read(), '{\n  "q": 2,\n  "planar_c": 3.1416,\n  "n": 10\n}')
+
+            with open(fname, 'w') as out_file:
+                out_file.write('{"q": 2}')
+            write_planar_c(fname, 2.0)
+            with open(fname, 'r') as in_file:
+                self.assertDictEqual(json.load(in_file), {'q': 2, 'planar_c': 2.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+import numpy as np
+import igraph as ig
+
+from net_generation.base import init_graph
+from net_generation.diagnostics import graph_diagnostics, district_link_matrix, district_degree_statistics
+from net_generation.diagnostics import expected_link_matrix, expected_degree_statistics, expected_diagnostics
+
+
+class TestDiagnostics(unittest.TestCase):
+
+    def setUp(self):
+        # districts: 0 - nodes 0, 1, 2; 1 - nodes 3, 4; 2 - node 5
+        self.graph = ig.Graph(6, [(0, 1), (1, 2), (0, 2), (2, 3), (3, 4), (4, 0), (5, 3)])
+        self.graph.vs['district'] = [0, 0, 0, 1, 1, 2]
+
+    def test_district_link_matrix(self):
+        sources = np.array([0, 1, 0, 2, 3, 4, 5])
+        targets = np.array([1, 2, 2, 3, 4, 0, 3])
+        districts = np.array([0, 0, 0, 1, 1, 2])
+        res = district_link_matrix(sources, targets, districts, 3)
+        np.testing.assert_array_equal(res, [[3, 2, 0], [2, 1, 1], [0, 1, 0]])
+
+    def test_district_degree_statistics(self):
+        res = district_degree_statistics(np.array([1, 2, 3, 4, 4, 2]), np.array([0, 0, 0, 1, 1, 1]), 3)
+        np.testing.assert_array_equal(res['nodes'], [3, 3, 0])
+        np.testing.assert_array_almost_equal(res['mean'][:2], [2.0, 10 / 3])
+        np.testing.assert_array_almost_equal(res['std'][:2], [np.std([1, 2, 3]), np.std([4, 4, 2])])
+        np.testing.assert_array_equal(res['min'][:2], [1, 2])
+        np.testing.assert_array_equal(res['max'][:2], [3, 4])
+        self.assertTrue(np.isnan(res['mean'][2]))
+        self.assertTrue(np.isnan(res['max'][2]))
+
+    def test_graph_diagnostics(self):
+        res = graph_diagnostics(self.graph)
+        np.testing.assert_array_equal(res['link_matrix'], [[3, 2, 0], [2, 1, 1], [0, 1, 0]])
+        np.testing.assert_array_equal(res['degrees']['nodes'], [3, 2, 1])
+        np.testing.assert_array_almost_equal(res['degrees']['mean'], [8 / 3, 2.5, 1.0])
+        self.assertEqual(res['inter_links'], 3)
+        self.assertEqual(res['intra_links'], 4)
+        self.assertAlmostEqual(res['inter_fraction'], 3 / 7)
+        self.assertAlmostEqual(res['inter_intra_ratio'], 3 / 4)
+
+    def test_graph_diagnostics_same_as_edge_loop(self):
+        graph = init_graph(1000, [300, 300, 400], 12.0, ratio=0.1, all_states=['a', 'b'])
+        res = graph_diagnostics(graph, q=3)
+        between = sum(graph.vs[s]['district'] != graph.vs[t]['district'] for s, t in graph.get_edgelist())
+        self.assertEqual(res['inter_links'], between)
+        self.assertEqual(res['link_matrix'].sum() - res['inter_links'], graph.ecount())
+        np.testing.assert_array_equal(res['degrees']['nodes'], [300, 300, 400])
+        self.assertAlmostEqual(np.sum(res['degrees']['mean'] * res['degrees']['nodes']), 2 * graph.ecount())
+
+
+class TestExpectedDiagnostics(unittest.TestCase):
+
+    def test_expected_link_matrix(self):
+        affinity = np.array([[0.5, 0.1], [0.1, 1.0]])
+        res = expected_link_matrix(affinity, [4, 2])
+        np.testing.assert_array_almost_equal(res, [[3.0, 0.8], [0.8, 1.0]])
+
+    def test_expected_degree_statistics(self):
+        affinity = np.array([[0.5, 0.1], [0.1, 1.0]])
+        res = expected_degree_statistics(affinity, [4, 2])
+        np.testing.assert_array_equal(res['nodes'], [4, 2])
+        np.testing.assert_array_almost_equal(res['mean'], [0.5 * 3 + 0.1 * 2, 0.1 * 4 + 1.0])
+        np.testing.assert_array_almost_equal(res['std'], np.sqrt([0.25 * 3 + 0.09 * 2, 0.09 * 4]))
+
+    def test_expected_diagnostics_planted(self):
+        res = expected_diagnostics(1000, [300, 300, 400], 12.0, ratio=0.1)
+        self.assertAlmostEqual(res['links'], res['intra_links'] + res['inter_links'])
+        self.assertAlmostEqual(res['links'], 6000, delta=50)
+        self.assertAlmostEqual(res['inter_fraction'], res['inter_links'] / res['links'])
+        self.assertAlmostEqual(np.sum(res['degrees']['mean'] * res['degrees']['nodes']), 2 * res['links'])
+
+    def test_expected_diagnostics_same_as_generated(self):
+        np.random.seed(5)
+        random.seed(5)
+        block_sizes = [1000, 1500, 2500]
+        coordinates = [[0.0, 0.0], [1.0, 0.0], [0.0, 2.0]]
+        expected = expected_diagnostics(5000, block_sizes, 12.0, block_coords=coordinates, planar_const=1.0,
+                                        euclidean=True)
+        graph = init_graph(5000, block_sizes, 12.0, block_coords=coordinates, planar_const=1.0, euclidean=True,
+                           all_states=['a', 'b'])
+        res = graph_diagnostics(graph, q=3)
+        # the number of links is a sum of many binomial variables, standard deviations are below 1%
+        self.assertAlmostEqual(graph.ecount() / expected['links'], 1.0, delta=0.05)
+        np.testing.assert_allclose(res['link_matrix'], expected['link_matrix'], rtol=0.1)
+        np.testing.assert_allclose(res['degrees']['mean'], expected['degrees']['mean'], rtol=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+import tempfile
+from unittest import mock
+import numpy as np
+import igraph as ig
+
+from net_generation.diagnostics import expected_link_matrix
+from net_generation.base import affinity_matrix
+from net_generation.storage import MappedGraph, block_pair_edges, generate_mapped_graph, init_mapped_graph
+from net_generation.storage import init_mapped_states, add_mapped_zealots, save_mapped_graph
+from net_generation.storage import mapped_zealot_placement
+
+
+class TestStorage(unittest.TestCase):
+
+    def test_block_pair_edges(self):
+        first, second = block_pair_edges(30, 40, 0.1, 5)
+        again = block_pair_edges(30, 40, 0.1, 5)
+        np.testing.assert_array_equal(first, again[0])
+        np.testing.assert_array_equal(second, again[1])
+        self.assertEqual(len(set(zip(first.tolist(), second.tolist()))), len(first))
+        self.assertTrue(np.all(first < 30) and np.all(second < 40))
+
+    def test_block_pair_edges_same(self):
+        first, second = block_pair_edges(10, 10, 1.0, 3, same=True)
+        self.assertEqual(len(first), 45)
+        self.assertTrue(np.all(first < second))
+        self.assertEqual(len(block_pair_edges(1, 1, 1.0, 3, same=True)[0]), 0)
+
+    def test_generate_mapped_graph(self):
+        np.random.seed(1)
+        sizes = [300, 200, 100]
+        with tempfile.TemporaryDirectory() as path:
+            generate_mapped_graph(path, 600, sizes, 10, ratio=0.1)
+            g = MappedGraph(path, 2)
+            indptr, indices, districts = np.array(g.indptr), np.array(g.indices), np.array(g.districts)
+            np.testing.assert_array_equal(districts, np.repeat([0, 1, 2], sizes))
+            sources = np.repeat(np.arange(600), np.diff(indptr))
+            # undirected, without loops and multiple edges
+            self.assertEqual(set(zip(sources.tolist(), indices.tolist())),
+                             set(zip(indices.tolist(), sources.tolist())))
+            self.assertEqual(len(set(zip(sources.tolist(), indices.tolist()))), len(indices))
+            self.assertFalse(np.any(sources == indices))
+            # every link inside a district is counted twice, once for each of its nodes
+            links = np.zeros((3, 3))
+            np.add.at(links, (districts[sources], districts[indices]), 1)
+            links[np.diag_indices(3)] /= 2
+            expected = expected_link_matrix(affinity_matrix(600, sizes, 10, ratio=0.1), sizes)
+            np.testing.assert_allclose(links, expected, rtol=0.2, atol=10)
+            g.close()
+            self.assertTrue(os.path.exists(path))
+
+    def test_save_mapped_graph(self):
+        graph = ig.Graph(4, [(0, 1), (1, 2), (2, 3)])
+        graph.vs['district'] = [0, 0, 1, 1]
+        with tempfile.TemporaryDirectory() as path:
+            save_mapped_graph(graph, path)
+            g = MappedGraph(path, 3)
+            self.assertEqual((g.n, g.q), (4, 2))
+            np.testing.assert_array_equal(g.degree(), [1, 2, 2, 1])
+            self.assertListEqual(sorted(g.indices[g.indptr[2]:g.indptr[3]].tolist()), [1, 3])
+            np.testing.assert_array_equal(g.tally(), [[2, 0, 0], [2, 0, 0]])
+
+    def test_init_mapped_graph_error(self):
+        # the files of a temporary network are removed when the generation fails
+        paths = []
+
+        def generate(path, *args, **kwargs):
+            paths.append(path)
+            open(os.path.join(path, 'indptr.bin'), 'wb').close()
+            raise MemoryError
+
+        with mock.patch('net_generation.storage.generate_mapped_graph', side_effect=generate):
+            self.assertRaises(MemoryError, init_mapped_graph, 100, [50, 50], 4, ratio=0.1, all_states=['a', 'b'])
+        self.assertFalse(os.path.exists(paths[0]))
+
+    def test_init_mapped_graph(self):
+        g = init_mapped_graph(100, [50, 50], 4, ratio=0.1, consensus=True, initial_state='b', all_states=['a', 'b'])
+        self.assertTrue(np.all(g.states == 1))
+        add_mapped_zealots(g, 10, 'a', ['a', 'b'], one_district=True, district=1)
+        self.assertEqual(int(np.sum(g.zealots[50:])), 10)
+        np.testing.assert_array_equal(g.tally(), [[0, 50], [10, 40]])
+        np.testing.assert_array_equal(g.tally(chunk=7), [[0, 50], [10, 40]])
+        init_mapped_states(g, all_states=['a', 'b'])
+        self.assertFalse(np.any(g.zealots))
+        add_mapped_zealots(g, 10, 'a', ['a', 'b'], degree_driven=True)
+        add_mapped_zealots(g, 5, 'a', ['a', 'b'])
+        self.assertTrue(10 <= np.sum(g.zealots) <= 15)
+        init_mapped_states(g, all_states=['a', 'b'])
+        placement = mapped_zealot_placement(g, one_district=True, district=0)
+        add_mapped_zealots(g, 10, 'a', ['a', 'b'], placement=placement)
+        self.assertEqual(int(np.sum(g.zealots[:50])), 10)
+        self.assertTrue(np.all(g.states[g.zealots] == 0))
+        g['sweep'] = 1
+        self.assertListEqual(g.attributes(), ['sweep'])
+        g.close()
+        self.assertFalse(os.path.exists(g.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,7 +17,8 @@ sys.path.insert(0, parentdir)
 
 from configuration.parser import get_arguments
 from configuration.logging import log
-from tools import run_with_time, compute_edge_ratio
+from tools import run_with_time
+from net_generation.diagnostics import log_graph_diagnostics
 from plotting import plot_traj, plot_network
 from net_generation.base import init_graph, add_zealots
 from simulation.base import run_simulation, run_thermalization
@@ -39,9 +40,7 @@ def make_animation(config):
                        initial_state=config.not_zealot_state, all_states=config.all_states)
     graph = add_zealots(graph, config.n_zealots, config.zealot_state, **config.zealots_config)
 
-    link_fraction, link_ratio = compute_edge_ratio(graph)
-    log.info(f'There is {str(round(100.0 * link_fraction, 1))}% of inter-district connections')
-    log.info(f'Ratio of inter- to intra-district links is equal {str(round(link_ratio, 3))}')
+    log_graph_diagnostics(graph, q=config.q)
 
     # save the layout to use the same one in each frame
     ll = graph.layout()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+A script converting results files between the formats: the binary record stream (.bin), JSON Lines (.jsonl),
+the columnar .npz format, and the legacy .json format. The format of each file is recognized by its extension,
+the converted file is saved next to it. By default .npz files are converted to .json and other files to .npz.
+Usage:
+$ python3 convert_results.py results/results<suffix>.bin [results/results<other_suffix>.json ...] [--to json]
+"""
+import os
+import sys
+import inspect
+import argparse
+
+# path hack for imports to work when running this script from any location,
+# without the hack one has to manually edit PYTHONPATH every time
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from configuration.logging import log
+from tools import convert_results, result_extensions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts results files between formats.')
+    parser.add_argument('files', nargs='+', help='results files to convert')
+    parser.add_argument('--to', choices=result_extensions.keys(), default=None, dest='result_format',
+                        help='the target format')
+    args = parser.parse_args()
+    for fname in args.files:
+        log.info(f'Converted {fname} into {convert_results(fname, args.result_format)}')
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+A script evaluating electoral systems on tallies of votes saved by main.py run with the --save_tallies option.
+The opinion dynamics is not simulated again, so any set of electoral systems (e.g. new alternative systems
+in a configuration file) can be evaluated in seconds on the same samples. The configuration must have
+the same number of districts and parties as the simulation that produced the tallies.
+Usage:
+$ python3 evaluate_tallies.py <path_to_the_tallies_file> --config_file <path_to_the_file>/config.json
+Results are saved as results/results<suffix>_evaluated.bin (or another format) and can be read with tools.read_data().
+"""
+import os
+import sys
+import inspect
+
+# path hack for imports to work when running this script from any location,
+# without the hack one has to manually edit PYTHONPATH every time
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from configuration.parser import get_arguments
+from configuration.logging import log
+from electoral_sys.batch_evaluation import evaluate_tallies
+from tools import read_tallies, save_data, run_with_time
+
+
+@run_with_time
+def main(tallies_file, config):
+    """
+    Evaluates all electoral systems from the configuration on the saved tallies and saves the results.
+    :param tallies_file: the path to a file saved by tools.TallyWriter (or an .npz file of earlier versions)
+    :param config: Config class from configuration module
+    :return: None
+    """
+    tallies, states, settings = read_tallies(tallies_file)
+    log.info(f'Evaluating {len(config.voting_systems)} electoral systems on {len(tallies)} samples '
+             f'from {tallies_file}')
+
+    if tallies.shape[1:] != (config.q, config.num_parties):
+        raise ValueError(f'The tallies have {tallies.shape[1]} districts and {tallies.shape[2]} parties, but the '
+                         f'configuration has {config.q} districts and {config.num_parties} parties.')
+
+    results = evaluate_tallies(tallies, config, states=states)
+    save_data(config, results, config.suffix + '_evaluated')
+
+
+if __name__ == '__main__':
+    # the path to the tallies is not an argument of the simulation parser, so it's taken out before parsing
+    if len(sys.argv) < 2 or sys.argv[1].startswith('-'):
+        raise ValueError('The path to the tallies file must be provided as the first argument.')
+    tallies_path = os.path.abspath(sys.argv.pop(1))
+    os.chdir(parentdir)
+    main(tallies_path, get_arguments())
@@ -1,85 +1,89 @@
 # -*- coding: utf-8 -*-
 """
-A script fitting the planar_c parameter of the main simulation to commuting data.
-The data must be provided as in the examples below in an array, where the first row
-contains commuting distances in km, and the second row provides a fraction of people
-commuting up to the distance given on the same position in the first row, but more
-than the previous distance. The second row must add up to 1.
+A script fitting the planar_c parameter of the main simulation to commuting data. For every pair of
+a configuration file (with 'district_sizes' and 'district_coords') and commuting data, the expected histogram
+of link distances is computed from the districts (see net_generation/calibration.py) and planar_c is fitted
+to the data. Many countries are fitted in parallel, and with --write the fitted values are saved
+in the configuration files. Commuting data is either the name of a country with the data included
+in net_generation/calibration.py (israel, india, poland), or a csv file with two columns: the distance in km
+and the fraction of people commuting up to this distance but more than the previous one, starting with 0,0.
+Usage:
+$ python3 fit_planar_c.py --fit configuration/config_files/il_knesset.json israel
+                          --fit configuration/config_files/pl_sejm.json poland [--write] [--plot]
 """
+import os
+import sys
+import inspect
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.optimize import minimize
+from multiprocessing import Pool
 
+# path hack for imports to work when running this script from any location,
+# without the hack one has to manually edit PYTHONPATH every time
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
 
-Israel = np.array([[0, 5, 10, 20, 40, 80],
-                   [0.0, 0.505, 0.143, 0.165, 0.121, 0.066]])
-India = np.array([[0, 1, 5, 10, 20, 30, 50, 100],
-                  [0.0, 0.2391093895, 0.3345624697, 0.2001085192, 0.09743021074, 0.05492006168, 0.03557149438,
-                   0.03829785485]])
-Poland = np.array([[0, 5, 10, 15, 20, 30, 40, 60, 80, 100, 630],
-                   [0.0, 0.7315281676792722, 0.04877240795194137, 0.06853774559525151, 0.044917292501255084,
-                    0.037084754908489836, 0.016260173013807635, 0.01888197596385357, 0.008741833413590428,
-                    0.0048085953642135314, 0.02046705360832488]])
+from configuration.logging import log
+from net_generation.calibration import calibrate_config, write_planar_c
 
-# country for which the optimisation should be made
-data = Israel  # Israel, India, Poland
 
-
-def affinity_integral(x, c):
+def calibrate(args):
     """
-    Returns normalised integral (antiderivative) of the affinity matrix probabilities as a function of distance.
-    :param x: distance (float)
-    :param c: constant in the function describing link probability for planar graph generator (float)
-    :return: antiderivative of the affinity matrix probabilities (float)
+    :param args: a tuple with the configuration file and the source of commuting data
+    :return: the dict returned by calibrate_config()
     """
-    # return -c**3.0 / (x + c)**3.0
-    # return -c**2.0 / (x + c)**2.0
-    return -c / (x + c)
+    return calibrate_config(*args)
 
 
-def objective_function(c, data):
+def plot_fit(fit, output_dir='plots/'):
     """
-    Computes the average square difference between the data and affinity prediction.
-    :param c: constant in the function describing link probability for planar graph generator (float)
-    :param data: distance -- first row -- and percentage of population -- second row (np.array)
-    :return: mean square error between data and affinity prediction (float)
+    Plots the commuting data and the fitted histogram of link distances.
+    :param fit: the dict returned by calibrate_config()
+    :param output_dir: directory where the plot is saved
+    :return: None
     """
-    affinity = affinity_integral(data[0, 1:], c) - affinity_integral(data[0, :-1], c)
-    objective = np.mean((affinity - data[1, 1:])**2.0)
-    return objective
-
-
-if __name__ == '__main__':
-    c0 = 0.1
-    limits = ([0.0, None], )
-    res = minimize(objective_function, x0=c0, args=(data, ), bounds=limits)
-
-    heights = data[1, 1:] / data[1, 1:].sum()
-    heights_approx = affinity_integral(data[0, 1:], res.x[0]) - affinity_integral(data[0, :-1], res.x[0])
-    r_sqr = 1.0 - (np.sum((heights - heights_approx) ** 2.0) / np.sum((heights - np.mean(heights)) ** 2.0))
-
-    print("Mean squared error: ", np.round(objective_function(res.x[0], data), 4))
-    print("Pseudo R^2:         ", np.round(r_sqr, 4))
-    print("Optimal parameter:  ", np.round(res.x[0], 4))
-
-    # Plotting original data and fit
-    x = data[0, :-1]
-    widths = data[0, 1:-1] - data[0, :-2]
-    widths = np.append(widths, widths[-1])
-
-    z = np.linspace(0.0, data[0, -2] + widths[-1], 300)
-    y = res.x[0] / (z + res.x[0])**2.0
-    
-    plt.bar(x, height=heights, width=widths, align="edge", alpha=0.5, label="data")
-    plt.bar(x, height=heights_approx, width=widths, align="edge", alpha=0.5, label="optimal probabilities")
-
+    edges = fit['edges']
+    x = edges[:-1]
+    widths = np.diff(edges)
+
+    plt.figure()
+    plt.bar(x, height=fit['data'], width=widths, align='edge', alpha=0.5, label='data')
+    plt.bar(x, height=fit['histogram'], width=widths, align='edge', alpha=0.5,
+            label=f"expected links, planar_c = {round(fit['planar_c'], 4)}")
     for _x in x[1:]:
         plt.axvline(_x, color='white', linewidth=1.4)
-    plt.plot(z, y, "r--", label="optimal affinity function")
-
-    plt.ylabel("Probability")
-    plt.ylabel("Distance (km)")
-    plt.xlim(0.0, data[0, -2] + widths[-1])
+    plt.ylabel('Fraction')
+    plt.xlabel('Distance (km)')
+    plt.xlim(0.0, edges[-1])
     plt.legend()
+    name = os.path.basename(fit['config_file']).replace('.json', '')
+    plt.savefig(f'{output_dir}fit_planar_c_{name}.png')
+    plt.close()
+
 
-    plt.show()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fits planar_c to commuting data.')
+    parser.add_argument('--fit', nargs=2, action='append', required=True, metavar=('CONFIG_FILE', 'DATA'),
+                        dest='fits', help='a configuration file and commuting data (a country or a csv file)')
+    parser.add_argument('--write', action='store_const', default=False, const=True, dest='write',
+                        help='write the fitted values into the configuration files')
+    parser.add_argument('--plot', action='store_const', default=False, const=True, dest='plot',
+                        help='plot the data and the fitted histograms in plots/')
+    parser.add_argument('--processes', type=int, default=None, dest='processes',
+                        help='the number of processes fitting in parallel (all cores by default)')
+    args = parser.parse_args()
+
+    with Pool(min(args.processes or os.cpu_count(), len(args.fits))) as pool:
+        fits = pool.map(calibrate, [tuple(fit) for fit in args.fits])
+
+    for fit in fits:
+        log.info(f"{fit['config_file']}: planar_c = {round(fit['planar_c'], 4)}, "
+                 f"mean squared error {round(fit['mse'], 6)}, pseudo R^2 {round(fit['r_squared'], 4)}")
+        if args.write:
+            write_planar_c(fit['config_file'], fit['planar_c'])
+            log.info(f"planar_c written into {fit['config_file']}")
+        if args.plot:
+            os.makedirs(os.path.join(parentdir, 'plots'), exist_ok=True)
+            plot_fit(fit, output_dir=os.path.join(parentdir, 'plots', ''))
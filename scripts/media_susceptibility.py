@@ -6,7 +6,6 @@ mass media susceptibility and related quantities.
 """
 import os
 import sys
-import json
 import inspect
 import numpy as np
 
@@ -17,7 +16,7 @@ parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 
 from configuration.parser import get_arguments
-from tools import convert_to_distributions, split_suffix
+from tools import read_distribution, split_suffix
 from plotting import plot_mean_std, plot_heatmap, plot_std, plot_mean_per, plot_mean_diff, plot_mean_std_all
 
 # parameters of simulations not present in the config module
@@ -50,11 +49,8 @@ def plot_media_susceptibility(config):
         influence = str(influence).replace('.', '')
         influence_string = f'_media_{influence}'
         s = suffix.format(valuetoinsert=influence_string)
-        loc = f'results/results{s}.json'
-        with open(loc) as json_file:
-            data = json.load(json_file)
         for system in config.voting_systems.keys():
-            distribution = convert_to_distributions(data['results'][system])[media_state]
+            distribution = read_distribution(s, system, media_state)
             dist_mean = np.mean(distribution)
             dist_std = np.std(distribution)
             results[system]['mean_set'][i] = dist_mean
@@ -5,7 +5,6 @@ and changing number of zealots and mass media influence,
 to then compute and plot comparision between them.
 """
 import numpy as np
-import json
 import os
 import sys
 import inspect
@@ -18,7 +17,7 @@ parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 
 from configuration.parser import get_arguments
-from tools import convert_to_distributions
+from tools import read_distribution
 
 # parameters of simulations not present in the config module
 zn_set = np.arange(61)  # range of considered number of zealots
@@ -91,11 +90,8 @@ def plot_media_vs_zealots(config):
             influence_string = f'_media_{influence}'
             zn_string = f'_zn_{zn}'
             s = suffix.format(zn_value=zn_string, media_value=influence_string)
-            loc = f'results/results{s}.json'
-            with open(loc) as json_file:
-                data = json.load(json_file)
             for system in config.voting_systems.keys():
-                distribution = convert_to_distributions(data['results'][system])[shown_state]
+                distribution = read_distribution(s, system, shown_state)
                 dist_mean = np.mean(distribution)
                 dist_std = np.std(distribution)
                 results[system]['mean'][i, j] = dist_mean
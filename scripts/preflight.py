@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+A script estimating, before running a simulation, the network it would generate (the expected number of links,
+the fraction of links between districts, the ratio of inter- to intra-district links, the average degree
+per district), the memory it needs and its runtime, computed from the configuration alone in a fraction
+of a second. For planar networks (with the coordinates of districts) the expected fraction of links between
+districts is also given for a range of values of planar_c, which helps to tune it.
+The expected matrix of links between districts is saved in results/expected_links<suffix>.csv.
+With --relaxation propose the network is generated, and therm_time and mc_steps are proposed from its spectrum
+(see simulation/relaxation.py).
+Usage (the same arguments as for main.py):
+$ python3 preflight.py --config_file <path_to_the_file>/config.json [--relaxation propose]
+"""
+import os
+import sys
+import inspect
+import numpy as np
+
+# path hack for imports to work when running this script from any location,
+# without the hack one has to manually edit PYTHONPATH every time
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from configuration.parser import get_arguments
+from configuration.logging import log
+from instrumentation import estimate_simulation, log_simulation_estimate
+from net_generation.diagnostics import expected_diagnostics
+from net_generation.base import init_graph, add_zealots
+from simulation.relaxation import estimate_relaxation, log_relaxation_estimate
+
+# values of planar_c for which the fraction of links between districts is given
+planar_c_values = [0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0]
+
+
+if __name__ == '__main__':
+    os.chdir(parentdir)
+    config = get_arguments()
+
+    estimate = estimate_simulation(config)
+    log_simulation_estimate(estimate)
+
+    os.makedirs('results', exist_ok=True)
+    fname = 'results/expected_links' + config.suffix + '.csv'
+    np.savetxt(fname, estimate['network']['link_matrix'], delimiter=',', fmt='%.6g')
+    log.info(f'Expected matrix of links between districts saved in {fname}')
+
+    if config.district_coords is not None:
+        for planar_c in planar_c_values:
+            network = expected_diagnostics(config.n, config.district_sizes, config.avg_deg,
+                                           block_coords=config.district_coords, planar_const=planar_c,
+                                           euclidean=config.euclidean)
+            log.info(f"planar_c = {planar_c}: {round(100.0 * network['inter_fraction'], 2)}% of links "
+                     f"between districts")
+
+    if config.relaxation != 'off':
+        g = init_graph(config.n, config.district_sizes, config.avg_deg, block_coords=config.district_coords,
+                       ratio=config.ratio, planar_const=config.planar_c, euclidean=config.euclidean,
+                       state_generator=config.initialize_states, random_dist=config.random_dist,
+                       initial_state=config.not_zealot_state, all_states=config.all_states)
+        g = add_zealots(g, config.n_zealots, config.zealot_state, **config.zealots_config)
+        log_relaxation_estimate(estimate_relaxation(g, config.epsilon, n=config.n), config.therm_time, config.mc_steps)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+A script following the progress of many simulations, e.g. of a sweep with several main.py processes
+running in parallel. Every simulation writes its progress in results/progress<suffix>.json, the script
+aggregates them: runs finished, running and stale (no update for a long time, e.g. killed), samples done,
+the total speed in steps per second, the ETA of the running simulations, and the memory they use.
+Usage:
+$ python3 progress.py [--pattern 'results/progress*.json'] [--watch 60] [--stale 600]
+"""
+import os
+import sys
+import time
+import inspect
+import argparse
+
+# path hack for imports to work when running this script from any location,
+# without the hack one has to manually edit PYTHONPATH every time
+currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parentdir = os.path.dirname(currentdir)
+sys.path.insert(0, parentdir)
+
+from instrumentation import log_aggregated_progress
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregates the progress of simulations running in parallel.')
+    parser.add_argument('--pattern', type=str, default=os.path.join(parentdir, 'results', 'progress*.json'),
+                        dest='pattern', help='a glob pattern of the progress files')
+    parser.add_argument('--watch', type=float, default=0, dest='watch',
+                        help='report every given number of seconds until all simulations finish, 0 reports once')
+    parser.add_argument('--stale', type=float, default=600, dest='stale_after',
+                        help='the number of seconds without updates after which a simulation is considered stale')
+    args = parser.parse_args()
+
+    progress = log_aggregated_progress(args.pattern, args.stale_after)
+    while args.watch and progress['running']:
+        time.sleep(args.watch)
+        progress = log_aggregated_progress(args.pattern, args.stale_after)
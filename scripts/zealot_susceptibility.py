@@ -6,7 +6,6 @@ zealot susceptibility and related quantities.
 """
 import os
 import sys
-import json
 import inspect
 import numpy as np
 
@@ -17,7 +16,7 @@ parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 
 from configuration.parser import get_arguments
-from tools import convert_to_distributions, split_suffix
+from tools import read_distribution, split_suffix
 from plotting import plot_mean_std, plot_heatmap, plot_std, plot_mean_per, plot_mean_diff, plot_mean_std_all
 
 # parameters of simulations not present in the config module
@@ -48,11 +47,8 @@ def plot_zealot_susceptibility(config):
     for i, zn in enumerate(zn_set):
         zn_string = f'_zn_{zn}'
         s = suffix.format(valuetoinsert=zn_string)
-        loc = f'results/results{s}.json'
-        with open(loc) as json_file:
-            data = json.load(json_file)
         for system in config.voting_systems.keys():
-            distribution = convert_to_distributions(data['results'][system])[str(config.zealot_state)]
+            distribution = read_distribution(s, system, str(config.zealot_state))
             dist_mean = np.mean(distribution)
             dist_std = np.std(distribution)
             results[system]['mean_set'][i] = dist_mean
@@ -117,7 +117,7 @@ def run_simulation(config, g, noise_rate, steps, n=None):
 #                                                         #
 ###########################################################
 
-def run_thermalization(config, g, noise_rate, therm_time, each=1000, n=None):
+def run_thermalization(config, g, noise_rate, therm_time, each=1000, n=None, progress=None, simulate=None):
     """
     A function running the simulation for a given number of steps
     and computing the trajectory.
@@ -127,15 +127,21 @@ def run_thermalization(config, g, noise_rate, therm_time, each=1000, n=None):
     :param therm_time: the number of steps to perform in thermalization
     :param each: integer, after how many steps to compute the trajectory point
     :param n: the size of the network
+    :param progress: a function called with the number of steps done after every trajectory point (optional)
+    :param simulate: the function running the steps, run_simulation() by default
     :return: the graph object after changes, the trajectory
     """
+    if simulate is None:
+        simulate = run_simulation
     trajectory = {k: [v] for k, v in
                   single_district_voting(g.vs, states=config.all_states, total_seats=config.total_seats,
                                          assignment_func=config.seat_alloc_function)['vote_fractions'].items()}
     big_steps = round(therm_time / each)
 
     for t in range(big_steps):
-        g = run_simulation(config, g, noise_rate, each, n=n)
+        g = simulate(config, g, noise_rate, each, n=n)
+        if progress is not None:
+            progress(each)
         for key, value in single_district_voting(g.vs, states=config.all_states, total_seats=config.total_seats,
                                                  assignment_func=config.seat_alloc_function)['vote_fractions'].items():
             trajectory[key].append(value)
@@ -143,7 +149,7 @@ def run_thermalization(config, g, noise_rate, therm_time, each=1000, n=None):
     return g, trajectory
 
 
-def run_thermalization_simple(config, g, noise_rate, therm_time, n=None):
+def run_thermalization_simple(config, g, noise_rate, therm_time, n=None, progress=None, each=100000, simulate=None):
     """
     A simple version of the function <run_thermalization> that doesn't save the trajectory.
     :param config: a configuration object
@@ -151,7 +157,20 @@ def run_thermalization_simple(config, g, noise_rate, therm_time, n=None):
     :param noise_rate: noise rate parameter of the model
     :param therm_time: the number of steps to perform in thermalization
     :param n: the size of the network
+    :param progress: a function called with the number of steps done after every 'each' steps (optional),
+    without it all steps are run at once
+    :param each: integer, after how many steps to call the progress function
+    :param simulate: the function running the steps, run_simulation() by default
     :return: the graph object after changes
     """
-    g = run_simulation(config, g, noise_rate, therm_time, n=n)
+    if simulate is None:
+        simulate = run_simulation
+    if progress is None:
+        return simulate(config, g, noise_rate, therm_time, n=n)
+
+    # running the steps in chunks doesn't change the dynamics
+    for start in range(0, therm_time, each):
+        steps = min(each, therm_time - start)
+        g = simulate(config, g, noise_rate, steps, n=n)
+        progress(steps)
     return g
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+An alternative update scheme of the simulation: sweeps over the classes of a greedy colouring of the network.
+
+run_simulation() updates one random node at a time. Here the network is coloured once (nodes of the same colour
+share no links), and all nodes of one colour class are updated at once with numpy: every node reads only
+the states of its neighbours, which are in other classes, so updating a class at once is the same as updating
+its nodes one by one in any order, and no update sees a stale neighbour. A sweep updates every colour class
+once, in a random order, so n steps (node updates) are one sweep, as in run_simulation().
+
+It is a distinct update scheme - in a sweep every node is updated exactly once, while in run_simulation()
+the number of updates of a node is random - so the dynamics (e.g. the relaxation time) differs slightly,
+and the stationary distribution is the same only approximately. It supports all propagation mechanisms
+(standard, majority and minority) with the default mutation.
+"""
+import numpy as np
+
+from net_generation.diagnostics import csr_adjacency
+from simulation.dual import mutation_probabilities
+
+
+###########################################################
+#                                                         #
+#                 Colouring of the network                #
+#                                                         #
+###########################################################
+
+def colour_classes(g):
+    """
+    Computes a greedy colouring of the network (see igraph.Graph.vertex_coloring_greedy()).
+    :param g: the igraph graph
+    :return: a list of numpy arrays, the nodes of every colour
+    """
+    colours = np.array(g.vertex_coloring_greedy(), dtype=np.int64)
+    order = np.argsort(colours, kind='stable')
+    bounds = np.cumsum(np.bincount(colours, minlength=int(colours.max(initial=-1)) + 1))
+    return np.split(order, bounds[:-1])
+
+
+def sweep_schedule(g):
+    """
+    Prepares the arrays of the network needed by the sweeps, computed once and kept in the graph attribute 'sweep'
+    together with the position of the current sweep, so consecutive calls of run_colouring_sweeps() continue it.
+    :param g: the igraph graph
+    :return: a dict with 'indptr', 'indices' (the CSR adjacency), 'classes' (see colour_classes()),
+    'order' (the order of classes in the current sweep), 'position' (the current class in the order)
+    and 'offset' (the number of nodes of the current class already updated)
+    """
+    if 'sweep' not in g.attributes():
+        indptr, indices = csr_adjacency(g)
+        classes = colour_classes(g)
+        g['sweep'] = {'indptr': indptr, 'indices': indices, 'classes': classes,
+                      'order': np.random.permutation(len(classes)), 'position': 0, 'offset': 0}
+    return g['sweep']
+
+
+###########################################################
+#                                                         #
+#                Update of a colour class                 #
+#                                                         #
+###########################################################
+
+def neighbour_states(nodes, states, indptr, indices):
+    """
+    :param nodes: numpy array with nodes
+    :param states: numpy array with the index of the state of every node
+    :param indptr: numpy array, the CSR index pointers of the graph
+    :param indices: numpy array, the CSR neighbours of the graph
+    :return: two numpy arrays, the position of the node in nodes and the state of the neighbour for all neighbours
+    """
+    degrees = indptr[nodes + 1] - indptr[nodes]
+    rows = np.repeat(np.arange(len(nodes)), degrees)
+    starts = np.repeat(indptr[nodes] - np.concatenate([[0], np.cumsum(degrees)[:-1]]), degrees)
+    return rows, states[indices[starts + np.arange(len(rows))]]
+
+
+def propagated_states(nodes, states, indptr, indices, num_states, propagation='standard'):
+    """
+    Vectorised version of the propagation mechanisms from simulation.base for nodes sharing no links.
+    :param nodes: numpy array with nodes
+    :param states: numpy array with the index of the state of every node
+    :param indptr: numpy array, the CSR index pointers of the graph
+    :param indices: numpy array, the CSR neighbours of the graph
+    :param num_states: the number of states
+    :param propagation: 'standard' (copying a random neighbour), 'majority' or 'minority'
+    :return: numpy array with the new states of the nodes (nodes without neighbours keep their states)
+    """
+    degrees = indptr[nodes + 1] - indptr[nodes]
+    new = states[nodes].copy()
+    linked = degrees > 0
+    if propagation == 'standard':
+        chosen = indptr[nodes[linked]] + (np.random.random(int(np.sum(linked))) * degrees[linked]).astype(np.int64)
+        new[linked] = states[indices[chosen]]
+        return new
+
+    rows, neighbours = neighbour_states(nodes, states, indptr, indices)
+    counts = np.bincount(rows * num_states + neighbours, minlength=len(nodes) * num_states)
+    counts = counts.reshape(len(nodes), num_states).astype(float)
+    # random fractions break the ties between states with the same count uniformly
+    ties = 0.5 * np.random.random(counts.shape)
+    if propagation == 'majority':
+        chosen = np.argmax(counts + ties, axis=1)
+    else:
+        # only the states present among the neighbours are taken into account
+        chosen = np.argmin(np.where(counts > 0, counts + ties, np.inf), axis=1)
+    new[linked] = chosen[linked]
+    return new
+
+
+def update_class(nodes, states, zealots, indptr, indices, noise_rate, cumulative, propagation='standard'):
+    """
+    Updates all nodes of a colour class at once, as run_simulation() updates a single node.
+    :param nodes: numpy array with nodes sharing no links
+    :param states: numpy array with the index of the state of every node, changed in place
+    :param zealots: numpy boolean array, which nodes are zealots
+    :param indptr: numpy array, the CSR index pointers of the graph
+    :param indices: numpy array, the CSR neighbours of the graph
+    :param noise_rate: noise rate parameter of the model
+    :param cumulative: numpy array with the cumulative probabilities of states drawn by a mutation
+    :param propagation: 'standard', 'majority' or 'minority'
+    :return: None
+    """
+    nodes = nodes[~zealots[nodes]]
+    mutated = np.random.random(len(nodes)) <= noise_rate
+    copying = nodes[~mutated]
+    # neighbours are in other classes, so the new states can be assigned in any order
+    states[copying] = propagated_states(copying, states, indptr, indices, len(cumulative), propagation)
+    drawn = np.searchsorted(cumulative, np.random.random(int(np.sum(mutated))), side='right')
+    states[nodes[mutated]] = np.minimum(drawn, len(cumulative) - 1)
+
+
+###########################################################
+#                                                         #
+#                  The main algorithm                     #
+#                                                         #
+###########################################################
+
+def run_colouring_sweeps(config, g, noise_rate, steps, n=None):
+    """
+    The counterpart of run_simulation() updating colour classes of the network at once, see the module's
+    description. The number of steps is the number of node updates, the last class can be updated partially.
+    :param config: a configuration object
+    :param g: the igraph graph to run simulation on
+    :param noise_rate: noise rate parameter of the model
+    :param steps: the number of steps to perform in the simulation
+    :param n: the size of the network
+    :return: the graph object after changes
+    """
+    schedule = sweep_schedule(g)
+    indptr, indices, classes = schedule['indptr'], schedule['indices'], schedule['classes']
+    state_index = {state: i for i, state in enumerate(config.all_states)}
+    states = np.fromiter((state_index[state] for state in g.vs['state']), dtype=np.int64, count=g.vcount())
+    zealots = np.array(g.vs['zealot'], dtype=bool)
+    cumulative = np.cumsum(mutation_probabilities(len(config.all_states), config.mass_media))
+
+    while steps > 0 and len(states):
+        nodes = classes[schedule['order'][schedule['position']]]
+        end = min(schedule['offset'] + steps, len(nodes))
+        update_class(nodes[schedule['offset']:end], states, zealots, indptr, indices, noise_rate, cumulative,
+                     config.propagation)
+        steps -= end - schedule['offset']
+        schedule['offset'] = end
+        if end == len(nodes):
+            schedule['offset'] = 0
+            schedule['position'] += 1
+            if schedule['position'] == len(classes):
+                schedule['order'] = np.random.permutation(len(classes))
+                schedule['position'] = 0
+
+    g.vs['state'] = np.array(config.all_states, dtype=object)[states].tolist()
+    return g
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Domain decomposition of the simulation across processes, for large networks with the 'standard' propagation.
+
+The districts are divided into groups of similar numbers of nodes, and every worker process owns the nodes
+of one group. A worker keeps the states of its nodes and of their neighbours owned by other workers (ghosts),
+and runs the random-sequential dynamics on its own nodes. The network is placed once in shared memory and
+attached read-only by all workers, only the vector of states (2 bytes per node) is private to a worker, so
+the memory grows with the number of workers by 2n bytes instead of the size of the network.
+The shared memory needs Python 3.8 or newer.
+
+Every sync interval all workers publish the states of their nodes in shared memory, wait for each other,
+and read the current states of their ghosts. Between the synchronisations a node may thus see a slightly
+outdated state of a neighbour from another domain, which is the only approximation, controlled by
+the sync interval (with a single worker the dynamics is exact).
+
+The steps are divided between the workers as in run_simulation(), where every step picks a random node:
+the number of steps of every worker in every interval is drawn from the multinomial distribution.
+At the end of a call every worker counts the votes of its nodes in every district, and the tallies are merged.
+"""
+import os
+import queue
+import threading
+import multiprocessing as mp
+import numpy as np
+
+from net_generation.diagnostics import csr_adjacency, district_labels
+from simulation.dual import mutation_probabilities
+from net_generation.storage import MappedGraph
+from simulation.shared import SharedArrays, attach_arrays
+
+
+###########################################################
+#                                                         #
+#                 Division into domains                   #
+#                                                         #
+###########################################################
+
+def district_groups(districts, workers):
+    """
+    Divides districts into groups with similar numbers of nodes, giving the largest district to the group
+    with the fewest nodes first.
+    :param districts: numpy array with the district of every node
+    :param workers: the number of groups
+    :return: numpy array with the group of every district
+    """
+    sizes = np.bincount(districts)
+    groups = np.zeros(len(sizes), dtype=np.int64)
+    loads = np.zeros(workers, dtype=np.int64)
+    for district in np.argsort(-sizes, kind='stable'):
+        groups[district] = np.argmin(loads)
+        loads[groups[district]] += sizes[district]
+    return groups
+
+
+def domain_ghosts(nodes, indptr, indices, groups, worker):
+    """
+    :param nodes: numpy array with the nodes of a domain
+    :param indptr: numpy array, the CSR index pointers of the graph
+    :param indices: numpy array, the CSR neighbours of the graph
+    :param groups: numpy array with the domain of every node
+    :param worker: the domain of the nodes
+    :return: numpy array with the neighbours of the nodes from other domains (ghosts)
+    """
+    degrees = indptr[nodes + 1] - indptr[nodes]
+    starts = np.repeat(indptr[nodes] - np.concatenate([[0], np.cumsum(degrees)[:-1]]), degrees)
+    neighbours = indices[starts + np.arange(int(np.sum(degrees)))]
+    return np.unique(neighbours[groups[neighbours] != worker])
+
+
+###########################################################
+#                                                         #
+#                    Worker processes                     #
+#                                                         #
+###########################################################
+
+def run_domain_steps(states, zealots, indptr, indices, chosen, noise_rate, cumulative):
+    """
+    Runs the random-sequential dynamics with the standard propagation, updating the given nodes one by one.
+    The arrays are read through memoryviews, whose items are python objects, as fast to read as from lists.
+    :param states: memoryview of the array with the index of the state of every node, changed in place
+    :param zealots: memoryview of the boolean array, which nodes are zealots
+    :param indptr: memoryview of the CSR index pointers of the graph
+    :param indices: memoryview of the CSR neighbours of the graph
+    :param chosen: numpy array with the nodes updated in consecutive steps
+    :param noise_rate: noise rate parameter of the model
+    :param cumulative: numpy array with the cumulative probabilities of states drawn by a mutation
+    :return: None
+    """
+    steps = len(chosen)
+    chosen = chosen.tolist()
+    mutated = (np.random.random(steps) <= noise_rate).tolist()
+    choices = np.random.random(steps).tolist()
+    drawn = np.minimum(np.searchsorted(cumulative, np.random.random(steps), side='right'),
+                       len(cumulative) - 1).tolist()
+    for node, mutation, choice, new_state in zip(chosen, mutated, choices, drawn):
+        if zealots[node]:
+            continue
+        if mutation:
+            states[node] = new_state
+        else:
+            start = indptr[node]
+            degree = indptr[node + 1] - start
+            if degree:
+                states[node] = states[indices[start + int(choice * degree)]]
+
+
+def domain_worker(worker, seed, spec, files, barrier, commands, results):
+    """
+    The main function of a worker process, running the commands sent by DomainWorkers until it gets None.
+    The network is attached read-only from the shared memory, only the vector of states is private.
+    :param worker: the number of the worker
+    :param seed: the seed of the random numbers of the worker
+    :param spec: the spec of the shared arrays of DomainWorkers
+    :param files: a dict {name: (path, dtype, shape)} with arrays of a MappedGraph, mapped read-only
+    :param barrier: multiprocessing.Barrier of all workers
+    :param commands: multiprocessing.Queue with the commands (noise rate, cumulative probabilities of mutation,
+    numpy array with the number of steps in every interval) for this worker
+    :param results: multiprocessing.Queue where the worker puts its number after every command
+    :return: None
+    """
+    np.random.seed(seed)
+    blocks, shared = attach_arrays(spec, writeable=('states', 'tallies'))
+    shared.update({name: np.memmap(path, dtype=dtype, mode='r', shape=shape) for name, (path, dtype, shape)
+                   in files.items()})
+    nodes = np.flatnonzero(shared['groups'] == worker)
+    ghosts = domain_ghosts(nodes, shared['indptr'], shared['indices'], shared['groups'], worker)
+    districts = shared['districts'][nodes].astype(np.int64)
+    num_states = shared['tallies'].shape[2]
+    states = np.empty_like(shared['states'])
+    arrays = [memoryview(array) for array in (states, shared['zealots'], shared['indptr'], shared['indices'])]
+
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        noise_rate, cumulative, intervals = command
+        states[:] = shared['states']
+        for steps in intervals.tolist():
+            if len(nodes):
+                run_domain_steps(*arrays, nodes[np.random.randint(0, len(nodes), steps)], noise_rate, cumulative)
+            # all workers publish their states before anyone reads the ghosts, and read them before the next write
+            shared['states'][nodes] = states[nodes]
+            try:
+                barrier.wait()
+                states[ghosts] = shared['states'][ghosts]
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                # another worker has died, the main process stops all workers
+                break
+        shared['tallies'][worker] = np.bincount(districts * num_states + states[nodes],
+                                                minlength=shared['tallies'][worker].size).reshape(-1, num_states)
+        results.put(worker)
+
+    del arrays, shared
+    for block in blocks:
+        block.close()
+
+
+class DomainWorkers:
+    """
+    Worker processes owning the domains of a network. The network (CSR adjacency, districts, domains and zealots),
+    the states of nodes and tallies are kept in shared memory, see simulation/shared.py. The adjacency
+    and districts of a MappedGraph are not copied, the workers map its files instead.
+    """
+
+    # the number of seconds between checks whether all workers are alive, while waiting for their results
+    poll_interval = 1.0
+
+    def __init__(self, g, q, num_states, processes=None, sync_steps=None):
+        """
+        :param g: the igraph graph with the 'district' attribute of nodes, or MappedGraph
+        :param q: the number of districts
+        :param num_states: the number of states
+        :param processes: the number of worker processes, all cores by default
+        :param sync_steps: the number of steps between synchronisations, n / 10 by default
+        """
+        self.n = g.vcount()
+        if isinstance(g, MappedGraph):
+            districts = np.asarray(g.districts, dtype=np.int64)
+            network = {'indptr': g.indptr, 'indices': g.indices, 'districts': g.districts}
+        else:
+            districts = district_labels(g)
+            indptr, indices = csr_adjacency(g)
+            network = {'indptr': indptr, 'indices': indices, 'districts': districts}
+        # arrays in files are mapped by the workers, the rest is copied to shared memory
+        files = {name: (g.files[name], array.dtype.str, array.shape) for name, array in network.items()
+                 if isinstance(array, np.memmap)}
+        network = {name: array for name, array in network.items() if name not in files}
+        # a district is never divided, so there are no more workers than non-empty districts
+        self.workers = min(processes or os.cpu_count(), int(np.count_nonzero(np.bincount(districts))))
+        self.sync_steps = max(int(sync_steps or self.n // 10), 1)
+
+        groups = district_groups(districts, self.workers).astype(np.int32)[districts]
+        self.sizes = np.bincount(groups, minlength=self.workers)
+        self.shared = SharedArrays({**network, 'groups': groups, 'zealots': np.zeros(self.n, dtype=bool),
+                                    'states': np.zeros(self.n, dtype=np.int16),
+                                    'tallies': np.zeros((self.workers, q, num_states), dtype=np.int64)})
+
+        self.barrier = mp.Barrier(self.workers)
+        self.commands = [mp.Queue() for _ in range(self.workers)]
+        self.results = mp.Queue()
+        self.processes = []
+        for worker in range(self.workers):
+            process = mp.Process(target=domain_worker, daemon=True,
+                                 args=(worker, np.random.randint(2 ** 31), self.shared.spec, files, self.barrier,
+                                       self.commands[worker], self.results))
+            process.start()
+            self.processes.append(process)
+
+    def run(self, states, zealots, noise_rate, probabilities, steps):
+        """
+        Runs the given number of steps on all domains.
+        :param states: numpy array with the index of the state of every node
+        :param zealots: numpy boolean array, which nodes are zealots
+        :param noise_rate: noise rate parameter of the model
+        :param probabilities: numpy array with the probabilities of states drawn by a mutation
+        :param steps: the number of steps
+        :return: numpy array with the index of the state of every node after the steps
+        """
+        self.shared['states'][:] = states
+        self.shared['zealots'][:] = zealots
+        intervals = np.full(steps // self.sync_steps, self.sync_steps, dtype=np.int64)
+        if steps % self.sync_steps:
+            intervals = np.append(intervals, steps % self.sync_steps)
+        # every step picks a random node, so it belongs to a worker with the probability proportional to its size
+        counts = np.array([np.random.multinomial(steps, self.sizes / self.n) for steps in intervals.tolist()],
+                          dtype=np.int64).reshape(len(intervals), self.workers)
+        cumulative = np.cumsum(probabilities)
+        for worker, commands in enumerate(self.commands):
+            commands.put((noise_rate, cumulative, counts[:, worker]))
+        self.wait()
+        return self.shared['states'].astype(np.int64)
+
+    def wait(self):
+        """
+        Waits until all workers finish their commands. If a worker has died (e.g. killed by the system
+        when out of memory), the barrier is broken, so the other workers don't wait for it forever.
+        :return: None
+        """
+        done = 0
+        while done < self.workers:
+            try:
+                self.results.get(timeout=self.poll_interval)
+                done += 1
+            except queue.Empty:
+                dead = [worker for worker, process in enumerate(self.processes) if not process.is_alive()]
+                if dead:
+                    self.barrier.abort()
+                    raise RuntimeError(f"Worker processes {dead} of the domains engine have stopped, exit codes "
+                                       f"{[self.processes[worker].exitcode for worker in dead]}")
+
+    def tally(self):
+        """
+        :return: numpy array with a shape (q, number of states), the merged tallies of all workers after the last run
+        """
+        return self.shared['tallies'].sum(axis=0)
+
+    def close(self):
+        """
+        Stops the workers and releases the shared memory.
+        :return: None
+        """
+        for commands in self.commands:
+            commands.put(None)
+        for process in self.processes:
+            process.join(timeout=10 * self.poll_interval)
+            # a worker which can't finish, e.g. after another one has died, is stopped
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.shared.close()
+
+
+###########################################################
+#                                                         #
+#                  The main algorithm                     #
+#                                                         #
+###########################################################
+
+def run_domains(config, g, noise_rate, steps, n=None):
+    """
+    The counterpart of run_simulation() running the steps on domains of the network in parallel processes,
+    see the module's description. The workers are started at the first call and kept in the graph attribute
+    'domains' until close_domains() is called.
+    :param config: a configuration object
+    :param g: the igraph graph to run simulation on
+    :param noise_rate: noise rate parameter of the model
+    :param steps: the number of steps to perform in the simulation
+    :param n: the size of the network
+    :return: the graph object after changes
+    """
+    if 'domains' not in g.attributes():
+        g['domains'] = DomainWorkers(g, config.q, len(config.all_states), processes=config.processes,
+                                     sync_steps=config.sync_interval * g.vcount())
+    if isinstance(g, MappedGraph):
+        g.states[:] = g['domains'].run(g.states, g.zealots, noise_rate,
+                                       mutation_probabilities(len(config.all_states), config.mass_media), steps)
+        return g
+    state_index = {state: i for i, state in enumerate(config.all_states)}
+    states = np.fromiter((state_index[state] for state in g.vs['state']), dtype=np.int64, count=g.vcount())
+    states = g['domains'].run(states, np.array(g.vs['zealot'], dtype=bool), noise_rate,
+                              mutation_probabilities(len(config.all_states), config.mass_media), steps)
+    g.vs['state'] = np.array(config.all_states, dtype=object)[states].tolist()
+    return g
+
+
+def close_domains(g):
+    """
+    Stops the workers started by run_domains().
+    :param g: the igraph graph
+    :return: None
+    """
+    if 'domains' in g.attributes() and g['domains'] is not None:
+        g['domains'].close()
+        g['domains'] = None
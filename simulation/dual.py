@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Exact sampling from the stationary distribution of the noisy voter model (the 'standard' propagation
+with the default mutation) using its dual process - coalescing random walks running backwards in time.
+
+The state of a node is the state copied from a random neighbour at its last update, or a state drawn
+by the mutation (with probability epsilon), or the zealot state if the node is a zealot. Following
+the history of every node backwards in time gives a random walk on the graph, which is killed when
+it reaches a mutation (the node takes the mutated state) or a zealot (the node takes the zealot state).
+Walks meeting at the same node at the same time share their past, so they coalesce. Every update picks
+a random node, so backwards in time every walk (or group of coalesced walks) moves at the same rate,
+and the next event happens to a walk chosen uniformly at random. Such a sample doesn't depend
+on the initial state, so it needs no thermalization, and consecutive samples are independent.
+
+The walks are simulated in batches: random numbers of a batch of events don't depend on the state,
+and all events not touching a node touched by an earlier event of the batch are applied at once with numpy.
+They commute with the earlier events, which are left for the next batch in the same order, so the result
+is the same as applying the events one by one. A walk with many events in a batch is followed through all of them
+to know the nodes they touch (a walk changes its node only in its own events).
+"""
+import numpy as np
+
+from net_generation.diagnostics import csr_adjacency
+
+
+###########################################################
+#                                                         #
+#               Coalescing random walks                   #
+#                                                         #
+###########################################################
+
+def mutation_probabilities(num_states, mass_media):
+    """
+    :param num_states: the number of states
+    :param mass_media: probability of switching to the first state in a mutation, see simulation.base.default_mutation
+    :return: numpy array with the probabilities of states drawn by a mutation
+    """
+    k = num_states - 1
+    return np.array([mass_media] + [(1.0 - mass_media) / k for _ in range(k)])
+
+
+def first_occurrences(values):
+    """
+    :param values: numpy array
+    :return: numpy boolean array, whether every value is different from all the previous values
+    """
+    first = np.zeros(len(values), dtype=bool)
+    first[np.unique(values, return_index=True)[1]] = True
+    return first
+
+
+def previous_events(walks):
+    """
+    :param walks: numpy array with the walk of every event in a batch
+    :return: two numpy arrays, the number of earlier events of the same walk (the rank of the event),
+    and the index of the previous event of the same walk (-1 for the first one)
+    """
+    order = np.argsort(walks, kind='stable')
+    positions = np.arange(len(walks))
+    first = np.ones(len(walks), dtype=bool)
+    first[1:] = walks[order][1:] != walks[order][:-1]
+    rank, previous = np.empty(len(walks), dtype=np.int64), np.empty(len(walks), dtype=np.int64)
+    rank[order] = positions - np.maximum.accumulate(np.where(first, positions, 0))
+    previous[order] = np.where(first, -1, order[positions - 1])
+    return rank, previous
+
+
+def dual_sample(indptr, indices, zealots, noise_rate, probabilities, zealot_state=0):
+    """
+    Draws an exact sample from the stationary distribution of the noisy voter model with the coalescing
+    random walks (see the module's description).
+    :param indptr: numpy array, the CSR index pointers of the graph, see net_generation.diagnostics.csr_adjacency()
+    :param indices: numpy array, the CSR neighbours of the graph
+    :param zealots: numpy boolean array, which nodes are zealots
+    :param noise_rate: noise rate parameter of the model (must be positive)
+    :param probabilities: numpy array with the probabilities of states drawn by a mutation
+    :param zealot_state: the index of the zealot state
+    :return: numpy array with the index of the state of every node
+    """
+    if noise_rate <= 0:
+        raise ValueError(f'The dual sampler needs a positive noise rate, epsilon={noise_rate} was provided')
+    n = len(indptr) - 1
+    degrees = np.diff(indptr)
+    zealots = np.asarray(zealots, dtype=bool)
+    cumulative = np.cumsum(probabilities)
+
+    # walks are identified by the node they started from; coalesced walks point to the walk they joined
+    walk_at = np.where(zealots, -1, np.arange(n))  # the walk at every node, -1 if there is none
+    position = walk_at.copy()  # the node of every walk, -1 if it was killed or it coalesced
+    parent = np.arange(n)
+    value = np.where(zealots, zealot_state, -1)
+
+    live = np.flatnonzero(~zealots)
+    removed = 0
+    pending = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), np.zeros(0), np.zeros(0, dtype=np.int64))
+    while live.size:
+        # random numbers of events don't depend on the state: the walk, mutation, neighbour, and the mutated state,
+        # events left from the previous batch are counted in the batch, so they don't pile up when few walks are left
+        batch = max(live.size // 4 + 16 - len(pending[0]), 0)
+        drawn = (live[np.random.randint(0, live.size, batch)], np.random.random(batch) <= noise_rate,
+                 np.random.random(batch),
+                 np.minimum(np.searchsorted(cumulative, np.random.random(batch), side='right'), len(cumulative) - 1))
+        walks, mutated, choice, new_state = (np.concatenate([old, new]) for old, new in zip(pending, drawn))
+
+        # events of killed and coalesced walks don't change anything (the walk is chosen among the live ones)
+        alive = position[walks] >= 0
+        walks, mutated, choice, new_state = walks[alive], mutated[alive], choice[alive], new_state[alive]
+        nodes = position[walks]
+        moves = ~mutated & (degrees[nodes] > 0)
+        targets = n + np.arange(len(walks))  # unique values for events which don't move the walk
+
+        def move(events):
+            offsets = (choice[events] * degrees[nodes[events]]).astype(np.int64)
+            targets[events] = indices[indptr[nodes[events]] + offsets]
+
+        # the node of a later event of a walk is the target of its previous event
+        rank, previous = previous_events(walks)
+        move(np.flatnonzero(moves & (rank == 0)))
+        for r in range(1, int(rank.max(initial=0)) + 1):
+            events = np.flatnonzero(rank == r)
+            earlier = previous[events]
+            nodes[events] = np.where(moves[earlier], targets[earlier], nodes[earlier])
+            moves[events] = ~mutated[events] & (degrees[nodes[events]] > 0)
+            move(events[moves[events]])
+
+        # events not touching nodes touched by earlier events of this batch can be applied at once
+        touched = np.empty(2 * len(walks), dtype=np.int64)
+        touched[0::2], touched[1::2] = nodes, targets
+        first = first_occurrences(touched)
+        done = first[0::2] & (first[1::2] | (targets == nodes))  # a loop touches only one node
+        pending = walks[~done], mutated[~done], choice[~done], new_state[~done]
+        walks, mutated, new_state = walks[done], mutated[done], new_state[done]
+        nodes, targets, moves = nodes[done], targets[done], moves[done]
+
+        # mutations kill the walks
+        value[walks[mutated]] = new_state[mutated]
+        position[walks[mutated]] = -1
+        walk_at[nodes[mutated]] = -1
+
+        walks, nodes, targets = walks[moves], nodes[moves], targets[moves]
+        walk_at[nodes] = -1
+        # zealots kill the walks
+        to_zealot = zealots[targets]
+        value[walks[to_zealot]] = zealot_state
+        position[walks[to_zealot]] = -1
+        walks, targets = walks[~to_zealot], targets[~to_zealot]
+        # walks coalesce with the walks already at the target nodes
+        occupant = walk_at[targets]
+        free = occupant < 0
+        walk_at[targets[free]] = walks[free]
+        position[walks[free]] = targets[free]
+        parent[walks[~free]] = occupant[~free]
+        position[walks[~free]] = -1
+
+        removed += int(np.sum(mutated)) + int(np.sum(to_zealot)) + int(np.sum(~free))
+        if removed > live.size // 2:
+            live = live[position[live] >= 0]
+            removed = 0
+
+    # every node takes the state of the walk its walk coalesced with
+    root = parent
+    while True:
+        next_root = root[root]
+        if np.array_equal(next_root, root):
+            break
+        root = next_root
+    return value[root]
+
+
+###########################################################
+#                                                         #
+#                  Sampling the states                    #
+#                                                         #
+###########################################################
+
+def run_dual_sampling(config, g, noise_rate, adjacency=None):
+    """
+    Sets the states of nodes to an exact sample from the stationary distribution of the model
+    with the 'standard' propagation, independent of the current states.
+    :param config: a configuration object
+    :param g: the igraph graph with the 'zealot' attribute of nodes
+    :param noise_rate: noise rate parameter of the model
+    :param adjacency: the CSR adjacency of the graph (indptr, indices), computed from the graph if not given
+    :return: the graph object after changes
+    """
+    indptr, indices = csr_adjacency(g) if adjacency is None else adjacency
+    states = dual_sample(indptr, indices, np.array(g.vs['zealot'], dtype=bool), noise_rate,
+                         mutation_probabilities(len(config.all_states), config.mass_media),
+                         zealot_state=config.all_states.index(config.zealot_state))
+    g.vs['state'] = np.array(config.all_states, dtype=object)[states].tolist()
+    return g
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+A hybrid version of run_simulation() for the regime of high noise, where most steps are mutations.
+
+The default mutation draws a new state without looking at the neighbours, so all random numbers of a window
+of steps (the node, whether it mutates, and its mutated state) can be drawn at once with numpy. The events are then
+processed in the exact order of run_simulation(): propagation events one by one with config.propagate(), while
+mutations are collected and written into the graph in bulk. A collected mutation is written before
+the first propagation event which would see it - when it updates the mutated node or one of its neighbours -
+so every propagation sees exactly the same states as in run_simulation(), and the result has the same
+distribution. Runs of consecutive mutations, and mutations of nodes far from the propagating ones, cost
+a fraction of a microsecond per event instead of a call of default_mutation().
+"""
+import numpy as np
+
+from simulation.dual import mutation_probabilities
+
+
+# the number of steps whose random numbers are drawn at once
+window = 100000
+
+
+def flush_mutations(g, pending):
+    """
+    Writes the collected mutations into the graph in bulk.
+    :param g: the igraph graph
+    :param pending: a dict {node: its mutated state}, emptied after writing
+    :return: None
+    """
+    if pending:
+        g.vs.select(list(pending.keys()))['state'] = list(pending.values())
+        pending.clear()
+
+
+def run_hybrid(config, g, noise_rate, steps, n=None):
+    """
+    The counterpart of run_simulation() with mutations drawn and written in bulk, see the module's description.
+    It uses the default mutation (with config.mass_media) and any propagation mechanism.
+    :param config: a configuration object
+    :param g: the igraph graph to run simulation on
+    :param noise_rate: noise rate parameter of the model
+    :param steps: the number of steps to perform in the simulation
+    :param n: the size of the network
+    :return: the graph object after changes
+    """
+    if n is None:
+        n = len(g.vs())
+    zealots = np.array(g.vs['zealot'], dtype=bool)
+    cumulative = np.cumsum(mutation_probabilities(len(config.all_states), config.mass_media))
+    labels = np.array(config.all_states, dtype=object)
+    pending = {}
+
+    for start in range(0, steps, window):
+        size = min(window, steps - start)
+        nodes = np.random.randint(0, n, size)
+        mutated = np.random.random(size) <= noise_rate
+        # zealots don't change their states
+        free = ~zealots[nodes]
+        nodes, mutated = nodes[free], mutated[free]
+        drawn = np.minimum(np.searchsorted(cumulative, np.random.random(len(nodes)), side='right'),
+                           len(cumulative) - 1)
+        new_states = labels[drawn].tolist()
+        nodes = nodes.tolist()
+
+        previous = 0
+        for i in np.flatnonzero(~mutated).tolist():
+            # mutations since the last propagation event
+            pending.update(zip(nodes[previous:i], new_states[previous:i]))
+            previous = i + 1
+            node = nodes[i]
+            if pending and (node in pending or not pending.keys().isdisjoint(g.neighbors(node))):
+                flush_mutations(g, pending)
+            target = g.vs[node]
+            target['state'] = config.propagate(target, g)
+        pending.update(zip(nodes[previous:], new_states[previous:]))
+
+    flush_mutations(g, pending)
+    return g
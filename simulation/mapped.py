@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+The counterpart of run_simulation() for networks in memory-mapped files (see net_generation/storage.py).
+
+The dynamics is the same random-sequential update with the standard propagation, with neighbours read
+directly from the mapped CSR adjacency, so only the pages of the files holding the neighbours of updated
+nodes are read from the disk (or the page cache). Random numbers are drawn in windows of steps with numpy.
+"""
+import numpy as np
+
+from simulation.dual import mutation_probabilities
+from simulation.domains import run_domain_steps
+
+
+# the number of steps whose random numbers are drawn at once
+window = 100000
+
+
+def run_mapped_simulation(config, g, noise_rate, steps, n=None):
+    """
+    Runs the simulation with the standard propagation and the default mutation on a MappedGraph.
+    :param config: a configuration object
+    :param g: MappedGraph object to run simulation on
+    :param noise_rate: noise rate parameter of the model
+    :param steps: the number of steps to perform in the simulation
+    :param n: the size of the network
+    :return: the graph object after changes
+    """
+    if n is None:
+        n = g.vcount()
+    cumulative = np.cumsum(mutation_probabilities(len(config.all_states), config.mass_media))
+    arrays = [memoryview(array) for array in (g.states, g.zealots, g.indptr, g.indices)]
+    for start in range(0, steps, window):
+        run_domain_steps(*arrays, np.random.randint(0, n, min(window, steps - start)), noise_rate, cumulative)
+    return g
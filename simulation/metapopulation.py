@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+A fast approximation of the model with the 'standard' propagation, which follows only the number of nodes
+in every state in every district (the composition of districts) instead of the whole network.
+
+In the Stochastic Block Model all nodes of a district are equivalent, so a node of district i copies the state
+of a random node of district j with the probability proportional to affinity[i, j] * N_j (the expected number
+of its neighbours in j), and the state of that node is drawn from the composition of district j (including
+zealots). This mean-field (metapopulation) approximation neglects the correlations between neighbours,
+so it is accurate for dense districts, and a step costs O(q^2) instead of depending on the network.
+
+The continuous-time Markov chain of the composition is simulated with leaps: in a leap of L steps every district
+gets a multinomial number of updated nodes, their current states are drawn from the composition of the district
+and their new states from the probabilities of mutation and copying, both computed at the start of the leap.
+With leaps of one step the chain is simulated exactly; the default leap updates a small fraction of nodes,
+so the composition hardly changes during it.
+"""
+import numpy as np
+
+from net_generation.base import affinity_matrix
+from simulation.dual import mutation_probabilities
+
+
+# the fraction of nodes updated in one leap
+leap_fraction = 0.01
+
+
+###########################################################
+#                                                         #
+#                Composition of districts                 #
+#                                                         #
+###########################################################
+
+class DistrictComposition:
+    """
+    The number of nodes in every state in every district, with the number of zealots in every district,
+    and the probabilities of copying the state from every district.
+    """
+
+    def __init__(self, counts, zealots, weights, zealot_state=0):
+        """
+        :param counts: numpy array with a shape (q, len(states)), the number of nodes which aren't zealots
+        in every state in every district
+        :param zealots: numpy array with a shape (q,), the number of zealots in every district
+        :param weights: numpy array with a shape (q, q), the probability that a node of district i copies
+        the state of a node of district j, see neighbour_weights()
+        :param zealot_state: the index of the zealot state
+        """
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.zealots = np.asarray(zealots, dtype=np.int64)
+        self.weights = weights
+        self.zealot_state = zealot_state
+        self.sizes = self.counts.sum(axis=1) + self.zealots
+
+    def tally(self):
+        """
+        :return: numpy array with a shape (q, len(states)), the number of votes in each district for each party,
+        the same as electoral_sys.electoral_system.tally_votes() for the network
+        """
+        tally = self.counts.copy()
+        tally[:, self.zealot_state] += self.zealots
+        return tally
+
+    def vote_fractions(self, states):
+        """
+        :param states: all possible states of nodes
+        :return: a dict with the fraction of votes for every party in the whole country
+        """
+        votes = self.tally().sum(axis=0)
+        return {state: votes[i] / votes.sum() for i, state in enumerate(states)}
+
+
+def neighbour_weights(affinity, block_sizes):
+    """
+    :param affinity: numpy array with a shape (q, q), the connection probabilities between districts
+    :param block_sizes: sizes of districts (list of ints)
+    :return: numpy array with a shape (q, q), the probability that a random neighbour of a node of district i
+    is in district j (rows of districts without links have zeros)
+    """
+    sizes = np.asarray(block_sizes, dtype=float)
+    expected = affinity * (sizes[None, :] - np.eye(len(sizes)))
+    total = expected.sum(axis=1, keepdims=True)
+    return np.divide(expected, total, out=np.zeros_like(expected), where=total > 0)
+
+
+def zealot_districts(block_sizes, weights, m, one_district=False, district=None, degree_driven=False):
+    """
+    Places zealots in districts in the same way as net_generation.base.add_zealots() places them in the network,
+    with the expected degree of nodes of a district in place of their degree.
+    :param block_sizes: sizes of districts (list of ints)
+    :param weights: numpy array with a shape (q, q), the expected number of neighbours of a node of district i
+    in district j
+    :param m: number of zealots
+    :param one_district: boolean, whether to add them to one district or randomly
+    :param district: if one_district==True, which district to choose? If 'None', district is chosen randomly
+    :param degree_driven: if True choose nodes proportionally to the degree
+    :return: numpy array with a shape (q,), the number of zealots in every district
+    """
+    q = len(block_sizes)
+    if one_district:
+        if district is None:
+            district = np.random.randint(q)
+        zealots = np.zeros(q, dtype=np.int64)
+        zealots[district] = m
+        if m > block_sizes[district]:
+            raise ValueError(f'Cannot place {m} zealots in the district {district} of size {block_sizes[district]}')
+        return zealots
+    groups = np.repeat(np.arange(q), block_sizes)
+    if degree_driven:
+        degrees = weights.sum(axis=1)[groups]
+        ids = np.random.choice(len(groups), size=m, replace=False, p=degrees / np.sum(degrees))
+    else:
+        ids = np.random.choice(len(groups), size=m, replace=False)
+    return np.bincount(groups[ids], minlength=q)
+
+
+def init_composition(config, n, n_zealots):
+    """
+    Generates the initial composition of districts with the same initial states and zealots as init_graph()
+    and add_zealots() would generate for the network.
+    :param config: a configuration object
+    :param n: the number of nodes
+    :param n_zealots: the number of zealots
+    :return: DistrictComposition object
+    """
+    affinity = affinity_matrix(n, config.district_sizes, config.avg_deg, block_coords=config.district_coords,
+                               ratio=config.ratio, planar_const=config.planar_c, euclidean=config.euclidean)
+    sizes = np.asarray(config.district_sizes)
+    zealots = zealot_districts(config.district_sizes, affinity * sizes[None, :], n_zealots, **config.zealots_config)
+
+    # states of nodes are generated in the order of districts, and zealots replace random nodes of their district
+    q, num_states = len(sizes), len(config.all_states)
+    state_index = {state: i for i, state in enumerate(config.all_states)}
+    states = config.initialize_states(n, all_states=config.all_states, state=config.not_zealot_state)
+    parties = np.fromiter((state_index[state] for state in states), dtype=int, count=n)
+    groups = np.repeat(np.arange(q), sizes)
+    counts = np.bincount(groups * num_states + parties, minlength=q * num_states).reshape(q, num_states)
+    counts -= multivariate_hypergeometric_rows(counts, zealots)
+
+    return DistrictComposition(counts, zealots, neighbour_weights(affinity, config.district_sizes),
+                               zealot_state=config.all_states.index(config.zealot_state))
+
+
+###########################################################
+#                                                         #
+#               Random numbers for districts              #
+#                                                         #
+###########################################################
+
+def multinomial_rows(totals, probabilities):
+    """
+    Draws a multinomial vector for every row, with conditional binomial variables.
+    :param totals: numpy array with a shape (q,), the number of trials in every row
+    :param probabilities: numpy array with a shape (q, k), the probabilities in every row (summing up to one)
+    :return: numpy array with a shape (q, k)
+    """
+    result = np.zeros(probabilities.shape, dtype=np.int64)
+    remaining = np.asarray(totals, dtype=np.int64).copy()
+    rest = np.ones(len(remaining))
+    for s in range(probabilities.shape[1] - 1):
+        p = np.clip(np.divide(probabilities[:, s], rest, out=np.ones(len(rest)), where=rest > 0), 0.0, 1.0)
+        result[:, s] = np.random.binomial(remaining, p)
+        remaining -= result[:, s]
+        rest -= probabilities[:, s]
+    result[:, -1] = remaining
+    return result
+
+
+def multivariate_hypergeometric_rows(counts, totals):
+    """
+    Draws, without replacement, a given number of elements from every row of counts.
+    :param counts: numpy array with a shape (q, k), the number of elements of every kind in every row
+    :param totals: numpy array with a shape (q,), the number of elements drawn from every row
+    :return: numpy array with a shape (q, k), the number of elements of every kind drawn from every row
+    """
+    result = np.zeros(counts.shape, dtype=np.int64)
+    remaining = np.asarray(totals, dtype=np.int64).copy()
+    left = counts.sum(axis=1)
+    for s in range(counts.shape[1]):
+        others = left - counts[:, s]
+        drawn = remaining > 0
+        result[drawn, s] = np.random.hypergeometric(counts[drawn, s], others[drawn], remaining[drawn])
+        remaining -= result[:, s]
+        left = others
+    return result
+
+
+###########################################################
+#                                                         #
+#                Dynamics of the composition              #
+#                                                         #
+###########################################################
+
+def leap_composition(composition, noise_rate, probabilities, steps):
+    """
+    Performs a leap of the given number of steps, see the module's description.
+    :param composition: DistrictComposition object, changed in place
+    :param noise_rate: noise rate parameter of the model
+    :param probabilities: numpy array with the probabilities of states drawn by a mutation
+    :param steps: the number of steps of the leap
+    :return: None
+    """
+    sizes = composition.sizes
+    # probabilities of the new state of an updated node, the same for all its current states
+    copied = composition.weights @ (composition.tally() / np.maximum(sizes, 1)[:, None])
+    new_state = noise_rate * probabilities[None, :] + (1.0 - noise_rate) * copied
+
+    updates = np.random.multinomial(steps, sizes / sizes.sum())
+    # zealots (the last column) don't change their states
+    drawn = multinomial_rows(updates, np.column_stack([composition.counts, composition.zealots])
+                             / np.maximum(sizes, 1)[:, None])[:, :-1]
+    # a node updated twice in a leap is updated once
+    drawn = np.minimum(drawn, composition.counts)
+
+    # nodes of districts without links keep their states when they copy, only mutations change them
+    isolated = composition.weights.sum(axis=1) == 0
+    if np.any(isolated):
+        drawn[isolated] = np.random.binomial(drawn[isolated], noise_rate)
+        new_state[isolated] = probabilities
+
+    composition.counts -= drawn
+    composition.counts += multinomial_rows(drawn.sum(axis=1), new_state)
+
+
+def run_metapopulation(config, composition, noise_rate, steps, leap=None):
+    """
+    The approximation of run_simulation() - performs the given number of steps on the composition of districts.
+    :param config: a configuration object
+    :param composition: DistrictComposition object
+    :param noise_rate: noise rate parameter of the model
+    :param steps: the number of steps to perform in the simulation
+    :param leap: the number of steps in a leap, by default leap_fraction of the nodes
+    :return: the composition after changes
+    """
+    if leap is None:
+        leap = max(int(leap_fraction * composition.sizes.sum()), 1)
+    probabilities = mutation_probabilities(len(config.all_states), config.mass_media)
+    for start in range(0, steps, leap):
+        leap_composition(composition, noise_rate, probabilities, min(leap, steps - start))
+    return composition
+
+
+def run_metapopulation_thermalization(config, composition, noise_rate, therm_time, each=1000, progress=None,
+                                      leap=None):
+    """
+    The approximation of run_thermalization() - runs the thermalization and computes the trajectory.
+    :param config: a configuration object
+    :param composition: DistrictComposition object
+    :param noise_rate: noise rate parameter of the model
+    :param therm_time: the number of steps to perform in thermalization
+    :param each: integer, after how many steps to compute the trajectory point (at least a leap)
+    :param progress: a function called with the number of steps done after every trajectory point (optional)
+    :param leap: the number of steps in a leap, by default leap_fraction of the nodes
+    :return: the composition after changes, the trajectory
+    """
+    if leap is None:
+        leap = max(int(leap_fraction * composition.sizes.sum()), 1)
+    each = max(each, leap)
+    trajectory = {k: [v] for k, v in composition.vote_fractions(config.all_states).items()}
+    for start in range(0, therm_time, each):
+        steps = min(each, therm_time - start)
+        composition = run_metapopulation(config, composition, noise_rate, steps, leap=leap)
+        if progress is not None:
+            progress(steps)
+        for key, value in composition.vote_fractions(config.all_states).items():
+            trajectory[key].append(value)
+    return composition, trajectory
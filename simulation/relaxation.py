@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Estimates of the relaxation time of the model with the 'standard' propagation from the spectrum of the graph.
+
+With the standard propagation the expected state of nodes evolves linearly: in one sweep (n steps) every node
+copies a random neighbour with probability 1 - epsilon, so the deviation from the stationary state decays
+with the eigenvalues of (1 - epsilon) P, where P is the transition matrix of the random walk on the graph
+restricted to nodes which aren't zealots (the walk reaching a zealot takes its fixed state). The slowest mode
+has the largest eigenvalue lambda of P, it relaxes at the rate 1 - (1 - epsilon) * lambda per sweep,
+so zealots (lambda < 1) and the noise both shorten the relaxation. The same rate governs the autocorrelation
+of vote fractions between samples. P is similar to the symmetric matrix D^(-1/2) A D^(-1/2) (restricted to free
+nodes), whose leading eigenvalues are computed with the sparse Lanczos method.
+
+For the majority and minority propagation the estimate is only a rough guide, as their dynamics isn't linear.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.linalg import eigsh, ArpackNoConvergence
+
+from configuration.logging import log
+from net_generation.diagnostics import csr_adjacency
+
+
+# the deviation from the stationary state left after the thermalization
+therm_tolerance = 1e-3
+# the correlation of vote fractions between consecutive samples
+sample_correlation = 0.1
+# graphs with at most this many free nodes are diagonalised with dense methods
+dense_size = 1000
+# relaxation rates below this are rounding errors of an eigenvalue 1 (the model never relaxes)
+rate_tolerance = 1e-10
+
+
+###########################################################
+#                                                         #
+#                 Spectrum of the graph                   #
+#                                                         #
+###########################################################
+
+def transition_spectrum(indptr, indices, zealots=None, k=2):
+    """
+    Computes the largest eigenvalues of the transition matrix of the random walk on the graph, restricted
+    to nodes which aren't zealots. Isolated nodes keep their state, so they have the eigenvalue 1.
+    :param indptr: numpy array, the CSR index pointers of the graph, see net_generation.diagnostics.csr_adjacency()
+    :param indices: numpy array, the CSR neighbours of the graph
+    :param zealots: numpy boolean array, which nodes are zealots, None if there are no zealots
+    :param k: the number of eigenvalues
+    :return: numpy array with at most k largest eigenvalues in descending order
+    """
+    n = len(indptr) - 1
+    degrees = np.diff(indptr)
+    free = np.ones(n, dtype=bool) if zealots is None else ~np.asarray(zealots, dtype=bool)
+    size = int(np.sum(free))
+    if size == 0:
+        return np.zeros(0)
+
+    rows = np.repeat(np.arange(n), degrees)
+    links = free[rows] & free[indices]
+    scale = 1.0 / np.sqrt(np.maximum(degrees, 1))
+    label = np.cumsum(free) - 1
+    matrix = csr_matrix((scale[rows[links]] * scale[indices[links]], (label[rows[links]], label[indices[links]])),
+                        shape=(size, size))
+    matrix = matrix + diags((degrees[free] == 0).astype(float))
+
+    k = min(k, size)
+    if size <= dense_size:
+        return np.linalg.eigvalsh(matrix.toarray())[::-1][:k]
+    try:
+        values = eigsh(matrix, k=k, which='LA', return_eigenvectors=False, tol=1e-8)
+    except ArpackNoConvergence as error:
+        log.warning('The Lanczos method did not converge, the relaxation time is estimated from the eigenvalues found')
+        values = error.eigenvalues
+    return np.sort(values)[::-1]
+
+
+def relaxation_time(eigenvalue, noise_rate):
+    """
+    :param eigenvalue: an eigenvalue of the transition matrix, see transition_spectrum()
+    :param noise_rate: noise rate parameter of the model
+    :return: the relaxation time of the mode in sweeps (n steps), infinity if it never relaxes
+    """
+    rate = 1.0 - (1.0 - noise_rate) * eigenvalue
+    return 1.0 / rate if rate > rate_tolerance else np.inf
+
+
+###########################################################
+#                                                         #
+#             Thermalization and sampling times           #
+#                                                         #
+###########################################################
+
+def estimate_relaxation(g, noise_rate, n=None, k=2, tolerance=therm_tolerance, correlation=sample_correlation):
+    """
+    Estimates the thermalization time and the number of Monte Carlo sweeps between samples.
+    :param g: the igraph graph with the 'zealot' attribute of nodes
+    :param noise_rate: noise rate parameter of the model
+    :param n: the size of the network
+    :param k: the number of eigenvalues computed
+    :param tolerance: the deviation from the stationary state left after the thermalization
+    :param correlation: the correlation of vote fractions between consecutive samples
+    :return: a dict with 'eigenvalues', 'spectral_gap' - one minus the largest eigenvalue, 'relaxation_time'
+    in sweeps, and the proposed 'therm_time' (in steps) and 'mc_steps' (None if the model doesn't relax)
+    """
+    if n is None:
+        n = g.vcount()
+    indptr, indices = csr_adjacency(g)
+    eigenvalues = transition_spectrum(indptr, indices, np.array(g.vs['zealot'], dtype=bool), k=k)
+    # without free nodes all states are fixed
+    largest = eigenvalues[0] if len(eigenvalues) else 0.0
+    tau = relaxation_time(largest, noise_rate) if len(eigenvalues) else 0.0
+    estimate = {'eigenvalues': eigenvalues, 'spectral_gap': max(1.0 - largest, 0.0), 'relaxation_time': tau,
+                'therm_time': None, 'mc_steps': None}
+    if np.isfinite(tau):
+        estimate['therm_time'] = int(np.ceil(n * tau * np.log(1.0 / tolerance)))
+        estimate['mc_steps'] = max(int(np.ceil(tau * np.log(1.0 / correlation))), 1)
+    return estimate
+
+
+def log_relaxation_estimate(estimate, therm_time, mc_steps):
+    """
+    Logs the estimate of the relaxation time and compares the proposed values with the current ones.
+    :param estimate: the dict returned by estimate_relaxation()
+    :param therm_time: the current thermalization time
+    :param mc_steps: the current number of Monte Carlo sweeps between samples
+    :return: None
+    """
+    log.info(f"Leading eigenvalues of the random walk: {np.round(estimate['eigenvalues'], 6).tolist()}, "
+             f"spectral gap {estimate['spectral_gap']:.4g}")
+    if estimate['therm_time'] is None:
+        log.warning('The model does not relax to a stationary state (without noise some nodes never reach a zealot), '
+                    'the thermalization time and mc_steps cannot be estimated')
+        return
+    log.info(f"Relaxation time {estimate['relaxation_time']:.4g} sweeps, proposed therm_time "
+             f"{estimate['therm_time']} (now {therm_time}) and mc_steps {estimate['mc_steps']} (now {mc_steps})")
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Numpy arrays placed once in shared memory, so worker processes attach them instead of getting their own copies.
+
+The main process creates SharedArrays from a dict of arrays, and passes its (small, picklable) spec to workers,
+which call attach_arrays(). Arrays of the network (CSR adjacency, districts, zealots) are attached read-only,
+so the memory of a process-parallel mode grows with the number of workers only by their private states.
+multiprocessing.shared_memory exists since Python 3.8, it's imported only when arrays are shared,
+so the modules using it can be imported with older versions.
+"""
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Copies of numpy arrays in blocks of shared memory, owned by the process which created them.
+    """
+
+    def __init__(self, arrays):
+        """
+        :param arrays: a dict {name: numpy array}
+        """
+        from multiprocessing import shared_memory
+        self.blocks = {}
+        self.arrays = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            # a block can't be empty
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.blocks[name] = block
+            self.arrays[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            self.arrays[name][...] = array
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    @property
+    def spec(self):
+        """
+        :return: a dict {name: (the name of the block, dtype, shape)} needed by attach_arrays()
+        """
+        return {name: (self.blocks[name].name, array.dtype.str, array.shape) for name, array in self.arrays.items()}
+
+    @property
+    def nbytes(self):
+        """
+        :return: the total size of the shared arrays in bytes
+        """
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def close(self):
+        """
+        Releases the shared memory, the arrays can't be used afterwards.
+        :return: None
+        """
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+
+def attach_arrays(spec, writeable=()):
+    """
+    Attaches arrays shared by another process, see SharedArrays.
+    :param spec: the spec of SharedArrays
+    :param writeable: the names of arrays which can be changed, other arrays are read-only
+    :return: a list of blocks of shared memory (to be closed by the caller) and a dict {name: numpy array}
+    """
+    from multiprocessing import shared_memory
+    blocks, arrays = [], {}
+    for name, (block_name, dtype, shape) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        arrays[name].flags.writeable = name in writeable
+    return blocks, arrays
@@ -173,6 +173,16 @@ class TestSimulationBase(unittest.TestCase):
         run_thermalization_simple(config, g, noise_rate, 1, n=9)
         mocked_run.assert_called_once_with(config, g, noise_rate, 1, n=9)
 
+    @patch('simulation.base.run_simulation')
+    def test_run_thermalization_simple_progress(self, mocked_run):
+        g = TestGraphNine(9)
+        mocked_run.return_value = g
+        config = Configuration()
+        done = []
+        run_thermalization_simple(config, g, 0.2, 250, n=9, progress=done.append, each=100)
+        self.assertListEqual([c[0][3] for c in mocked_run.call_args_list], [100, 100, 50])
+        self.assertListEqual(done, [100, 100, 50])
+
     @patch('simulation.base.run_simulation')
     def test_run_thermalization(self, mocked_run):
         # this test relies on electoral_sys.electoral_system.single_district_voting(),
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+import igraph as ig
+
+from net_generation.diagnostics import csr_adjacency
+from simulation.colouring import colour_classes, sweep_schedule, propagated_states, update_class
+from simulation.colouring import run_colouring_sweeps
+
+
+class Configuration:
+    """
+    dummy configuration with the states of nodes and the propagation
+    """
+    all_states = ['a', 'b', 'c']
+    mass_media = 0.5
+    propagation = 'standard'
+
+
+class TestColouring(unittest.TestCase):
+
+    def test_colour_classes(self):
+        g = ig.Graph.Erdos_Renyi(200, m=800)
+        classes = colour_classes(g)
+        self.assertEqual(sorted(np.concatenate(classes).tolist()), list(range(200)))
+        for nodes in classes:
+            nodes = set(nodes.tolist())
+            self.assertTrue(all(not (nodes & set(g.neighbors(node))) for node in nodes))
+
+    def test_sweep_schedule(self):
+        g = ig.Graph.Ring(6)
+        schedule = sweep_schedule(g)
+        self.assertIs(sweep_schedule(g), schedule)
+        self.assertEqual(sorted(schedule['order'].tolist()), list(range(len(schedule['classes']))))
+
+    def test_propagated_states_standard(self):
+        # node 0 is linked to 1 and 2, node 3 is isolated
+        indptr, indices = csr_adjacency(ig.Graph(4, [(0, 1), (0, 2)]))
+        states = np.array([0, 1, 1, 2])
+        np.testing.assert_array_equal(propagated_states(np.array([0, 3]), states, indptr, indices, 3), [1, 2])
+
+    def test_propagated_states_majority(self):
+        indptr, indices = csr_adjacency(ig.Graph(5, [(0, 1), (0, 2), (0, 3), (4, 3)]))
+        states = np.array([0, 1, 1, 2, 0])
+        nodes = np.array([0, 4])
+        np.testing.assert_array_equal(propagated_states(nodes, states, indptr, indices, 3, 'majority'), [1, 2])
+        np.testing.assert_array_equal(propagated_states(nodes, states, indptr, indices, 3, 'minority'), [2, 2])
+
+    def test_propagated_states_ties(self):
+        np.random.seed(3)
+        indptr, indices = csr_adjacency(ig.Graph(3, [(0, 1), (0, 2)]))
+        states = np.array([0, 1, 2])
+        chosen = [propagated_states(np.array([0]), states, indptr, indices, 3, 'majority')[0] for _ in range(200)]
+        self.assertEqual(set(chosen), {1, 2})
+
+    def test_update_class(self):
+        np.random.seed(4)
+        indptr, indices = csr_adjacency(ig.Graph(4, [(0, 1), (2, 3)]))
+        states = np.array([0, 1, 0, 1])
+        zealots = np.array([False, False, True, False])
+        update_class(np.array([0, 2]), states, zealots, indptr, indices, 0.0, np.cumsum([0.5, 0.5]))
+        np.testing.assert_array_equal(states, [1, 1, 0, 1])
+        update_class(np.array([1, 3]), states, zealots, indptr, indices, 1.0, np.cumsum([1.0, 0.0]))
+        np.testing.assert_array_equal(states, [1, 0, 0, 0])
+
+    def test_run_colouring_sweeps(self):
+        np.random.seed(5)
+        g = ig.Graph.Erdos_Renyi(100, m=300)
+        g.vs['state'] = 'c'
+        g.vs['zealot'] = 0
+        g.vs[0]['zealot'] = 1
+        g.vs[0]['state'] = 'a'
+        g = run_colouring_sweeps(Configuration, g, 0.5, 150)
+        schedule = g['sweep']
+        self.assertEqual(sum(len(schedule['classes'][k]) for k in schedule['order'][:schedule['position']])
+                         + schedule['offset'], 50)
+        g = run_colouring_sweeps(Configuration, g, 0.5, 1000)
+        self.assertEqual(g.vs[0]['state'], 'a')
+        self.assertEqual(set(g.vs['state']), {'a', 'b', 'c'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import sys
+import unittest
+import numpy as np
+import igraph as ig
+
+from electoral_sys.electoral_system import tally_votes
+from net_generation.diagnostics import csr_adjacency
+from simulation.dual import mutation_probabilities
+from simulation.domains import district_groups, domain_ghosts, run_domains, close_domains, DomainWorkers
+from simulation.tests.dual_tests import stationary_distribution
+
+
+class Configuration:
+    """
+    dummy configuration of the domains engine
+    """
+    all_states = ['a', 'b']
+    mass_media = 0.3
+    q = 4
+    processes = 2
+    sync_interval = 0.1
+
+
+def district_graph():
+    """
+    :return: a graph of 4 districts, rings of 10 nodes linked to the next district by a single link
+    """
+    g = ig.Graph.Ring(40)
+    g.vs['district'] = [i // 10 for i in range(40)]
+    g.vs['state'] = 'b'
+    g.vs['zealot'] = 0
+    return g
+
+
+class TestDomains(unittest.TestCase):
+
+    def test_district_groups(self):
+        districts = np.repeat([0, 1, 2, 3, 4], [10, 7, 5, 3, 2])
+        groups = district_groups(districts, 2)
+        loads = np.bincount(groups[districts], minlength=2)
+        np.testing.assert_array_equal(np.sort(loads), [13, 14])
+
+    def test_domain_ghosts(self):
+        indptr, indices = csr_adjacency(ig.Graph(5, [(0, 1), (1, 2), (2, 3), (3, 4)]))
+        groups = np.array([0, 1, 1, 0, 0])
+        np.testing.assert_array_equal(domain_ghosts(np.array([1, 2]), indptr, indices, groups, 1), [0, 3])
+        np.testing.assert_array_equal(domain_ghosts(np.array([0, 3, 4]), indptr, indices, groups, 0), [1, 2])
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs Python 3.8')
+    def test_run_domains_zealots(self):
+        np.random.seed(1)
+        g = district_graph()
+        g.vs[4]['zealot'] = 1
+        g.vs[4]['state'] = 'a'
+        try:
+            g = run_domains(Configuration, g, 0.5, 4000)
+            self.assertEqual(g['domains'].workers, 2)
+            self.assertEqual(g.vs[4]['state'], 'a')
+            self.assertEqual(set(g.vs['state']), {'a', 'b'})
+            np.testing.assert_array_equal(g['domains'].tally(), tally_votes(g.vs, Configuration.all_states, 4))
+        finally:
+            close_domains(g)
+        self.assertIsNone(g['domains'])
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs Python 3.8')
+    def test_run_domains_no_noise(self):
+        # without noise a consensus never changes
+        g = district_graph()
+        try:
+            g = run_domains(Configuration, g, 0.0, 2000)
+            g = run_domains(Configuration, g, 0.0, 5)
+            self.assertEqual(set(g.vs['state']), {'b'})
+        finally:
+            close_domains(g)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs Python 3.8')
+    def test_run_domains_stationary_distribution(self):
+        # all nodes are in one district, so a single worker runs the exact dynamics
+        np.random.seed(2)
+        g = ig.Graph(4, [(0, 1), (1, 2), (2, 3), (1, 3)])
+        g.vs['district'] = 0
+        g.vs['state'] = 'b'
+        g.vs['zealot'] = 0
+        configurations, pi = stationary_distribution(g, np.zeros(4, dtype=bool), 0.6,
+                                                     mutation_probabilities(2, Configuration.mass_media))
+        counts = dict.fromkeys(configurations, 0)
+        size = 5000
+        try:
+            for _ in range(size):
+                g = run_domains(Configuration, g, 0.6, 6, n=4)
+                counts[tuple(Configuration.all_states.index(state) for state in g.vs['state'])] += 1
+        finally:
+            close_domains(g)
+        empirical = np.array([counts[c] / size for c in configurations])
+        np.testing.assert_allclose(empirical, pi, atol=0.03)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs Python 3.8')
+    def test_dead_worker(self):
+        # the main process and the other worker don't wait forever for a worker which has died
+        g = district_graph()
+        workers = DomainWorkers(g, 4, 2, processes=2, sync_steps=4)
+        workers.poll_interval = 0.1
+        try:
+            workers.processes[1].kill()
+            workers.processes[1].join()
+            with self.assertRaises(RuntimeError):
+                workers.run(np.zeros(40, dtype=np.int64), np.zeros(40, dtype=bool), 0.5, np.array([0.5, 0.5]),
+                            1000)
+        finally:
+            workers.close()
+        self.assertFalse(any(process.is_alive() for process in workers.processes))
+
+
+if __name__ == '__main__':
+    unittest.main()
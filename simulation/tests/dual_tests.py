@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import unittest
+import itertools
+import numpy as np
+import igraph as ig
+
+from net_generation.diagnostics import csr_adjacency
+from simulation.dual import mutation_probabilities, first_occurrences, previous_events, dual_sample, run_dual_sampling
+
+
+def stationary_distribution(g, zealots, noise_rate, probabilities):
+    """
+    the exact stationary distribution of the noisy voter model on a small graph, computed from the transition matrix
+    """
+    n = g.vcount()
+    configurations = [c for c in itertools.product(range(len(probabilities)), repeat=n)
+                      if all(c[v] == 0 for v in range(n) if zealots[v])]
+    index = {c: i for i, c in enumerate(configurations)}
+    transitions = np.zeros((len(configurations), len(configurations)))
+    for c in configurations:
+        for v in range(n):
+            if zealots[v]:
+                transitions[index[c], index[c]] += 1.0 / n
+                continue
+            neighbours = g.neighbors(v)
+            for u in neighbours:
+                new = c[:v] + (c[u],) + c[v + 1:]
+                transitions[index[c], index[new]] += (1.0 - noise_rate) / n / len(neighbours)
+            if not neighbours:
+                transitions[index[c], index[c]] += (1.0 - noise_rate) / n
+            for s, p in enumerate(probabilities):
+                new = c[:v] + (s,) + c[v + 1:]
+                transitions[index[c], index[new]] += noise_rate * p / n
+    values, vectors = np.linalg.eig(transitions.T)
+    pi = np.real(vectors[:, np.argmin(np.abs(values - 1.0))])
+    return configurations, pi / pi.sum()
+
+
+class TestDualSampler(unittest.TestCase):
+
+    def test_mutation_probabilities(self):
+        np.testing.assert_array_almost_equal(mutation_probabilities(3, 0.4), [0.4, 0.3, 0.3])
+        np.testing.assert_array_almost_equal(mutation_probabilities(2, 0.5), [0.5, 0.5])
+
+    def test_first_occurrences(self):
+        np.testing.assert_array_equal(first_occurrences(np.array([3, 1, 3, 2, 1, 5])),
+                                      [True, True, False, True, False, True])
+
+    def test_previous_events(self):
+        rank, previous = previous_events(np.array([4, 2, 4, 4, 7, 2]))
+        np.testing.assert_array_equal(rank, [0, 0, 1, 2, 0, 1])
+        np.testing.assert_array_equal(previous, [-1, -1, 0, 2, -1, 1])
+
+    def test_dual_sample_no_noise(self):
+        indptr, indices = csr_adjacency(ig.Graph(2, [(0, 1)]))
+        self.assertRaises(ValueError, dual_sample, indptr, indices, np.zeros(2, dtype=bool), 0.0,
+                          mutation_probabilities(2, 0.5))
+
+    def test_dual_sample_zealots(self):
+        # node 1 copies only the zealot, so it has the zealot state unless it mutated at its last update
+        np.random.seed(3)
+        indptr, indices = csr_adjacency(ig.Graph(3, [(0, 1)]))
+        zealots = np.array([True, False, False])
+        samples = np.array([dual_sample(indptr, indices, zealots, 0.2, mutation_probabilities(2, 0.3))
+                            for _ in range(2000)])
+        self.assertTrue(np.all(samples[:, 0] == 0))
+        self.assertAlmostEqual(np.mean(samples[:, 1] == 0), 0.8 + 0.2 * 0.3, delta=0.04)
+        # an isolated node has the state of its last mutation
+        self.assertAlmostEqual(np.mean(samples[:, 2] == 0), 0.3, delta=0.04)
+
+    def test_dual_sample_stationary_distribution(self):
+        np.random.seed(5)
+        g = ig.Graph(5, [(0, 1), (1, 2), (2, 3), (1, 3)])
+        zealots = np.array([False, False, False, True, False])
+        probabilities = mutation_probabilities(2, 0.3)
+        configurations, pi = stationary_distribution(g, zealots, 0.2, probabilities)
+
+        indptr, indices = csr_adjacency(g)
+        counts = dict.fromkeys(configurations, 0)
+        size = 2000
+        for _ in range(size):
+            counts[tuple(dual_sample(indptr, indices, zealots, 0.2, probabilities))] += 1
+        empirical = np.array([counts[c] / size for c in configurations])
+        np.testing.assert_allclose(empirical, pi, atol=0.03)
+
+    def test_run_dual_sampling(self):
+        class Configuration:
+            all_states = ['a', 'b', 'c']
+            zealot_state = 'a'
+            mass_media = 0.2
+
+        np.random.seed(7)
+        g = ig.Graph.Ring(50)
+        g.vs['state'] = 'c'
+        g.vs['zealot'] = 0
+        g.vs[10]['zealot'] = 1
+        g = run_dual_sampling(Configuration, g, 0.1)
+        self.assertEqual(g.vs[10]['state'], 'a')
+        self.assertTrue(set(g.vs['state']) <= {'a', 'b', 'c'})
+        self.assertGreater(len(set(g.vs['state'])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+import igraph as ig
+
+from simulation.base import default_propagation, default_mutation, run_simulation
+from simulation.dual import mutation_probabilities
+from simulation.free import free_updates, run_free_simulation
+from simulation.tests.dual_tests import stationary_distribution
+
+
+class Configuration:
+    """
+    dummy configuration with the default propagation and mutation
+    """
+    all_states = ['a', 'b']
+    mass_media = 0.3
+    propagate = staticmethod(default_propagation)
+    mutate = staticmethod(default_mutation)
+
+
+class TestFree(unittest.TestCase):
+
+    def test_free_updates(self):
+        np.random.seed(1)
+        self.assertEqual(free_updates(1000, 10, 10), 1000)
+        self.assertEqual(free_updates(1000, 0, 10), 0)
+        updates = [free_updates(1000, 3, 10) for _ in range(2000)]
+        self.assertAlmostEqual(np.mean(updates), 300, delta=1.5)
+        self.assertAlmostEqual(np.var(updates), 210, delta=20)
+
+    def test_run_free_simulation_zealots(self):
+        np.random.seed(1)
+        g = ig.Graph.Ring(20)
+        g.vs['state'] = 'b'
+        g.vs['zealot'] = 0
+        g.vs[4]['zealot'] = 1
+        g.vs[4]['state'] = 'a'
+        g = run_free_simulation(Configuration, g, 0.2, 2000)
+        self.assertEqual(g.vs[4]['state'], 'a')
+        self.assertEqual(set(g.vs['state']), {'a', 'b'})
+
+    def test_run_free_simulation_all_zealots(self):
+        g = ig.Graph.Ring(5)
+        g.vs['state'] = 'a'
+        g.vs['zealot'] = 1
+        g = run_free_simulation(Configuration, g, 1.0, 100)
+        self.assertEqual(set(g.vs['state']), {'a'})
+
+    def test_run_free_simulation_transient(self):
+        # far from the stationary state the result depends on the number of updates of free nodes
+        np.random.seed(3)
+        size = 4000
+        fractions = []
+        for simulate in (run_simulation, run_free_simulation):
+            counts = np.zeros(size)
+            for i in range(size):
+                g = ig.Graph.Ring(10)
+                g.vs['state'] = ['a'] * 6 + ['b'] * 4
+                g.vs['zealot'] = [1] * 6 + [0] * 4
+                g = simulate(Configuration, g, 0.0, 10)
+                counts[i] = g.vs['state'].count('a') - 6
+            fractions.append(np.bincount(counts.astype(int), minlength=5) / size)
+        np.testing.assert_allclose(fractions[1], fractions[0], atol=0.03)
+
+    def test_run_free_simulation_stationary_distribution(self):
+        # with a zealot, the number of updates has to follow the steps picking free nodes
+        np.random.seed(2)
+        g = ig.Graph(4, [(0, 1), (1, 2), (2, 3), (1, 3)])
+        g.vs['state'] = 'a'
+        g.vs['zealot'] = [0, 1, 0, 0]
+        zealots = np.array(g.vs['zealot'], dtype=bool)
+        configurations, pi = stationary_distribution(g, zealots, 0.6,
+                                                     mutation_probabilities(2, Configuration.mass_media))
+        counts = dict.fromkeys(configurations, 0)
+        size = 20000
+        for _ in range(size):
+            g = run_free_simulation(Configuration, g, 0.6, 6, n=4)
+            counts[tuple(Configuration.all_states.index(state) for state in g.vs['state'])] += 1
+        empirical = np.array([counts[c] / size for c in configurations])
+        np.testing.assert_allclose(empirical, pi, atol=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
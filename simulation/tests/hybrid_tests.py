@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+import igraph as ig
+
+from simulation.base import default_propagation, default_mutation
+from simulation.dual import mutation_probabilities
+from simulation.hybrid import flush_mutations, run_hybrid
+from simulation.tests.dual_tests import stationary_distribution
+
+
+class Configuration:
+    """
+    dummy configuration with the default propagation and mutation
+    """
+    all_states = ['a', 'b']
+    mass_media = 0.3
+    propagate = staticmethod(default_propagation)
+    mutate = staticmethod(default_mutation)
+
+
+class TestHybrid(unittest.TestCase):
+
+    def test_flush_mutations(self):
+        g = ig.Graph.Ring(5)
+        g.vs['state'] = 'a'
+        pending = {3: 'b', 0: 'c'}
+        flush_mutations(g, pending)
+        self.assertListEqual(g.vs['state'], ['c', 'a', 'a', 'b', 'a'])
+        self.assertDictEqual(pending, {})
+
+    def test_run_hybrid_zealots(self):
+        np.random.seed(1)
+        g = ig.Graph.Ring(20)
+        g.vs['state'] = 'b'
+        g.vs['zealot'] = 0
+        g.vs[4]['zealot'] = 1
+        g.vs[4]['state'] = 'a'
+        g = run_hybrid(Configuration, g, 1.0, 2000)
+        self.assertEqual(g.vs[4]['state'], 'a')
+        self.assertEqual(set(g.vs['state']), {'a', 'b'})
+
+    def test_run_hybrid_no_noise(self):
+        # without noise a consensus never changes
+        g = ig.Graph.Ring(20)
+        g.vs['state'] = 'b'
+        g.vs['zealot'] = 0
+        g = run_hybrid(Configuration, g, 0.0, 2000)
+        self.assertEqual(set(g.vs['state']), {'b'})
+
+    def test_run_hybrid_stationary_distribution(self):
+        np.random.seed(2)
+        g = ig.Graph(4, [(0, 1), (1, 2), (2, 3), (1, 3)])
+        g.vs['state'] = 'b'
+        g.vs['zealot'] = 0
+        configurations, pi = stationary_distribution(g, np.zeros(4, dtype=bool), 0.6,
+                                                     mutation_probabilities(2, Configuration.mass_media))
+        counts = dict.fromkeys(configurations, 0)
+        size = 20000
+        for _ in range(size):
+            g = run_hybrid(Configuration, g, 0.6, 6, n=4)
+            counts[tuple(Configuration.all_states.index(state) for state in g.vs['state'])] += 1
+        empirical = np.array([counts[c] / size for c in configurations])
+        np.testing.assert_allclose(empirical, pi, atol=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import sys
+import unittest
+import tempfile
+import numpy as np
+import igraph as ig
+
+from net_generation.storage import MappedGraph, save_mapped_graph
+from simulation.dual import mutation_probabilities
+from simulation.domains import run_domains, close_domains
+from simulation.mapped import run_mapped_simulation
+from simulation.tests.dual_tests import stationary_distribution
+
+
+class Configuration:
+    """
+    dummy configuration with the default propagation and mutation
+    """
+    all_states = ['a', 'b']
+    mass_media = 0.3
+    q = 2
+    processes = 2
+    sync_interval = 0.1
+
+
+class TestMapped(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = ig.Graph(4, [(0, 1), (1, 2), (2, 3), (1, 3)])
+        self.graph.vs['district'] = [0, 0, 1, 1]
+        self.directory = tempfile.TemporaryDirectory()
+        save_mapped_graph(self.graph, self.directory.name)
+        self.g = MappedGraph(self.directory.name, 2)
+
+    def tearDown(self):
+        self.g.close()
+        self.directory.cleanup()
+
+    def test_run_mapped_simulation_zealots(self):
+        np.random.seed(1)
+        self.g.states[:] = 1
+        self.g.zealots[2] = True
+        self.g.states[2] = 0
+        g = run_mapped_simulation(Configuration, self.g, 0.5, 1000)
+        self.assertEqual(g.states[2], 0)
+        self.assertEqual(set(g.states.tolist()), {0, 1})
+
+    def test_run_mapped_simulation_stationary_distribution(self):
+        np.random.seed(2)
+        configurations, pi = stationary_distribution(self.graph, np.zeros(4, dtype=bool), 0.6,
+                                                     mutation_probabilities(2, Configuration.mass_media))
+        counts = dict.fromkeys(configurations, 0)
+        size = 20000
+        for _ in range(size):
+            g = run_mapped_simulation(Configuration, self.g, 0.6, 6, n=4)
+            counts[tuple(g.states.tolist())] += 1
+        empirical = np.array([counts[c] / size for c in configurations])
+        np.testing.assert_allclose(empirical, pi, atol=0.02)
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs Python 3.8')
+    def test_run_domains_mapped(self):
+        np.random.seed(3)
+        self.g.states[:] = 1
+        self.g.zealots[0] = True
+        self.g.states[0] = 0
+        try:
+            g = run_domains(Configuration, self.g, 0.5, 400)
+            self.assertEqual(g['domains'].workers, 2)
+            self.assertEqual(g.states[0], 0)
+            np.testing.assert_array_equal(g['domains'].tally(), g.tally())
+        finally:
+            close_domains(self.g)
+
+
+if __name__ == '__main__':
+    unittest.main()
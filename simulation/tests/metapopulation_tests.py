@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+
+from net_generation.base import consensus_initial_state
+from simulation.metapopulation import DistrictComposition, neighbour_weights, zealot_districts, init_composition
+from simulation.metapopulation import multinomial_rows, multivariate_hypergeometric_rows, run_metapopulation
+from simulation.metapopulation import run_metapopulation_thermalization
+
+
+class Configuration:
+    """
+    dummy configuration with the parameters of the network and states
+    """
+    district_sizes = [30, 50, 20]
+    avg_deg = 10.0
+    district_coords = None
+    ratio = 0.1
+    planar_c = None
+    euclidean = False
+    zealots_config = {'degree_driven': False, 'one_district': False, 'district': None}
+    all_states = ['a', 'b', 'c']
+    zealot_state = 'a'
+    not_zealot_state = 'c'
+    mass_media = 0.5
+    initialize_states = staticmethod(consensus_initial_state)
+
+
+class TestMetapopulation(unittest.TestCase):
+
+    def test_neighbour_weights(self):
+        weights = neighbour_weights(np.array([[0.5, 0.1], [0.1, 0.2]]), [3, 2])
+        np.testing.assert_array_almost_equal(weights, [[1.0 / 1.2, 0.2 / 1.2], [0.3 / 0.5, 0.2 / 0.5]])
+        np.testing.assert_array_equal(neighbour_weights(np.ones((2, 2)), [1, 0]), np.zeros((2, 2)))
+
+    def test_multinomial_rows(self):
+        np.random.seed(1)
+        result = multinomial_rows(np.array([10, 0, 7]), np.array([[0.5, 0.5, 0.0], [0.2, 0.3, 0.5], [0, 0, 1]]))
+        np.testing.assert_array_equal(result.sum(axis=1), [10, 0, 7])
+        self.assertEqual(result[0, 2], 0)
+        np.testing.assert_array_equal(result[2], [0, 0, 7])
+
+    def test_multivariate_hypergeometric_rows(self):
+        np.random.seed(2)
+        counts = np.array([[3, 0, 2], [1, 1, 1], [0, 4, 0]])
+        result = multivariate_hypergeometric_rows(counts, np.array([5, 2, 1]))
+        np.testing.assert_array_equal(result[0], [3, 0, 2])
+        self.assertEqual(result[1].sum(), 2)
+        self.assertTrue(np.all(result[1] <= 1))
+        np.testing.assert_array_equal(result[2], [0, 1, 0])
+
+    def test_zealot_districts(self):
+        np.random.seed(3)
+        weights = np.ones((3, 3))
+        np.testing.assert_array_equal(zealot_districts([5, 6, 7], weights, 4, one_district=True, district=1), [0, 4, 0])
+        self.assertEqual(zealot_districts([5, 6, 7], weights, 10).sum(), 10)
+        self.assertEqual(zealot_districts([5, 6, 7], weights, 18, degree_driven=True).tolist(), [5, 6, 7])
+        self.assertRaises(ValueError, zealot_districts, [5, 6, 7], weights, 6, one_district=True, district=0)
+
+    def test_tally(self):
+        composition = DistrictComposition([[1, 2], [3, 0]], [4, 1], np.eye(2), zealot_state=0)
+        np.testing.assert_array_equal(composition.tally(), [[5, 2], [4, 0]])
+        np.testing.assert_array_equal(composition.sizes, [7, 4])
+        self.assertDictEqual(composition.vote_fractions(['a', 'b']), {'a': 9 / 11, 'b': 2 / 11})
+
+    def test_init_composition(self):
+        np.random.seed(4)
+        composition = init_composition(Configuration, 100, 12)
+        np.testing.assert_array_equal(composition.sizes, [30, 50, 20])
+        self.assertEqual(composition.zealots.sum(), 12)
+        np.testing.assert_array_equal(composition.counts[:, :2], np.zeros((3, 2)))
+        np.testing.assert_array_equal(composition.tally().sum(axis=0), [12, 0, 88])
+
+    def test_run_metapopulation(self):
+        np.random.seed(5)
+        composition = init_composition(Configuration, 100, 12)
+        zealots = composition.zealots.copy()
+        composition = run_metapopulation(Configuration, composition, 0.1, 1000, leap=7)
+        np.testing.assert_array_equal(composition.sizes, [30, 50, 20])
+        np.testing.assert_array_equal(composition.counts.sum(axis=1) + zealots, [30, 50, 20])
+        self.assertTrue(np.all(composition.counts >= 0))
+        self.assertGreater(composition.counts[:, 0].sum(), 0)
+
+    def test_run_metapopulation_noise_only(self):
+        class MassMedia(Configuration):
+            mass_media = 1.0
+
+        np.random.seed(6)
+        composition = init_composition(MassMedia, 100, 0)
+        composition = run_metapopulation(MassMedia, composition, 1.0, 3000)
+        np.testing.assert_array_equal(composition.tally()[:, 0], [30, 50, 20])
+
+    def test_run_metapopulation_thermalization(self):
+        np.random.seed(7)
+        composition = init_composition(Configuration, 100, 5)
+        composition, trajectory = run_metapopulation_thermalization(Configuration, composition, 0.1, 2500, each=500)
+        self.assertEqual(len(trajectory['a']), 6)
+        self.assertAlmostEqual(trajectory['a'][0], 0.05)
+        self.assertAlmostEqual(trajectory['c'][0], 0.95)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy as np
+import igraph as ig
+
+from net_generation.diagnostics import csr_adjacency
+from simulation.relaxation import transition_spectrum, relaxation_time, estimate_relaxation
+
+
+class TestRelaxation(unittest.TestCase):
+
+    def test_transition_spectrum_complete(self):
+        indptr, indices = csr_adjacency(ig.Graph.Full(5))
+        np.testing.assert_array_almost_equal(transition_spectrum(indptr, indices, k=5), [1, -.25, -.25, -.25, -.25])
+
+    def test_transition_spectrum_ring(self):
+        # large enough to use the sparse method
+        indptr, indices = csr_adjacency(ig.Graph.Ring(1500))
+        np.testing.assert_array_almost_equal(transition_spectrum(indptr, indices, k=2),
+                                             [1.0, np.cos(2 * np.pi / 1500)])
+
+    def test_transition_spectrum_zealots(self):
+        # the walk from the free nodes of a path 0-1-2 with a zealot 0 is killed at the zealot
+        indptr, indices = csr_adjacency(ig.Graph(3, [(0, 1), (1, 2)]))
+        np.testing.assert_array_almost_equal(transition_spectrum(indptr, indices, [True, False, False]),
+                                             [np.sqrt(0.5), -np.sqrt(0.5)])
+        self.assertEqual(len(transition_spectrum(indptr, indices, [True, True, True])), 0)
+
+    def test_transition_spectrum_isolated(self):
+        indptr, indices = csr_adjacency(ig.Graph(3, [(0, 1)]))
+        np.testing.assert_array_almost_equal(transition_spectrum(indptr, indices, k=3), [1, 1, -1])
+
+    def test_relaxation_time(self):
+        self.assertAlmostEqual(relaxation_time(1.0, 0.1), 10.0)
+        self.assertAlmostEqual(relaxation_time(0.5, 0.0), 2.0)
+        self.assertEqual(relaxation_time(1.0, 0.0), np.inf)
+        # an eigenvalue 1 computed with a rounding error
+        self.assertEqual(relaxation_time(1.0 - 1e-15, 0.0), np.inf)
+
+    def test_estimate_relaxation(self):
+        g = ig.Graph.Full(5)
+        g.vs['zealot'] = 0
+        estimate = estimate_relaxation(g, 0.1)
+        self.assertAlmostEqual(estimate['relaxation_time'], 10.0)
+        self.assertAlmostEqual(estimate['spectral_gap'], 0.0)
+        self.assertEqual(estimate['therm_time'], int(np.ceil(5 * 10.0 * np.log(1000))))
+        self.assertEqual(estimate['mc_steps'], 24)
+
+    def test_estimate_relaxation_no_noise(self):
+        g = ig.Graph.Full(5)
+        g.vs['zealot'] = 0
+        self.assertIsNone(estimate_relaxation(g, 0.0)['therm_time'])
+        # zealots make the model relax without noise
+        g.vs[0]['zealot'] = 1
+        estimate = estimate_relaxation(g, 0.0)
+        self.assertAlmostEqual(estimate['relaxation_time'], 4.0)
+        self.assertEqual(estimate['mc_steps'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
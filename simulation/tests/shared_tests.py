@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import sys
+import unittest
+import multiprocessing as mp
+import numpy as np
+
+from simulation.shared import SharedArrays, attach_arrays
+
+
+def double_states(spec, results):
+    """
+    doubles the shared states in another process, and tries to change the read-only adjacency
+    """
+    blocks, arrays = attach_arrays(spec, writeable=('states',))
+    arrays['states'] *= 2
+    try:
+        arrays['indices'][0] = 7
+        results.put(False)
+    except ValueError:
+        results.put(True)
+    del arrays
+    for block in blocks:
+        block.close()
+
+
+@unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs Python 3.8')
+class TestShared(unittest.TestCase):
+
+    def test_shared_arrays(self):
+        shared = SharedArrays({'indices': np.arange(6, dtype=np.int64), 'states': np.ones(3, dtype=np.int16),
+                               'empty': np.zeros(0)})
+        try:
+            self.assertEqual(shared.nbytes, 6 * 8 + 3 * 2)
+            results = mp.Queue()
+            process = mp.Process(target=double_states, args=(shared.spec, results))
+            process.start()
+            self.assertTrue(results.get())
+            process.join()
+            np.testing.assert_array_equal(shared['states'], [2, 2, 2])
+            np.testing.assert_array_equal(shared['indices'], np.arange(6))
+        finally:
+            shared.close()
+
+    def test_attach_arrays(self):
+        shared = SharedArrays({'tallies': np.arange(6).reshape(2, 3)})
+        try:
+            blocks, arrays = attach_arrays(shared.spec)
+            np.testing.assert_array_equal(arrays['tallies'], [[0, 1, 2], [3, 4, 5]])
+            self.assertFalse(arrays['tallies'].flags.writeable)
+            del arrays
+            for block in blocks:
+                block.close()
+        finally:
+            shared.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
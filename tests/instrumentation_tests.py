@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import tempfile
+import unittest
+import tracemalloc
+import numpy as np
+from types import SimpleNamespace
+from unittest import mock
+
+from instrumentation import Instrumentation, ProgressReporter, format_duration, aggregate_progress
+from instrumentation import estimate_memory, apply_memory_budget, interpreter_memory
+from instrumentation import estimate_runtime, estimate_simulation, time_per_step
+from benchmarks.common import make_config
+import main
+
+
+class Clock:
+    """
+    a fake time.perf_counter() advanced by hand
+    """
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('instrumentation.time.perf_counter', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_phase_timing(self):
+        instrumentation = Instrumentation()
+        for duration in (1.0, 2.0):
+            with instrumentation.phase('run_simulation'):
+                self.clock.now += duration
+        self.assertAlmostEqual(instrumentation.times['run_simulation'], 3.0)
+        self.assertEqual(instrumentation.calls['run_simulation'], 2)
+        self.assertSetEqual(set(instrumentation.memory['run_simulation'].keys()), {'rss', 'growth', 'peak_growth'})
+
+    def test_phase_nesting(self):
+        instrumentation = Instrumentation()
+        with instrumentation.phase('outer'):
+            self.clock.now += 1.0
+            with instrumentation.phase('inner'):
+                self.clock.now += 2.0
+        self.assertAlmostEqual(instrumentation.times['outer'], 3.0)
+        self.assertAlmostEqual(instrumentation.times['inner'], 2.0)
+
+    def test_phase_exception(self):
+        # the time of a phase interrupted by an exception is counted as well
+        instrumentation = Instrumentation()
+        with self.assertRaises(KeyError):
+            with instrumentation.phase('tally_votes'):
+                self.clock.now += 0.5
+                raise KeyError('x')
+        self.assertAlmostEqual(instrumentation.times['tally_votes'], 0.5)
+
+    def test_trace_memory(self):
+        instrumentation = Instrumentation(trace_memory=True)
+        self.addCleanup(tracemalloc.stop)
+        with instrumentation.phase('init_graph'):
+            data = [0.0] * 10 ** 6
+        del data
+        with instrumentation.phase('tally_votes'):
+            pass
+        self.assertGreaterEqual(instrumentation.memory['init_graph']['traced_peak'], 8 * 10 ** 6)
+        if hasattr(tracemalloc, 'reset_peak'):
+            # otherwise the peak of earlier phases is included, see test_trace_memory_without_reset_peak
+            self.assertLess(instrumentation.memory['tally_votes']['traced_peak'], 10 ** 6)
+
+    def test_trace_memory_without_reset_peak(self):
+        # before Python 3.9 the peak can't be reset, the peak of the whole run is used
+        memory = {'current': 100, 'peak': 5000}
+        old_tracemalloc = SimpleNamespace(is_tracing=lambda: True, start=tracemalloc.start,
+                                          get_traced_memory=lambda: (memory['current'], memory['peak']))
+        with mock.patch('instrumentation.tracemalloc', old_tracemalloc):
+            instrumentation = Instrumentation(trace_memory=True)
+            with instrumentation.phase('init_graph'):
+                memory['current'], memory['peak'] = 1000, 8000
+        self.assertEqual(instrumentation.memory['init_graph']['traced_peak'], 7900)
+
+    def test_count(self):
+        instrumentation = Instrumentation()
+        instrumentation.count('samples')
+        instrumentation.count('samples')
+        instrumentation.count('simulation_steps', 500)
+        self.assertDictEqual(instrumentation.counters, {'samples': 2, 'simulation_steps': 500})
+
+    def test_report(self):
+        instrumentation = Instrumentation()
+        with instrumentation.phase('thermalization'):
+            self.clock.now += 1.0
+        with instrumentation.phase('run_simulation'):
+            self.clock.now += 3.0
+        for _ in range(4):
+            with instrumentation.phase('voting: main_district_system'):
+                self.clock.now += 0.5
+        self.clock.now += 4.0
+        instrumentation.count('thermalization_steps', 1000)
+        instrumentation.count('simulation_steps', 3000)
+        report = instrumentation.report()
+        self.assertAlmostEqual(report['total_time'], 10.0)
+        self.assertAlmostEqual(report['phases']['run_simulation']['percent'], 30.0)
+        self.assertEqual(report['phases']['voting: main_district_system']['calls'], 4)
+        self.assertAlmostEqual(report['steps_per_second'], 1000.0)
+        self.assertAlmostEqual(report['elections_per_second'], 2.0)
+        self.assertDictEqual(report['counters'], {'thermalization_steps': 1000, 'simulation_steps': 3000})
+
+    def test_report_no_steps(self):
+        report = Instrumentation().report()
+        self.assertIsNone(report['steps_per_second'])
+        self.assertIsNone(report['elections_per_second'])
+
+    def test_save(self):
+        instrumentation = Instrumentation()
+        with instrumentation.phase('save_data'):
+            self.clock.now += 2.0
+        with tempfile.TemporaryDirectory() as path:
+            fname = instrumentation.save('_test', output_dir=path + '/')
+            self.assertEqual(fname, os.path.join(path, 'timing_test.json'))
+            with open(fname, 'r') as in_file:
+                saved = json.load(in_file)
+            self.assertListEqual(os.listdir(path), ['timing_test.json'])
+        self.assertAlmostEqual(saved['phases']['save_data']['time'], 2.0)
+        self.assertIsNone(saved['profile_phase'])
+        self.assertFalse(saved['trace_memory'])
+
+    def test_save_profile(self):
+        instrumentation = Instrumentation(profile_phase='voting')
+        with instrumentation.phase('voting: countrywide_system'):
+            sum(range(100))
+        with instrumentation.phase('tally_votes'):
+            pass
+        self.assertEqual(instrumentation.profiled_calls, 1)
+        with tempfile.TemporaryDirectory() as path:
+            instrumentation.save('_test', output_dir=path + '/')
+            self.assertSetEqual(set(os.listdir(path)), {'timing_test.json', 'profile_test.prof', 'profile_test.txt'})
+
+
+class TestProgressReporter(unittest.TestCase):
+
+    def setUp(self):
+        # the reporter measures the time with time.perf_counter(), a monotonic clock
+        self.clock = Clock()
+        patcher = mock.patch('instrumentation.time.perf_counter', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reports(self, reporter, updates):
+        """
+        calls update() after the given numbers of seconds since the start, returns the times of reports
+        """
+        start = self.clock.now
+        times = []
+        with mock.patch.object(reporter, 'report', wraps=reporter.report) as report:
+            for seconds in updates:
+                self.clock.now = start + seconds
+                calls = report.call_count
+                reporter.update(steps=10)
+                if report.call_count > calls:
+                    times.append(seconds)
+        return times
+
+    def test_rate_limiting(self):
+        reporter = ProgressReporter(1000, 10, interval=30.0)
+        self.assertListEqual(self.reports(reporter, [10, 29, 31, 40, 60, 61, 200]), [31, 61, 200])
+        self.assertEqual(reporter.steps, 70)
+
+    def test_disabled(self):
+        for interval in (0, None):
+            reporter = ProgressReporter(1000, 10, interval=interval)
+            self.assertListEqual(self.reports(reporter, [10, 100, 1000]), [])
+            with mock.patch.object(reporter, 'report') as report:
+                reporter.finish()
+                report.assert_not_called()
+            self.assertEqual(reporter.stage, 'finished')
+
+    def test_force(self):
+        reporter = ProgressReporter(1000, 10, interval=30.0)
+        with mock.patch.object(reporter, 'report') as report:
+            reporter.update(stage='sampling', force=True)
+            report.assert_called_once()
+        self.assertEqual(reporter.stage, 'sampling')
+
+    def test_eta_steps(self):
+        reporter = ProgressReporter(1000, 10, interval=30.0)
+        self.assertIsNone(reporter.state()['eta'])
+        self.clock.now += 10.0
+        reporter.update(steps=250, samples=1)
+        state = reporter.state()
+        # the rest of the steps at the average speed so far
+        self.assertAlmostEqual(state['eta'], 30.0)
+        self.assertAlmostEqual(state['elapsed'], 10.0)
+        self.assertAlmostEqual(state['steps_per_second'], 25.0)
+
+    def test_eta_samples(self):
+        # without steps (the dual sampler) the ETA is computed from the samples
+        reporter = ProgressReporter(0, 10, interval=30.0)
+        self.clock.now += 5.0
+        reporter.update(stage='sampling')
+        self.assertIsNone(reporter.state()['eta'])
+        self.clock.now += 5.0
+        reporter.update(samples=2)
+        self.assertAlmostEqual(reporter.state()['eta'], 40.0)
+        reporter.finish()
+        self.assertEqual(reporter.state()['eta'], 0.0)
+
+    def test_progress_file(self):
+        with tempfile.TemporaryDirectory() as path:
+            fname = os.path.join(path, 'progress', 'progress_test.json')
+            reporter = ProgressReporter(1000, 10, interval=30.0, fname=fname, name='_test')
+            self.clock.now += 40.0
+            reporter.update(steps=400, samples=4, stage='sampling')
+            with open(fname, 'r') as in_file:
+                state = json.load(in_file)
+            self.assertListEqual(os.listdir(os.path.dirname(fname)), ['progress_test.json'])
+        self.assertEqual(state['name'], '_test')
+        self.assertEqual(state['stage'], 'sampling')
+        self.assertEqual(state['pid'], os.getpid())
+        self.assertEqual((state['steps'], state['total_steps']), (400, 1000))
+        self.assertEqual((state['samples'], state['sample_size']), (4, 10))
+        self.assertAlmostEqual(state['steps_per_second'], 10.0)
+        self.assertAlmostEqual(state['eta'], 60.0)
+        self.assertGreater(state['memory'], 0)
+        self.assertGreaterEqual(state['updated'], state['started'])
+
+
+class TestProgress(unittest.TestCase):
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(None), 'unknown')
+        self.assertEqual(format_duration(0.4), '0 s')
+        self.assertEqual(format_duration(40.2), '40 s')
+        self.assertEqual(format_duration(125), '2 min 5 s')
+        self.assertEqual(format_duration(3600), '1 h 0 min')
+        self.assertEqual(format_duration(2 * 3600 + 5 * 60 + 59), '2 h 5 min')
+
+    def test_aggregate_progress(self):
+        now = time.time()
+        states = [{'stage': 'finished', 'eta': 0.0, 'steps_per_second': 50.0, 'updated': now - 5000},
+                  {'stage': 'sampling', 'eta': 30.0, 'steps_per_second': 100.0, 'updated': now - 10},
+                  {'stage': 'thermalization', 'eta': 90.0, 'steps_per_second': 200.0, 'updated': now - 20},
+                  {'stage': 'sampling', 'eta': 500.0, 'steps_per_second': 300.0, 'updated': now - 1000}]
+        with tempfile.TemporaryDirectory() as path:
+            for i, state in enumerate(states):
+                state.update({'steps': 10 * (i + 1), 'total_steps': 100, 'samples': i, 'sample_size': 5,
+                              'memory': 2 ** 20})
+                with open(os.path.join(path, f'progress_{i}.json'), 'w') as out_file:
+                    json.dump(state, out_file)
+            # a file being written is skipped
+            with open(os.path.join(path, 'progress_broken.json'), 'w') as out_file:
+                out_file.write('{"stage": ')
+            progress = aggregate_progress(os.path.join(path, 'progress*.json'), stale_after=600.0)
+        self.assertDictEqual(progress, {'runs': 4, 'finished': 1, 'running': 2, 'stale': 1, 'steps': 100,
+                                        'total_steps': 400, 'samples': 6, 'sample_size': 20,
+                                        'steps_per_second': 300.0, 'eta': 90.0, 'memory': 2 * 2 ** 20})
+
+    def test_aggregate_progress_no_files(self):
+        with tempfile.TemporaryDirectory() as path:
+            progress = aggregate_progress(os.path.join(path, 'progress*.json'))
+        self.assertEqual(progress['runs'], 0)
+        self.assertIsNone(progress['eta'])
+
+
+class TestMemoryBudget(unittest.TestCase):
+
+    @staticmethod
+    def config(*args):
+        # about 191 MB with all samples kept in memory, about 106 MB in the compact modes
+        return make_config('-n', '1000', '-s', '100000', '--result_format', 'json', '--save_tallies', *args)
+
+    def test_estimate_memory(self):
+        memory = estimate_memory(1000, 10, 3, 100, q=5, systems=2, result_format='json', save_tallies=True,
+                                 tally_itemsize=4)
+        self.assertEqual(memory['network'], 1000 * 220 + 5000 * 40)
+        self.assertEqual(memory['results'], 100 * 3 * 3 * 150)
+        self.assertEqual(memory['tallies'], 100 * 5 * 3 * 4)
+        self.assertEqual(memory['total'], interpreter_memory + memory['network'] + memory['results'] +
+                         memory['tallies'])
+        # the tallies are streamed, only the batches waiting for writing are in memory
+        memory = estimate_memory(1000, 10, 3, 10000, q=5, save_tallies=True, batch_size=50)
+        self.assertEqual(memory['tallies'], 3 * 50 * 5 * 3 * 8)
+        memory = estimate_memory(1000, 10, 3, 100, result_format='stream', links=100)
+        self.assertEqual(memory['network'], 1000 * 220 + 100 * 40)
+        self.assertEqual(memory['results'] + memory['tallies'], 0)
+
+    def test_no_budget(self):
+        config = self.config()
+        self.assertIsNone(apply_memory_budget(config))
+        self.assertEqual(config.result_format, 'json')
+
+    def test_within_budget(self):
+        config = self.config('--memory_budget', '1000')
+        memory = apply_memory_budget(config)
+        self.assertEqual(config.result_format, 'json')
+        self.assertEqual(config.tally_dtype, np.dtype(np.int64))
+        self.assertLess(memory['total'], 1000 * 2 ** 20)
+
+    def test_compact_modes(self):
+        config = self.config('--memory_budget', '150')
+        memory = apply_memory_budget(config)
+        self.assertEqual(config.result_format, 'stream')
+        self.assertEqual(config.tally_dtype, np.dtype(np.int32))
+        self.assertEqual(memory['results'], 0)
+        self.assertLess(memory['total'], 150 * 2 ** 20)
+
+    def test_impossible_budget(self):
+        config = self.config('--memory_budget', '100')
+        self.assertRaises(MemoryError, apply_memory_budget, config)
+        # the simulation refuses to run before the network is generated
+        with mock.patch('main.init_graph') as init_graph, mock.patch('main.open_result_writer') as writer:
+            self.assertRaises(MemoryError, main.run_experiment, n=config.n, epsilon=config.epsilon,
+                              sample_size=config.sample_size, therm_time=config.therm_time,
+                              n_zealots=config.n_zealots, config=config, silent=True, make_plots=False)
+            init_graph.assert_not_called()
+            writer.assert_not_called()
+
+
+class TestEstimates(unittest.TestCase):
+
+    def test_estimate_runtime(self):
+        runtime = estimate_runtime(1000, 6000, 10, 50, 20000, 3, systems=3)
+        self.assertAlmostEqual(runtime['network'], 1000 * 1e-6 + 6000 * 3e-7)
+        self.assertAlmostEqual(runtime['thermalization'], 20000 * time_per_step)
+        self.assertAlmostEqual(runtime['sampling'], 50 * 1000 * 3 * time_per_step)
+        # the countrywide system and two systems with 10 districts
+        self.assertAlmostEqual(runtime['elections'], 50 * (1000 * 3.5e-7 + 21 * 5e-5))
+        self.assertAlmostEqual(runtime['total'], sum(v for k, v in runtime.items() if k != 'total'))
+
+    def test_estimate_runtime_scaling(self):
+        small = estimate_runtime(1000, 6000, 10, 50, 20000, 3)
+        large = estimate_runtime(1000, 6000, 10, 100, 40000, 3)
+        self.assertAlmostEqual(large['sampling'], 2 * small['sampling'])
+        self.assertAlmostEqual(large['thermalization'], 2 * small['thermalization'])
+        self.assertAlmostEqual(large['network'], small['network'])
+
+    def test_estimate_simulation(self):
+        config = make_config('-n', '2000', '-q', '4', '-s', '30', '-t', '5000', '-mc', '2')
+        estimate = estimate_simulation(config)
+        self.assertSetEqual(set(estimate.keys()), {'network', 'memory', 'runtime'})
+        # the expected number of links is close to n * avg_deg / 2
+        self.assertAlmostEqual(estimate['network']['links'] / (2000 * config.avg_deg / 2), 1.0, delta=0.01)
+        self.assertEqual(estimate['memory'], estimate_memory(
+            2000, config.avg_deg, config.num_parties, 30, q=4, systems=len(config.voting_systems),
+            result_format=config.result_format, links=estimate['network']['links']))
+        self.assertEqual(estimate['runtime'], estimate_runtime(2000, estimate['network']['links'], 4, 30, 5000, 2,
+                                                               systems=len(config.voting_systems)))
+        # the arguments override the configuration
+        other = estimate_simulation(config, n=4000, sample_size=60, therm_time=10000)
+        self.assertAlmostEqual(other['runtime']['sampling'], 4 * estimate['runtime']['sampling'])
+        self.assertAlmostEqual(other['runtime']['thermalization'], 2 * estimate['runtime']['thermalization'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+import main
+from tools import read_tallies, read_distribution, distribution_matrix
+from simulation.domains import run_domains
+from benchmarks.common import make_config
+
+
+class TestRunExperiment(unittest.TestCase):
+
+    def run_experiment(self, *args, output_dir=None):
+        config = make_config('-n', '200', '-q', '4', '-s', '3', '-t', '1000', '-mc', '1', '-e', '0.1',
+                             '--progress', '0', *args)
+        if output_dir is not None:
+            main.run_experiment(n=config.n, epsilon=config.epsilon, sample_size=config.sample_size,
+                                therm_time=config.therm_time, n_zealots=config.n_zealots, config=config,
+                                silent=True, make_plots=False, output_dir=output_dir)
+            return config
+        with tempfile.TemporaryDirectory() as path:
+            return self.run_experiment(*args, output_dir=path + '/')
+
+    def test_dual_reset(self):
+        # with the dual sampler zealots are drawn again before every sample as well
+        zealots = []
+
+        def sample(config, g, noise_rate, adjacency=None):
+            zealots.append(tuple(g.vs['zealot']))
+            return g
+
+        with mock.patch('main.run_dual_sampling', side_effect=sample), \
+                mock.patch('main.reset_network', wraps=main.reset_network) as reset:
+            self.run_experiment('--sampler', 'dual', '--reset', '-zn', '20', '-zw', 'random')
+        self.assertEqual(reset.call_count, 3)
+        self.assertEqual(len(set(zealots)), 3)
+        self.assertTrue(all(sum(sample) == 20 for sample in zealots))
+
+    def test_dual_no_reset(self):
+        with mock.patch('main.reset_network') as reset:
+            self.run_experiment('--sampler', 'dual', '-zn', '20')
+        reset.assert_not_called()
+
+    def test_tallies_streamed(self):
+        with tempfile.TemporaryDirectory() as path:
+            config = self.run_experiment('--save_tallies', '--result_batch', '2', output_dir=path + '/')
+            tallies, states, settings = read_tallies(path + '/tallies' + config.suffix + '.bin')
+            self.assertEqual(tallies.shape, (3, 4, config.num_parties))
+            self.assertEqual(states, config.all_states)
+            self.assertEqual(settings['save_tallies'], True)
+            self.assertTrue((tallies.sum(axis=(1, 2)) == 200).all())
+            # the vote fractions of the results are computed from the same tallies
+            vote_fractions = read_distribution(config.suffix, 'vote_fractions', input_dir=path + '/')
+            np.testing.assert_allclose(distribution_matrix(vote_fractions, states), tallies.sum(axis=1) / 200)
+            del tallies
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'multiprocessing.shared_memory needs Python 3.8')
+    def test_domains_closed_after_error(self):
+        # worker processes started in the thermalization are stopped when it fails
+        graphs = []
+
+        def thermalization(config, g, noise_rate, therm_time, **kwargs):
+            graphs.append(run_domains(config, g, noise_rate, 100))
+            raise RuntimeError('interrupted')
+
+        with mock.patch('main.run_thermalization_simple', side_effect=thermalization):
+            self.assertRaises(RuntimeError, self.run_experiment, '--engine', 'domains', '--processes', '2')
+        self.assertIsNone(graphs[0]['domains'])
+
+    def test_mapped_removed_after_error(self):
+        # the files of a temporary network are removed when the thermalization fails
+        paths = []
+
+        def thermalization(config, g, noise_rate, therm_time, **kwargs):
+            paths.append(g.path)
+            raise RuntimeError('interrupted')
+
+        with mock.patch('main.run_thermalization_simple', side_effect=thermalization):
+            self.assertRaises(RuntimeError, self.run_experiment, '--storage', 'mmap')
+        self.assertFalse(os.path.exists(paths[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import unittest
+import numpy as np
+
+from tools import calculate_indexes, save_data, open_result_writer, read_data, TallyWriter, open_tally_writer, \
+    read_tallies, ResultWriter, read_stream, read_json_lines, load_results, results_to_columns, columns_to_results, \
+    write_columns, read_columns, write_results, read_distribution, convert_results
+from benchmarks.common import make_config
+
+
+class TestIndexes(unittest.TestCase):
+
+    # two samples of votes, the first with a party without votes, shape (samples, parties)
+    votes = np.array([[0.5, 0.3, 0.2, 0.0],
+                      [0.4, 0.6, 0.0, 0.0]])
+    # seats of two systems, the second giving a seat to the party without votes, shape (systems, samples, parties)
+    seats = np.array([[[0.6, 0.4, 0.0, 0.0],
+                       [0.0, 1.0, 0.0, 0.0]],
+                      [[0.5, 0.3, 0.0, 0.2],
+                       [0.4, 0.6, 0.0, 0.0]]])
+
+    def test_calculate_indexes_single_election(self):
+        indexes = calculate_indexes(self.votes[0], self.seats[0, 0])
+        self.assertAlmostEqual(float(indexes['Gallagher index']), np.sqrt(0.03))
+        self.assertAlmostEqual(float(indexes['Loosemore Hanby index']), 0.2)
+        self.assertAlmostEqual(float(indexes['Sainte-Lague index']), 0.01 / 0.5 + 0.01 / 0.3 + 0.04 / 0.2)
+        self.assertAlmostEqual(float(indexes['DHondt index']), 0.4 / 0.3)
+        self.assertAlmostEqual(float(indexes['Largest deviation']), 0.2)
+        self.assertAlmostEqual(float(indexes['Eff. No of Parties']), 1 / 0.52)
+
+    def test_calculate_indexes_systems_samples(self):
+        indexes = calculate_indexes(self.votes, self.seats)
+        expected = {'Gallagher index': [[np.sqrt(0.03), 0.4], [0.2, 0.0]],
+                    'Loosemore Hanby index': [[0.2, 0.4], [0.2, 0.0]],
+                    # the party without votes is skipped in the indexes dividing by the votes
+                    'Sainte-Lague index': [[0.01 / 0.5 + 0.01 / 0.3 + 0.04 / 0.2, 0.16 / 0.4 + 0.16 / 0.6], [0.2, 0.0]],
+                    'DHondt index': [[0.4 / 0.3, 1.0 / 0.6], [1.0, 1.0]],
+                    'Largest deviation': [[0.2, 0.4], [0.2, 0.0]],
+                    'Eff. No of Parties': [[1 / 0.52, 1.0], [1 / 0.38, 1 / 0.52]]}
+        self.assertSetEqual(set(indexes.keys()), set(expected.keys()))
+        for name, values in expected.items():
+            self.assertEqual(indexes[name].shape, (2, 2))
+            np.testing.assert_allclose(indexes[name], values, atol=1e-12, err_msg=name)
+
+    def test_calculate_indexes_same_as_single(self):
+        indexes = calculate_indexes(self.votes, self.seats)
+        for system in range(2):
+            for sample in range(2):
+                single = calculate_indexes(self.votes[sample], self.seats[system, sample])
+                for name, value in single.items():
+                    self.assertAlmostEqual(float(value), indexes[name][system, sample])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class FailingFile:
+    """
+    A file whose writes fail, like a full disk.
+    """
+
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    @property
+    def closed(self):
+        return self.wrapped.closed
+
+    def write(self, data):
+        raise OSError(28, 'No space left on device')
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.wrapped.close()
+
+
+class TestResultWriter(unittest.TestCase):
+
+    systems = ['first', 'vote_fractions']
+    parties = ['a', 'b', 'c']
+    # party 'c' is missing in some samples, it's saved as 0
+    samples = [{'first': {'a': 0.5, 'b': 0.5}, 'vote_fractions': {'a': 0.4, 'b': 0.35, 'c': 0.25}},
+               {'first': {'a': 1.0, 'b': 0.0}, 'vote_fractions': {'a': 0.7, 'b': 0.2, 'c': 0.1}},
+               {'first': {'a': 0.0, 'b': 0.5, 'c': 0.5}, 'vote_fractions': {'a': 0.1, 'b': 0.5, 'c': 0.4}}]
+    settings = {'n': 10, 'q': 1}
+
+    def write(self, fname, result_format, batch_size=2, settings=None):
+        settings = self.settings if settings is None else settings
+        with ResultWriter(fname, settings, self.systems, self.parties, result_format=result_format,
+                          batch_size=batch_size) as writer:
+            for sample in self.samples:
+                writer.append(sample)
+        return writer
+
+    def expected(self, system):
+        return [[sample[system].get(party, 0) for party in self.parties] for sample in self.samples]
+
+    def test_stream_round_trip(self):
+        with tempfile.TemporaryDirectory() as path:
+            # the batch size doesn't divide the number of samples, the last batch is written by close()
+            writer = self.write(path + '/results.bin', 'stream')
+            self.assertEqual(writer.samples, 3)
+            columns, settings = read_stream(path + '/results.bin')
+            self.assertEqual(settings, self.settings)
+            self.assertEqual(list(columns.keys()), self.systems)
+            for system in self.systems:
+                parties, values = columns[system]
+                self.assertEqual(parties, self.parties)
+                np.testing.assert_array_equal(values, self.expected(system))
+            columns, _ = read_stream(path + '/results.bin', 'first')
+            self.assertEqual(list(columns.keys()), ['first'])
+            self.assertRaises(KeyError, read_stream, path + '/results.bin', 'other')
+
+    def test_jsonl_round_trip(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.write(path + '/results.jsonl', 'jsonl')
+            results, settings = read_json_lines(path + '/results.jsonl')
+            self.assertEqual(settings, self.settings)
+            self.assertEqual(results, {system: [sample[system] for sample in self.samples]
+                                       for system in self.systems})
+            columns, _ = load_results(path + '/results.jsonl', 'vote_fractions')
+            np.testing.assert_array_equal(columns['vote_fractions'][1], self.expected('vote_fractions'))
+
+    def test_batch_sizes(self):
+        with tempfile.TemporaryDirectory() as path:
+            for batch_size in (1, 2, 3, 100):
+                self.write(path + '/results.bin', 'stream', batch_size=batch_size)
+                columns, _ = read_stream(path + '/results.bin')
+                np.testing.assert_array_equal(columns['first'][1], self.expected('first'))
+            self.assertRaises(ValueError, ResultWriter, path + '/results.bin', {}, self.systems, self.parties,
+                              batch_size=0)
+            self.assertRaises(ValueError, ResultWriter, path + '/results.bin', {}, self.systems, self.parties,
+                              result_format='npz')
+
+    def test_header_aligned(self):
+        with tempfile.TemporaryDirectory() as path:
+            # settings of different lengths need different padding
+            for settings in ({}, {'n': 1}, {'n': 10}, {'name': 'x' * 13}):
+                self.write(path + '/results.bin', 'stream', settings=settings)
+                with open(path + '/results.bin', 'rb') as in_file:
+                    header = in_file.readline()
+                self.assertEqual(len(header) % 8, 0)
+                self.assertEqual(json.loads(header)['settings'], settings)
+                self.assertEqual(os.path.getsize(path + '/results.bin'), len(header) + 3 * 2 * 3 * 8)
+
+    def test_truncated_record_skipped(self):
+        with tempfile.TemporaryDirectory() as path:
+            fname = path + '/results.bin'
+            self.write(fname, 'stream')
+            with open(fname, 'r+b') as out_file:
+                out_file.truncate(os.path.getsize(fname) - 1)
+            columns, _ = read_stream(fname)
+            np.testing.assert_array_equal(columns['first'][1], self.expected('first')[:2])
+            # nothing but the header
+            with open(fname, 'rb') as in_file:
+                header = in_file.readline()
+            with open(fname, 'r+b') as out_file:
+                out_file.truncate(len(header) + 5)
+            columns, _ = read_stream(fname)
+            self.assertEqual(columns['first'][1].shape, (0, 3))
+
+    def test_truncated_line_skipped(self):
+        with tempfile.TemporaryDirectory() as path:
+            fname = path + '/results.jsonl'
+            self.write(fname, 'jsonl')
+            with open(fname, 'r+b') as out_file:
+                out_file.truncate(os.path.getsize(fname) - 10)
+            results, _ = read_json_lines(fname)
+            self.assertEqual(results['first'], [sample['first'] for sample in self.samples[:2]])
+
+    def test_write_error_raised_on_append(self):
+        with tempfile.TemporaryDirectory() as path:
+            writer = ResultWriter(path + '/results.bin', self.settings, self.systems, self.parties, batch_size=1)
+            writer._file = FailingFile(writer._file)
+            # the queue holds two batches, so the error of the first batch is known before the fifth append
+            with self.assertRaises(OSError):
+                for _ in range(5):
+                    writer.append(self.samples[0])
+            self.assertRaises(OSError, writer.close)
+            self.assertTrue(writer._file.closed)
+
+    def test_write_error_raised_on_close(self):
+        with tempfile.TemporaryDirectory() as path:
+            writer = ResultWriter(path + '/results.jsonl', self.settings, self.systems, self.parties,
+                                  result_format='jsonl')
+            writer._file = FailingFile(writer._file)
+            writer.append(self.samples[0])
+            self.assertRaises(OSError, writer.close)
+            # the file is closed, closing it again does nothing
+            writer.close()
+            results, settings = read_json_lines(path + '/results.jsonl')
+            self.assertEqual((results, settings), ({}, self.settings))
+
+    def test_open_result_writer(self):
+        with tempfile.TemporaryDirectory() as path:
+            config = make_config('-n', '100', '--result_format', 'json')
+            self.assertIsNone(open_result_writer(config, '_x', output_dir=path + '/'))
+            config = make_config('-n', '100', '--result_format', 'stream', '--result_batch', '7')
+            with open_result_writer(config, '_x', output_dir=path + '/new/') as writer:
+                self.assertEqual(writer.fname, path + '/new/results_x.bin')
+                self.assertEqual(writer.batch_size, 7)
+                self.assertEqual(writer.systems, list(config.voting_systems.keys()) + ['vote_fractions'])
+                self.assertEqual(writer.parties, config.all_states)
+            _, settings = read_stream(writer.fname)
+            self.assertEqual(settings, config._cmd_args)
+
+
+class TestResultsFiles(unittest.TestCase):
+
+    results = {'vote_fractions': [{'a': 0.5, 'b': 0.5}, {'a': 0.25, 'b': 0.75}]}
+
+    def config(self, result_format, n):
+        return make_config('-n', str(n), '--result_format', result_format)
+
+    def test_save_data_removes_other_formats(self):
+        with tempfile.TemporaryDirectory() as path:
+            output_dir = path + '/'
+            save_data(self.config('stream', 100), self.results, '_x', output_dir=output_dir)
+            fname = save_data(self.config('json', 200), self.results, '_x', output_dir=output_dir)
+            self.assertEqual(os.listdir(path), [os.path.basename(fname)])
+            results, settings = read_data('_x', input_dir=output_dir)
+            self.assertEqual(settings['n'], 200)
+            self.assertEqual(results, self.results)
+
+    def test_open_result_writer_removes_other_formats(self):
+        with tempfile.TemporaryDirectory() as path:
+            output_dir = path + '/'
+            save_data(self.config('npz', 100), self.results, '_x', output_dir=output_dir)
+            with open_result_writer(self.config('jsonl', 200), '_x', output_dir=output_dir) as writer:
+                writer.append({'vote_fractions': {'a': 1.0, 'b': 0.0}})
+            self.assertEqual(os.listdir(path), ['results_x.jsonl'])
+            results, settings = read_data('_x', input_dir=output_dir)
+            self.assertEqual(settings['n'], 200)
+            self.assertEqual(results['vote_fractions'], [{'a': 1.0, 'b': 0.0}])
+
+
+class TestTallies(unittest.TestCase):
+
+    tallies = np.arange(5 * 2 * 3).reshape(5, 2, 3)
+
+    def write(self, fname, batch_size=2):
+        with TallyWriter(fname, {'n': 10}, ['a', 'b', 'c'], 2, dtype=np.int32, batch_size=batch_size) as writer:
+            for tally in self.tallies:
+                writer.append(tally)
+        return writer
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as path:
+            writer = self.write(path + '/tallies.bin')
+            self.assertEqual(writer.samples, 5)
+            tallies, states, settings = read_tallies(path + '/tallies.bin')
+            np.testing.assert_array_equal(tallies, self.tallies)
+            self.assertEqual(tallies.dtype, np.dtype('<i4'))
+            self.assertEqual(states, ['a', 'b', 'c'])
+            self.assertEqual(settings, {'n': 10})
+            del tallies
+
+    def test_truncated_record_skipped(self):
+        with tempfile.TemporaryDirectory() as path:
+            fname = path + '/tallies.bin'
+            self.write(fname)
+            with open(fname, 'r+b') as tally_file:
+                tally_file.truncate(os.path.getsize(fname) - 5)
+            tallies, _, _ = read_tallies(fname)
+            np.testing.assert_array_equal(tallies, self.tallies[:4])
+            del tallies
+
+    def test_wrong_shape(self):
+        with tempfile.TemporaryDirectory() as path:
+            with TallyWriter(path + '/tallies.bin', {}, ['a', 'b', 'c'], 3) as writer:
+                self.assertRaises(ValueError, writer.append, self.tallies[0])
+                self.assertEqual(writer.samples, 0)
+
+    def test_npz_of_earlier_versions(self):
+        with tempfile.TemporaryDirectory() as path:
+            np.savez_compressed(path + '/tallies.npz', tallies=self.tallies, states=np.array(['a', 'b', 'c']),
+                                settings='{"n": 10}')
+            tallies, states, settings = read_tallies(path + '/tallies.npz')
+            np.testing.assert_array_equal(tallies, self.tallies)
+            self.assertEqual((states, settings), (['a', 'b', 'c'], {'n': 10}))
+
+    def test_open_tally_writer(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.assertIsNone(open_tally_writer(make_config('-n', '100'), '_x', output_dir=path + '/'))
+            config = make_config('-n', '100', '-q', '2', '--save_tallies')
+            with open_tally_writer(config, '_x', output_dir=path + '/') as writer:
+                self.assertEqual(writer.fname, path + '/tallies_x.bin')
+                self.assertEqual(writer.shape, (2, config.num_parties))
+
+
+class TestColumns(unittest.TestCase):
+
+    # parties in the order of the labels: a, b, ..., z, aa, ab, ...
+    results = {'first': [{'b': 0.5, 'a': 0.25, 'aa': 0.25}, {'a': 1.0, 'b': 0.0, 'aa': 0.0}],
+               'vote_fractions': [{'aa': 0.2, 'a': 0.5, 'b': 0.3}, {'a': 0.6, 'b': 0.3, 'aa': 0.1}]}
+    settings = {'n': 10, 'q': 2, 'voting_systems': ['first']}
+
+    def test_results_to_columns(self):
+        columns = results_to_columns(self.results)
+        self.assertEqual(list(columns.keys()), ['first', 'vote_fractions'])
+        parties, values = columns['first']
+        self.assertEqual(parties, ['a', 'b', 'aa'])
+        np.testing.assert_array_equal(values, [[0.25, 0.5, 0.25], [1.0, 0.0, 0.0]])
+        self.assertEqual(columns_to_results(columns), self.results)
+
+    def test_missing_parties(self):
+        # a party missing in some samples gets 0 in these samples
+        columns = results_to_columns({'first': [{'a': 1.0}, {'a': 0.5, 'c': 0.5}, {'b': 1.0}]})
+        parties, values = columns['first']
+        self.assertEqual(parties, ['a', 'b', 'c'])
+        np.testing.assert_array_equal(values, [[1.0, 0.0, 0.0], [0.5, 0.0, 0.5], [0.0, 1.0, 0.0]])
+        self.assertEqual(columns_to_results(columns)['first'][0], {'a': 1.0, 'b': 0.0, 'c': 0.0})
+        # no samples
+        parties, values = results_to_columns({'first': []})['first']
+        self.assertEqual((parties, values.shape), ([], (0, 0)))
+
+    def test_write_read_columns(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_columns(path + '/results.npz', self.settings, results_to_columns(self.results))
+            columns, settings = read_columns(path + '/results.npz')
+            self.assertEqual(settings, self.settings)
+            self.assertEqual(list(columns.keys()), ['first', 'vote_fractions'])
+            self.assertEqual(columns_to_results(columns), self.results)
+            columns, _ = read_columns(path + '/results.npz', 'vote_fractions')
+            self.assertEqual(list(columns.keys()), ['vote_fractions'])
+            self.assertRaises(KeyError, read_columns, path + '/results.npz', 'other')
+
+    def test_json_npz_json(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_results(path + '/results_x.json', self.settings, results_to_columns(self.results))
+            npz = convert_results(path + '/results_x.json')
+            self.assertEqual(npz, path + '/results_x.npz')
+            os.rename(path + '/results_x.json', path + '/original.json')
+            self.assertEqual(convert_results(npz), path + '/results_x.json')
+            with open(path + '/original.json') as original, open(path + '/results_x.json') as converted:
+                self.assertEqual(json.load(converted), json.load(original))
+            columns, settings = load_results(npz)
+            self.assertEqual(columns['first'][0], ['a', 'b', 'aa'])
+            self.assertEqual(settings, self.settings)
+
+    def test_read_distribution(self):
+        for extension in ('.bin', '.npz', '.jsonl', '.json'):
+            with self.subTest(extension=extension), tempfile.TemporaryDirectory() as path:
+                input_dir = path + '/'
+                write_results(input_dir + 'results_x' + extension, self.settings, results_to_columns(self.results))
+                distribution = read_distribution('_x', 'first', input_dir=input_dir)
+                self.assertEqual(list(distribution.keys()), ['a', 'b', 'aa'])
+                np.testing.assert_array_equal(distribution['b'], [0.5, 0.0])
+                np.testing.assert_array_equal(read_distribution('_x', 'vote_fractions', 'aa', input_dir=input_dir),
+                                              [0.2, 0.1])
+                self.assertRaises(KeyError, read_distribution, '_x', 'other', input_dir=input_dir)
+
+    def test_convert_to_the_same_format(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_results(path + '/results.bin', self.settings, results_to_columns(self.results))
+            self.assertRaises(ValueError, convert_results, path + '/results.bin', 'stream')
+            self.assertFalse(os.path.exists(path + '/results.npz'))
+            self.assertRaises(ValueError, convert_results, path + '/results.txt')
+
+    def test_convert_script(self):
+        script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts',
+                              'convert_results.py')
+        with tempfile.TemporaryDirectory() as path:
+            write_results(path + '/results.bin', self.settings, results_to_columns(self.results))
+            subprocess.run([sys.executable, script, path + '/results.bin', '--to', 'jsonl'], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            results, settings = read_json_lines(path + '/results.jsonl')
+            self.assertEqual((results, settings), (self.results, self.settings))
+            # converting a file into its own format fails
+            process = subprocess.run([sys.executable, script, path + '/results.jsonl', '--to', 'jsonl'],
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            self.assertNotEqual(process.returncode, 0)
+            self.assertIn(b'ValueError', process.stderr)
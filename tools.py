@@ -8,6 +8,8 @@ import numbers
 import os
 import json
 import time
+import queue
+import threading
 import numpy as np
 from decimal import Decimal
 
@@ -44,20 +46,544 @@ def prepare_json(_object):
     return _object
 
 
+def party_order(parties):
+    """
+    Sorts party labels in the order in which they are generated (a, b, ..., z, aa, ab, ...).
+    :param parties: an iterable with party labels
+    :return: a sorted list of party labels
+    """
+    return sorted(parties, key=lambda party: (len(str(party)), str(party)))
+
+
+def results_to_columns(results):
+    """
+    Converts results from the format of main.run_experiment(), i.e. lists of per-sample dicts,
+    into columns, i.e. one array with a shape (samples, parties) per electoral system.
+    :param results: a dict {name of the system: list of dicts {party: value}}
+    :return: a dict {name of the system: (list of parties, numpy array with a shape (samples, parties))}
+    """
+    columns = {}
+    for system, series in results.items():
+        distribution = convert_to_distributions(series)
+        parties = party_order(distribution.keys())
+        values = np.array([distribution[party] for party in parties], dtype=float).T
+        columns[system] = (parties, values.reshape(len(series), len(parties)))
+    return columns
+
+
+def columns_to_results(columns):
+    """
+    The inverse of results_to_columns().
+    :param columns: a dict {name of the system: (list of parties, numpy array with a shape (samples, parties))}
+    :return: a dict {name of the system: list of dicts {party: value}}
+    """
+    return {system: [dict(zip(parties, row)) for row in values.tolist()]
+            for system, (parties, values) in columns.items()}
+
+
+def write_columns(fname, settings, columns):
+    """
+    Writes results in the columnar format, a .npz file with one (samples, parties) array of floats per electoral
+    system, the labels of parties, the names of systems, and the settings as json metadata.
+    Every array is a separate member of the file, so one system can be read without reading the others.
+    :param fname: the name of the file
+    :param settings: a dict with the settings of the simulation
+    :param columns: a dict {name of the system: (list of parties, numpy array with a shape (samples, parties))}
+    :return: None
+    """
+    arrays = {'settings': np.array(json.dumps(settings)), 'systems': np.array(list(columns.keys()))}
+    for i, (parties, values) in enumerate(columns.values()):
+        # names of the systems are not used as keys, as they can contain characters not allowed in file names
+        arrays[f'parties_{i}'] = np.array(parties)
+        arrays[f'values_{i}'] = values
+    np.savez(fname, **arrays)
+
+
+def read_columns(fname, system=None):
+    """
+    Reads results saved by write_columns().
+    :param fname: the name of the file
+    :param system: the name of the system to read, if None all systems are read
+    :return: a dict {name of the system: (list of parties, numpy array with a shape (samples, parties))},
+    and a dict with the settings
+    """
+    with np.load(fname) as data:
+        systems = data['systems'].tolist()
+        columns = {}
+        for i, name in enumerate(systems):
+            if system is None or name == system:
+                columns[name] = (data[f'parties_{i}'].tolist(), data[f'values_{i}'])
+        if system is not None and system not in columns:
+            raise KeyError(f"There is no system '{system}' in {fname}, systems in the file: {systems}")
+        return columns, json.loads(str(data['settings']))
+
+
+def padded_header(metadata):
+    """
+    Creates the header of a binary record stream, a line with json metadata padded with spaces,
+    so that the records start at an offset aligned to 8 bytes.
+    :param metadata: a dict with the metadata
+    :return: bytes
+    """
+    header = json.dumps(metadata).encode()
+    padding = -(len(header) + 1) % 8
+    return header + b' ' * padding + b'\n'
+
+
+def stream_header(settings, systems, parties):
+    """
+    Creates the header of the binary record stream of results, see padded_header().
+    :param settings: a dict with the settings of the simulation
+    :param systems: a list with the names of the electoral systems
+    :param parties: a list with the labels of the parties
+    :return: bytes
+    """
+    return padded_header({'format': 'results_stream', 'dtype': '<f8', 'systems': list(systems),
+                          'parties': list(parties), 'settings': settings})
+
+
+def read_header(fname):
+    """
+    Reads the header of a binary record stream.
+    :param fname: the name of the file
+    :return: a dict with the metadata, and the offset of the first record
+    """
+    with open(fname, 'rb') as in_file:
+        header = json.loads(in_file.readline())
+        return header, in_file.tell()
+
+
+def map_records(fname, offset, dtype, shape):
+    """
+    Memory-maps the records of a binary record stream. An incomplete record at the end of the file
+    (e.g. if the simulation was interrupted) is skipped.
+    :param fname: the name of the file
+    :param offset: the offset of the first record
+    :param dtype: numpy type of the values
+    :param shape: the shape of a single record
+    :return: numpy array (read-only memmap) with a shape (samples, *shape)
+    """
+    dtype = np.dtype(dtype)
+    samples = (os.path.getsize(fname) - offset) // (dtype.itemsize * int(np.prod(shape)))
+    if samples > 0:
+        return np.memmap(fname, dtype=dtype, mode='r', offset=offset, shape=(samples, *shape))
+    return np.zeros((0, *shape), dtype=dtype)
+
+
+def read_stream(fname, system=None):
+    """
+    Reads results written by ResultWriter in the binary record stream format. The file is memory-mapped,
+    so reading one system doesn't read the others. An incomplete record at the end of the file
+    (e.g. if the simulation was interrupted) is skipped.
+    :param fname: the name of the file
+    :param system: the name of the system to read, if None all systems are read
+    :return: a dict {name of the system: (list of parties, numpy array with a shape (samples, parties))},
+    and a dict with the settings
+    """
+    header, offset = read_header(fname)
+    systems, parties = header['systems'], header['parties']
+    if system is not None and system not in systems:
+        raise KeyError(f"There is no system '{system}' in {fname}, systems in the file: {systems}")
+
+    records = map_records(fname, offset, header['dtype'], (len(systems), len(parties)))
+    columns = {name: (parties, np.array(records[:, i, :])) for i, name in enumerate(systems)
+               if system is None or name == system}
+    return columns, header['settings']
+
+
+def read_json_lines(fname):
+    """
+    Reads results written by ResultWriter in the JSON Lines format. An incomplete line at the end of the file
+    (e.g. if the simulation was interrupted) is skipped.
+    :param fname: the name of the file
+    :return: a dict {name of the system: list of dicts {party: value}}, and a dict with the settings
+    """
+    with open(fname, 'r') as in_file:
+        settings = json.loads(in_file.readline())['settings']
+        results = {}
+        for line in in_file:
+            if not line.endswith('\n'):
+                break
+            for system, value in json.loads(line).items():
+                results.setdefault(system, []).append(value)
+    return results, settings
+
+
+class RecordWriter:
+    """
+    Appends records of consecutive samples to a file while the simulation is running.
+    Samples are encoded right away and written in batches by a background thread, so the memory used doesn't
+    depend on the number of samples, and the samples written before an interruption are kept in the file.
+    Subclasses define the header of the file and _encode().
+    """
+
+    def __init__(self, fname, header, batch_size=100):
+        """
+        :param fname: the name of the file, overwritten if it exists
+        :param header: bytes written at the beginning of the file
+        :param batch_size: the number of samples written at once
+        """
+        if batch_size < 1:
+            raise ValueError(f'The batch size must be positive, got {batch_size}')
+
+        self.fname = fname
+        self.batch_size = batch_size
+        self.samples = 0
+
+        self._batch = []
+        self._error = None
+        # at most two batches wait for writing, if writing is slower than the simulation, the simulation waits
+        self._queue = queue.Queue(maxsize=2)
+        self._file = open(fname, 'wb')
+        self._file.write(header)
+        self._file.flush()
+        self._thread = threading.Thread(target=self._write_batches, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write_batches(self):
+        """
+        The loop of the background thread, writes batches from the queue until it gets None.
+        """
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error is None:
+                try:
+                    self._file.write(batch)
+                    self._file.flush()
+                except OSError as error:
+                    self._error = error
+
+    def _encode(self, sample):
+        """
+        :param sample: the data of one sample
+        :return: bytes
+        """
+        raise NotImplementedError
+
+    def append(self, sample):
+        """
+        Adds one sample.
+        :param sample: the data of one sample, see _encode() of the subclass
+        :return: None
+        """
+        if self._error is not None:
+            raise self._error
+        self._batch.append(self._encode(sample))
+        self.samples += 1
+        if len(self._batch) >= self.batch_size:
+            self._queue.put(b''.join(self._batch))
+            self._batch = []
+
+    def close(self):
+        """
+        Writes the remaining samples, stops the background thread and closes the file. Can be called many times.
+        :return: None
+        """
+        if self._file.closed:
+            return
+        if self._batch:
+            self._queue.put(b''.join(self._batch))
+            self._batch = []
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+
+class ResultWriter(RecordWriter):
+    """
+    Appends the results of consecutive samples to a file while the simulation is running, see RecordWriter.
+    Two formats are supported:
+    'stream' - a binary record stream, a json header line followed by one float64 record with a shape
+        (systems, parties) per sample, see read_stream(),
+    'jsonl' - JSON Lines, a line with the settings followed by one line {system: {party: value}} per sample,
+        see read_json_lines().
+    """
+
+    def __init__(self, fname, settings, systems, parties, result_format='stream', batch_size=100):
+        """
+        :param fname: the name of the file, overwritten if it exists
+        :param settings: a dict with the settings of the simulation
+        :param systems: a list with the names of the electoral systems (including 'vote_fractions')
+        :param parties: a list with the labels of the parties
+        :param result_format: 'stream' or 'jsonl'
+        :param batch_size: the number of samples written at once
+        """
+        if result_format not in ('stream', 'jsonl'):
+            raise ValueError(f"Unknown format of the result stream '{result_format}', it should be stream or jsonl")
+
+        self.systems = list(systems)
+        self.parties = list(parties)
+        self.result_format = result_format
+        if result_format == 'stream':
+            header = stream_header(settings, self.systems, self.parties)
+        else:
+            header = json.dumps({'settings': settings}).encode() + b'\n'
+        super().__init__(fname, header, batch_size=batch_size)
+
+    def _encode(self, sample):
+        """
+        :param sample: a dict {name of the system: dict {party: value}}
+        :return: bytes
+        """
+        if self.result_format == 'stream':
+            record = [[float(sample[system].get(party, 0)) for party in self.parties] for system in self.systems]
+            return np.array(record, dtype='<f8').tobytes()
+        return json.dumps(prepare_json(sample)).encode() + b'\n'
+
+
+class TallyWriter(RecordWriter):
+    """
+    Appends the tallies of votes of consecutive samples to a binary record stream while the simulation is running,
+    see RecordWriter. The file has a json header line followed by one record with a shape (q, parties) per sample,
+    see read_tallies().
+    """
+
+    def __init__(self, fname, settings, states, q, dtype=np.int64, batch_size=100):
+        """
+        :param fname: the name of the file, overwritten if it exists
+        :param settings: a dict with the settings of the simulation
+        :param states: a list with the labels of the parties (columns of the tallies)
+        :param q: the number of districts
+        :param dtype: numpy type of the vote counts
+        :param batch_size: the number of samples written at once
+        """
+        self.states = list(states)
+        self.shape = (q, len(self.states))
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        header = padded_header({'format': 'tallies_stream', 'dtype': self.dtype.str, 'shape': list(self.shape),
+                                'states': self.states, 'settings': settings})
+        super().__init__(fname, header, batch_size=batch_size)
+
+    def _encode(self, sample):
+        """
+        :param sample: numpy array with a shape (q, parties), the number of votes per district and party
+        :return: bytes
+        """
+        tally = np.asarray(sample, dtype=self.dtype)
+        if tally.shape != self.shape:
+            raise ValueError(f'The tally has a shape {tally.shape}, expected {self.shape}')
+        return tally.tobytes()
+
+
+# extensions of the results files, in the order in which they are looked for when reading
+result_extensions = {'stream': '.bin', 'npz': '.npz', 'jsonl': '.jsonl', 'json': '.json'}
+
+
+def remove_other_results(fname):
+    """
+    Removes the results files with the same name in the other formats, e.g. left by an earlier run
+    with another result_format, which would otherwise be found by results_file() instead of the new one.
+    :param fname: the name of the results file being written
+    :return: None
+    """
+    base, extension = os.path.splitext(fname)
+    for other in result_extensions.values():
+        if other != extension and os.path.exists(base + other):
+            os.remove(base + other)
+
+
+def open_result_writer(config, suffix, output_dir='results/'):
+    """
+    Opens a ResultWriter for the main electoral systems and the vote fractions, if config.result_format
+    is a streaming format.
+    :param config: Config class from configuration module
+    :param suffix: suffix of the file name
+    :param output_dir: directory where the file is saved
+    :return: ResultWriter, or None if the results are saved at the end with save_data()
+    """
+    if config.result_format not in ('stream', 'jsonl'):
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    fname = output_dir + 'results' + suffix + result_extensions[config.result_format]
+    remove_other_results(fname)
+    return ResultWriter(fname, config._cmd_args, list(config.voting_systems.keys()) + ['vote_fractions'],
+                        config.all_states, result_format=config.result_format,
+                        batch_size=config.result_batch or 100)
+
+
+def write_results(fname, settings, columns):
+    """
+    Writes results in any of the formats, the format is recognized by the extension of the file.
+    :param fname: the name of the file
+    :param settings: a dict with the settings of the simulation
+    :param columns: a dict {name of the system: (list of parties, numpy array with a shape (samples, parties))}
+    :return: None
+    """
+    extension = os.path.splitext(fname)[1]
+    if extension == '.npz':
+        write_columns(fname, settings, columns)
+    elif extension == '.json':
+        with open(fname, 'w') as out_file:
+            json.dump({'settings': settings, 'results': columns_to_results(columns)}, out_file, indent=3)
+    elif extension in ('.bin', '.jsonl'):
+        parties = party_order({party for system_parties, _ in columns.values() for party in system_parties})
+        result_format = 'stream' if extension == '.bin' else 'jsonl'
+        with ResultWriter(fname, settings, columns.keys(), parties, result_format=result_format) as writer:
+            results = columns_to_results(columns)
+            for i in range(len(next(iter(results.values()), []))):
+                writer.append({system: series[i] for system, series in results.items()})
+    else:
+        raise ValueError(f'Unknown format of the results file {fname}, the extension should be one of '
+                         f'{list(result_extensions.values())}')
+
+
+def load_results(fname, system=None):
+    """
+    Reads results in any of the formats as columns, the format is recognized by the extension of the file.
+    :param fname: the name of the file
+    :param system: the name of the system to read, if None all systems are read
+    :return: a dict {name of the system: (list of parties, numpy array with a shape (samples, parties))},
+    and a dict with the settings
+    """
+    extension = os.path.splitext(fname)[1]
+    if extension == '.bin':
+        return read_stream(fname, system)
+    if extension == '.npz':
+        return read_columns(fname, system)
+    if extension == '.jsonl':
+        results, settings = read_json_lines(fname)
+    elif extension == '.json':
+        with open(fname, 'r') as in_file:
+            result = json.load(in_file)
+        results, settings = result['results'], result['settings']
+    else:
+        raise ValueError(f'Unknown format of the results file {fname}, the extension should be one of '
+                         f'{list(result_extensions.values())}')
+    if system is not None:
+        results = {system: results[system]}
+    return results_to_columns(results), settings
+
+
 def save_data(config, results, suffix, output_dir='results/'):
+    """
+    Saves all results at once in the format given by config.result_format (see result_extensions).
+    :param config: Config class from configuration module
+    :param results: a dict {name of the system: list of dicts {party: value}}
+    :param suffix: suffix of the file name
+    :param output_dir: directory where the file is saved
+    :return: the name of the saved file
+    """
     os.makedirs(output_dir, exist_ok=True)
-    result = {'settings': config._cmd_args,
-              'results': prepare_json(results)}
-    fname = output_dir + 'results' + suffix + '.json'
-    with open(fname, 'w') as out_file:
-        json.dump(result, out_file, indent=3)
+    fname = output_dir + 'results' + suffix + result_extensions[config.result_format or 'json']
+    remove_other_results(fname)
+    if fname.endswith('.json'):
+        result = {'settings': config._cmd_args,
+                  'results': prepare_json(results)}
+        with open(fname, 'w') as out_file:
+            json.dump(result, out_file, indent=3)
+    else:
+        write_results(fname, config._cmd_args, results_to_columns(results))
+    return fname
+
+
+def results_file(suffix, input_dir='results/'):
+    """
+    Finds the results file for a given suffix, formats are checked in the order of result_extensions.
+    :param suffix: suffix of the file name
+    :param input_dir: directory with the results
+    :return: the name of the file
+    """
+    for extension in result_extensions.values():
+        fname = input_dir + 'results' + suffix + extension
+        if os.path.exists(fname):
+            return fname
+    return input_dir + 'results' + suffix + '.json'
 
 
 def read_data(suffix, input_dir='results/'):
-    f_name = input_dir + 'results' + suffix + '.json'
-    with open(f_name, 'r') as in_file:
-        result = json.load(in_file)
-    return result['results'], result['settings']
+    """
+    Reads all results in the format of main.run_experiment(), from any of the formats.
+    :param suffix: suffix of the file name
+    :param input_dir: directory with the results
+    :return: a dict {name of the system: list of dicts {party: value}}, and a dict with the settings
+    """
+    f_name = results_file(suffix, input_dir)
+    if f_name.endswith('.json'):
+        with open(f_name, 'r') as in_file:
+            result = json.load(in_file)
+        return result['results'], result['settings']
+    if f_name.endswith('.jsonl'):
+        return read_json_lines(f_name)
+    columns, settings = load_results(f_name)
+    return columns_to_results(columns), settings
+
+
+def read_distribution(suffix, system, party=None, input_dir='results/'):
+    """
+    Reads the results of a single electoral system, or a single party in that system. For the binary formats
+    only the array of this system is read from the file.
+    :param suffix: suffix of the file name
+    :param system: the name of the system (or 'vote_fractions')
+    :param party: the label of the party, if None all parties are returned
+    :param input_dir: directory with the results
+    :return: numpy array with values for all samples if the party is given,
+    otherwise a dict {party: numpy array with values for all samples}
+    """
+    parties, values = load_results(results_file(suffix, input_dir), system)[0][system]
+    if party is not None:
+        return values[:, parties.index(party)]
+    return {p: values[:, j] for j, p in enumerate(parties)}
+
+
+def convert_results(fname, result_format=None):
+    """
+    Converts a results file into another format, the converted file is saved next to the original one.
+    :param fname: the name of the file, the format is recognized by the extension
+    :param result_format: the target format (a key of result_extensions),
+    by default .npz files are converted to .json and other files to .npz
+    :return: the name of the converted file
+    """
+    base, extension = os.path.splitext(fname)
+    if result_format is None:
+        result_format = 'json' if extension == '.npz' else 'npz'
+    target = base + result_extensions[result_format]
+    if target == fname:
+        raise ValueError(f'The file {fname} is already in the {result_format} format')
+    columns, settings = load_results(fname)
+    write_results(target, settings, columns)
+    return target
+
+
+def open_tally_writer(config, suffix, output_dir='results/'):
+    """
+    Opens a TallyWriter saving the tallies of votes of all samples while the simulation is running,
+    so that electoral systems can be evaluated later without running the simulation again
+    (see scripts/evaluate_tallies.py).
+    :param config: Config class from configuration module
+    :param suffix: suffix of the file name
+    :param output_dir: directory where the file is saved
+    :return: TallyWriter, or None if config.save_tallies is not set
+    """
+    if not config.save_tallies:
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    return TallyWriter(output_dir + 'tallies' + suffix + '.bin', config._cmd_args, config.all_states, config.q,
+                       dtype=config.tally_dtype, batch_size=config.result_batch or 100)
+
+
+def read_tallies(fname):
+    """
+    Reads the tallies saved by TallyWriter (.bin), or by earlier versions with numpy.savez_compressed() (.npz).
+    The binary record stream is memory-mapped, so the tallies are read when they are used, and an incomplete
+    record at the end of the file (e.g. if the simulation was interrupted) is skipped.
+    :param fname: the name of the file
+    :return: tallies (numpy array with a shape (samples, q, parties)), states (list), settings (dict)
+    """
+    if fname.endswith('.npz'):
+        with np.load(fname) as data:
+            return data['tallies'], data['states'].tolist(), json.loads(str(data['settings']))
+    header, offset = read_header(fname)
+    return map_records(fname, offset, header['dtype'], tuple(header['shape'])), header['states'], header['settings']
 
 
 ###########################################################
@@ -81,48 +607,44 @@ def convert_to_distributions(series, missing_value=0):
     return res
 
 
-def calculate_indexes(voting_distribution, distribution, sample_size):
-    keys = sorted(distribution.keys())
-    diff = {}
-    value = {}
-    for key in keys:
-        votes = voting_distribution[key]
-        seats = distribution[key]
-        diff[key] = np.array(seats) - np.array(votes)
-        value[key] = np.array(seats)
-    gallagher_index = np.zeros(sample_size)
-    loosemore_hanby_index = np.zeros(sample_size)
-    effective_number_of_parties = np.zeros(sample_size)
-    for i in range(sample_size):
-        diffs = np.zeros(len(keys))
-        values = np.zeros(len(keys))
-        for j, key in enumerate(keys):
-            diffs[j] = diff[key][i]
-            values[j] = value[key][i]
-        gallagher_index[i] = np.sqrt(np.sum(diffs**2)*0.5)
-        loosemore_hanby_index[i] = np.sum(np.abs(diffs)) * 0.5
-        effective_number_of_parties[i] = 1./np.sum(values**2.)
-
-    return {'Gallagher index': gallagher_index, 'Loosemore Hanby index': loosemore_hanby_index,
-            'Eff. No of Parties': effective_number_of_parties}
-
-
-def compute_edge_ratio(graph):
-    """
-    Computes the fraction of inter-district connections among all connections
-    and the ratio of inter-district connections to intra-district connections.
-    :param graph: ig.Graph object
-    :return: (fraction of inter-district connections, ratio of inter- connections to intra- connections)
-    """
-    between_dist = 0  # links between two different district
-    within_dist = 0  # links inside the same district
-    for edge in graph.get_edgelist():
-        if graph.vs(edge[0])['district'][0] != graph.vs(edge[1])['district'][0]:
-            between_dist += 1
-        else:
-            within_dist += 1
+def distribution_matrix(distribution, parties=None):
+    """
+    Converts a dict of lists (e.g. from convert_to_distributions() or read_distribution()) into a matrix.
+    :param distribution: a dict {party: values per sample}
+    :param parties: the order of columns, parties missing in the distribution get zeros,
+    all parties in the order of party_order() by default
+    :return: numpy array with a shape (samples, parties)
+    """
+    if parties is None:
+        parties = party_order(distribution.keys())
+    samples = len(next(iter(distribution.values())))
+    return np.stack([np.asarray(distribution[party], dtype=float) if party in distribution else np.zeros(samples)
+                     for party in parties], axis=-1)
+
+
+def calculate_indexes(votes, seats):
+    """
+    Computes the disproportionality indexes and the effective number of parties for every election at once.
+    Any leading axes are allowed, e.g. seats with a shape (systems, sweep points, samples, parties) and votes
+    with a shape (sweep points, samples, parties) give indexes of all systems at all sweep points.
+    Parties without votes are skipped in the indexes dividing by the votes.
+    :param votes: numpy array with a shape (..., parties), the fraction of votes
+    :param seats: numpy array broadcastable with votes, the fraction of seats
+    :return: a dict {name of the index: numpy array with the broadcast shape without the last axis}
+    """
+    votes = np.asarray(votes, dtype=float)
+    seats = np.asarray(seats, dtype=float)
+    diffs = seats - votes
+    squares = diffs ** 2
+    has_votes = np.broadcast_to(votes > 0, diffs.shape)
+    seats_per_vote = np.divide(seats, votes, out=np.zeros(diffs.shape), where=has_votes)
 
-    return between_dist / (between_dist + within_dist), between_dist / within_dist
+    return {'Gallagher index': np.sqrt(0.5 * squares.sum(axis=-1)),
+            'Loosemore Hanby index': 0.5 * np.abs(diffs).sum(axis=-1),
+            'Sainte-Lague index': np.divide(squares, votes, out=np.zeros(diffs.shape), where=has_votes).sum(axis=-1),
+            'DHondt index': seats_per_vote.max(axis=-1),
+            'Largest deviation': np.abs(diffs).max(axis=-1),
+            'Eff. No of Parties': 1. / (seats ** 2).sum(axis=-1)}
 
 
 ###########################################################